@@ -0,0 +1,557 @@
+"""
+Micro-benchmarks for the sign's hot paths. They run against a headless
+display, so no matrix hardware or emulator window is needed.
+
+    python3 benchmark.py music
+    python3 benchmark.py game-of-life --sizes 160x32 1024x1024
+    python3 benchmark.py hashlife --generations 1024
+    python3 benchmark.py server --clients 4
+    python3 benchmark.py display-process --load 2
+    python3 benchmark.py allocations
+    python3 benchmark.py geometry
+    python3 benchmark.py color
+"""
+
+import argparse
+import dataclasses
+import datetime
+import queue
+import statistics
+import threading
+import time
+from typing import Callable
+import numpy as np
+from PIL import Image
+import providers.mbta as mbta
+import providers.mta as mta
+from display import Display, PanelGeometry
+from display.animation import TextScrollAnimation
+from display.color import ColorCorrection
+from display.framebuffer import scratch_surfaces
+from display.headless import HeadlessMatrix
+from display.shm import (
+    SharedFramebuffer,
+    SharedMemoryMatrix,
+    SimpleOptions,
+    present_frames,
+)
+from display.render_music import (
+    render_music_content,
+    _get_progress_bar_image,
+)
+from display.render_mta import _apply_mta_content, _rasterize_mta_content
+from common import ClockType, Colors, Fonts, GameOfLifeColorMode, SignMode
+from common.broadcaster import StatusBroadcaster
+from common.commands import CommandBus
+from display.types import RenderMessage, Rect
+from providers.game_of_life import GameOfLife, PATTERNS, parse_rle
+from providers.hashlife import HashLife
+from providers.music.types import AlbumCover, Song, SpotifyResponse
+from providers.mta.types import Status
+from server import Server
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples_us = sorted(s * 1e6 for s in samples)
+    p95 = samples_us[int(len(samples_us) * 0.95) - 1]
+    print(
+        f"{name:<24} mean {statistics.mean(samples_us):8.1f} us   "
+        f"median {statistics.median(samples_us):8.1f} us   p95 {p95:8.1f} us"
+    )
+
+
+def time_calls(fn: Callable[[int], None], count: int) -> list[float]:
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def benchmark_music(args: argparse.Namespace) -> None:
+    display = Display(queue.Queue(), headless=True)
+    song = Song(
+        artist="Artist",
+        title="Title",
+        duration_ms=args.ticks * 1000 + 1000,
+        progress_ms=0,
+        cover=AlbumCover(url="cover", image=Image.new("RGB", (32, 32), (90, 0, 0))),
+    )
+
+    def full_tick(i: int) -> None:
+        # what every tick drew before the renderer kept any screen state
+        tick_song = dataclasses.replace(song, progress_ms=i * 1000)
+        progress_bar_image = _get_progress_bar_image(display, tick_song)
+        display.framebuffer.paste(progress_bar_image, 32, 24)
+        if tick_song.cover.image is not None:
+            display.framebuffer.paste(tick_song.cover.image, 0, 0)
+        display.swap_canvas()
+
+    def incremental_tick(i: int) -> None:
+        tick_song = dataclasses.replace(song, progress_ms=i * 1000)
+        render_music_content(
+            display, RenderMessage.Music(SpotifyResponse.OK, tick_song)
+        )
+
+    render_music_content(
+        display, RenderMessage.Music(SpotifyResponse.OK_NEW_SONG, song)
+    )
+    report("music full redraw", time_calls(full_tick, args.ticks))
+    render_music_content(
+        display, RenderMessage.Music(SpotifyResponse.OK_NEW_SONG, song)
+    )
+    report("music incremental", time_calls(incremental_tick, args.ticks))
+
+
+def benchmark_game_of_life(args: argparse.Namespace) -> None:
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        game = GameOfLife(width, height, density=0.3)
+        generations = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.seconds:
+            game.step(args.batch)
+            generations += args.batch
+        elapsed = time.perf_counter() - start
+        cells_per_second = generations * width * height / elapsed
+        print(
+            f"game of life {size:<12} {generations / elapsed:10.1f} generations/s   "
+            f"{cells_per_second / 1e6:8.1f} Mcells/s"
+        )
+
+
+def benchmark_hashlife(args: argparse.Namespace) -> None:
+    width, height = (int(v) for v in args.size.split("x"))
+    for name in args.patterns:
+        cells = parse_rle(PATTERNS[name])
+        game = GameOfLife(width, height)
+        game.load_pattern(cells, width // 2, height // 2)
+        start = time.perf_counter()
+        game.step(args.generations)
+        direct = time.perf_counter() - start
+
+        life = HashLife()
+        life.load_pattern(cells)
+        start = time.perf_counter()
+        life.step(args.generations)
+        hashlife = time.perf_counter() - start
+        # the pattern stays clear of the torus edges, so both must agree
+        if life.get_population() != int(game.grid.sum()):
+            raise RuntimeError(f"{name}: populations differ")
+
+        start = time.perf_counter()
+        life.step(args.jump)
+        jump = time.perf_counter() - start
+        print(
+            f"{name:<18} {args.generations} generations: direct {direct:7.3f} s   "
+            f"hashlife {hashlife:7.3f} s ({direct / hashlife:6.1f}x)   "
+            f"then {args.jump} more in {jump:7.3f} s "
+            f"(population {life.get_population()})"
+        )
+
+
+def measure_jitter(interval: float, stop: threading.Event) -> list[float]:
+    """How late a loop ticking every interval seconds wakes up."""
+    samples = []
+    target = time.perf_counter()
+    while not stop.is_set():
+        target += interval
+        time.sleep(max(target - time.perf_counter(), 0))
+        samples.append(max(time.perf_counter() - target, 0))
+    return samples
+
+
+def benchmark_server(args: argparse.Namespace) -> None:
+    mode_broadcaster = StatusBroadcaster()
+    mode_broadcaster.set_status(SignMode.MTA)
+    mta_status_broadcaster = StatusBroadcaster()
+    mta_status_broadcaster.set_status(Status(station="121"))
+    server = Server(
+        CommandBus(), mode_broadcaster, StatusBroadcaster(), mta_status_broadcaster
+    )
+    page_loads: list[float] = []
+
+    def client_task(stop: threading.Event) -> None:
+        client = server.app.test_client()
+        etag = None
+        next_load = time.perf_counter()
+        while not stop.wait(max(next_load - time.perf_counter(), 0)):
+            next_load += 1 / args.rate
+            start = time.perf_counter()
+            client.get("/")
+            headers = {"Accept-Encoding": "gzip"}
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            response = client.get("/stations/mta.json", headers=headers)
+            etag = response.headers.get("ETag", etag)
+            page_loads.append(time.perf_counter() - start)
+
+    for clients in (0, args.clients):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=client_task, args=(stop,)) for _ in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        timer = threading.Timer(args.seconds, stop.set)
+        timer.start()
+        jitter = measure_jitter(args.interval, stop)
+        for thread in threads:
+            thread.join()
+        report(f"loop jitter, {clients} clients", jitter)
+    report("page load", page_loads)
+
+
+def benchmark_display_process(args: argparse.Namespace) -> None:
+    options = SimpleOptions(
+        {
+            "rows": 32,
+            "cols": 32,
+            "chain_length": 5,
+            "parallel": 1,
+            "brightness": 100,
+            "hardware_mapping": "regular",
+            "gpio_slowdown": 0,
+        }
+    )
+    frames = [
+        Image.new("RGB", (160, 32), (i * 40 % 256, 0, 255 - i * 40 % 256))
+        for i in range(8)
+    ]
+
+    def load_task(stop: threading.Event) -> None:
+        # pure Python work that holds the GIL, like parsing and drawing
+        while not stop.is_set():
+            sum(i * i for i in range(10_000))
+
+    for mode in ("thread", "process"):
+        stop = threading.Event()
+        lateness: list[float] = []
+        # fork the display process before any other thread starts
+        if mode == "process":
+            matrix = SharedMemoryMatrix(
+                options, headless=True, refresh_rate=args.refresh_rate
+            )
+            canvas = matrix.CreateFrameCanvas()
+
+            def show(image: Image.Image) -> None:
+                nonlocal canvas
+                canvas.SetImage(image)
+                canvas = matrix.SwapOnVSync(canvas)
+
+        else:
+            framebuffer = SharedFramebuffer(160, 32)
+            show = framebuffer.write
+
+            def present_task() -> None:
+                lateness.extend(
+                    present_frames(
+                        framebuffer, HeadlessMatrix(options), stop, args.refresh_rate
+                    )
+                )
+
+            presenter = threading.Thread(target=present_task)
+            presenter.start()
+
+        def render_task() -> None:
+            i = 0
+            while not stop.wait(1 / args.fps):
+                show(frames[i % len(frames)])
+                i += 1
+
+        threads = [threading.Thread(target=render_task)] + [
+            threading.Thread(target=load_task, args=(stop,)) for _ in range(args.load)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if mode == "process":
+            lateness = matrix.close()
+        else:
+            presenter.join()
+            framebuffer.close()
+        report(f"refresh jitter, {mode}", lateness)
+
+
+def count_images(fn: Callable[[int], None], count: int) -> float:
+    """
+    PIL images created per call of fn, measured after as many warm-up calls,
+    so caches that fill on first use are not counted.
+    """
+    created = 0
+    original_init = Image.Image.__init__
+
+    def counting_init(self: Image.Image) -> None:
+        nonlocal created
+        created += 1
+        original_init(self)
+
+    for i in range(count):
+        fn(i)
+    Image.Image.__init__ = counting_init  # type: ignore[method-assign]
+    try:
+        for i in range(count, 2 * count):
+            fn(i)
+    finally:
+        Image.Image.__init__ = original_init  # type: ignore[method-assign]
+    return created / count
+
+
+def benchmark_allocations(args: argparse.Namespace) -> None:
+    display = Display(queue.Queue(), headless=True)
+    now = datetime.datetime.now()
+    mbta_predictions = [
+        mbta.Prediction("Alewife", "3 min"),
+        mbta.Prediction("Ashmont", "12 min"),
+    ]
+    trains = [
+        mta.TrainTime("1", "N", "Van Cortlandt Park-242 St", 45, 0, None, None, False),
+        mta.TrainTime("A", "N", "Inwood-207 St", 300, 1, None, None, True),
+    ]
+    game = GameOfLife(display.SCREEN_WIDTH, display.SCREEN_HEIGHT, density=0.3)
+    song = Song(
+        artist="Artist",
+        title="Title",
+        duration_ms=2 * args.frames * 1000 + 1000,
+        progress_ms=0,
+        cover=AlbumCover(url="cover", image=Image.new("RGB", (32, 32), (90, 0, 0))),
+    )
+    render_music_content(
+        display, RenderMessage.Music(SpotifyResponse.OK_NEW_SONG, song)
+    )
+    scroll = TextScrollAnimation(
+        Rect(32, 0, 128, 8),
+        10,
+        True,
+        True,
+        "A title too long to fit",
+        Fonts.SILKSCREEN,
+        Colors.WHITE,
+    )
+
+    def game_of_life_frame(i: int) -> None:
+        game.step()
+        display.render(
+            RenderMessage.GameOfLife(game.get_grid(), i, GameOfLifeColorMode.MONO)
+        )
+
+    def scroll_frame(i: int) -> None:
+        frame, _ = scroll.get_next_frame()
+        assert frame is not None
+        bbox, image = frame
+        display.render(RenderMessage.Frame(bbox=bbox, frame=image))
+        display.swap_canvas()
+
+    screens: dict[str, Callable[[int], None]] = {
+        "text": lambda i: display.render(RenderMessage.Text(f"Frame {i}")),
+        "clock": lambda i: display.render(
+            RenderMessage.Clock(ClockType.MTA, now + datetime.timedelta(seconds=i))
+        ),
+        "mbta": lambda i: display.render(
+            RenderMessage.MBTA(mbta.PredictionStatus.OK, mbta_predictions)
+        ),
+        # both halves of the render executor job, on this thread
+        "mta": lambda i: _apply_mta_content(
+            display, _rasterize_mta_content(display, RenderMessage.MTA(trains))
+        ),
+        "game of life": game_of_life_frame,
+        "music tick": lambda i: render_music_content(
+            display,
+            RenderMessage.Music(
+                SpotifyResponse.OK,
+                dataclasses.replace(song, progress_ms=i * 1000),
+            ),
+        ),
+        "text scroll": scroll_frame,
+    }
+    for name, render in screens.items():
+        images = count_images(render, args.frames)
+        print(f"{name:<24} {images:6.2f} images/frame")
+    print(f"scratch surfaces         {scratch_surfaces.get_stats()}")
+
+
+def benchmark_geometry(args: argparse.Namespace) -> None:
+    geometries = {
+        "160x32, 5 of 32x32": PanelGeometry(32, 32, 5, 1),
+        "320x64, 5 of 64x64": PanelGeometry(64, 64, 5, 1),
+        "320x64, 2 chains of 5": PanelGeometry(32, 32, 5, 2),
+    }
+    for name, geometry in geometries.items():
+        display = Display(queue.Queue(), headless=True, geometry=geometry)
+        display.animation_manager.stop()
+        width, height = display.SCREEN_WIDTH, display.SCREEN_HEIGHT
+        game = GameOfLife(width, height, density=0.3)
+        song = Song(
+            artist="Artist",
+            title="Title",
+            duration_ms=args.frames * 1000 + 1000,
+            progress_ms=0,
+            cover=AlbumCover(url="cover", image=Image.new("RGB", (32, 32), (90, 0, 0))),
+        )
+        scroll = TextScrollAnimation(
+            Rect(32, 0, 128, 8),
+            10,
+            True,
+            True,
+            "A title too long to fit",
+            Fonts.SILKSCREEN,
+            Colors.WHITE,
+        )
+
+        def scroll_frame(i: int) -> None:
+            frame, _ = scroll.get_next_frame()
+            assert frame is not None
+            bbox, image = frame
+            display.render(RenderMessage.Frame(bbox=bbox, frame=image))
+            display.swap_canvas()
+
+        def music_tick(i: int) -> None:
+            tick_song = dataclasses.replace(song, progress_ms=i * 1000)
+            render_music_content(
+                display, RenderMessage.Music(SpotifyResponse.OK, tick_song)
+            )
+
+        def game_of_life_frame(i: int) -> None:
+            game.step()
+            display.render(
+                RenderMessage.GameOfLife(game.get_grid(), i, GameOfLifeColorMode.MONO)
+            )
+
+        workloads: dict[str, Callable[[int], None]] = {
+            "scroll frame": scroll_frame,
+            "music tick": music_tick,
+            "text": lambda i: display.render(RenderMessage.Text(f"Frame {i}")),
+            "game of life": game_of_life_frame,
+        }
+        print(name)
+        for workload, render in workloads.items():
+            render_music_content(
+                display, RenderMessage.Music(SpotifyResponse.OK_NEW_SONG, song)
+            )
+            display.swap_canvas()
+            report(f"  {workload}", time_calls(render, args.frames))
+
+            def whole_frame(i: int) -> None:
+                # what every swap cost before uploads were tracked per tile
+                display.framebuffer.mark_dirty()
+                render(i)
+
+            render_music_content(
+                display, RenderMessage.Music(SpotifyResponse.OK_NEW_SONG, song)
+            )
+            display.swap_canvas()
+            report(f"  {workload}, whole", time_calls(whole_frame, args.frames))
+
+
+def benchmark_color(args: argparse.Namespace) -> None:
+    display = Display(queue.Queue(), headless=True)
+    display.animation_manager.stop()
+    game = GameOfLife(display.SCREEN_WIDTH, display.SCREEN_HEIGHT, density=0.3)
+    game.step()
+    display.render(
+        RenderMessage.GameOfLife(game.get_grid(), 0, GameOfLifeColorMode.AGE)
+    )
+
+    def full_swap(i: int) -> None:
+        display.framebuffer.mark_dirty()
+        display.swap_canvas()
+
+    corrections = {
+        "color identity": ColorCorrection(),
+        "color corrected": ColorCorrection(2.2, (1.0, 0.85, 0.7), 60),
+    }
+    for name, correction in corrections.items():
+        display.color_correction = correction
+        display.framebuffer.color_correction = correction
+        report(f"{name} swap", time_calls(full_swap, args.frames))
+    report(
+        "brightness change",
+        time_calls(lambda i: display.set_brightness(i % 100), args.frames),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    music_parser = subparsers.add_parser(
+        "music", help="per-tick cost of the music screen renderer"
+    )
+    music_parser.add_argument("--ticks", type=int, default=600)
+    music_parser.set_defaults(run=benchmark_music)
+
+    game_of_life_parser = subparsers.add_parser(
+        "game-of-life", help="generations per second of the Game of Life engine"
+    )
+    game_of_life_parser.add_argument(
+        "--sizes", nargs="+", default=["160x32", "1024x1024", "4096x4096"]
+    )
+    game_of_life_parser.add_argument("--batch", type=int, default=10)
+    game_of_life_parser.add_argument("--seconds", type=float, default=2.0)
+    game_of_life_parser.set_defaults(run=benchmark_game_of_life)
+
+    hashlife_parser = subparsers.add_parser(
+        "hashlife", help="HashLife against the direct stepper on classic patterns"
+    )
+    hashlife_parser.add_argument(
+        "--patterns",
+        nargs="+",
+        default=["gosper_glider_gun", "r_pentomino", "acorn"],
+        choices=sorted(PATTERNS),
+    )
+    hashlife_parser.add_argument("--size", default="1024x1024")
+    hashlife_parser.add_argument("--generations", type=int, default=1024)
+    hashlife_parser.add_argument("--jump", type=int, default=1 << 20)
+    hashlife_parser.set_defaults(run=benchmark_hashlife)
+
+    server_parser = subparsers.add_parser(
+        "server", help="render loop jitter while clients load the web page"
+    )
+    server_parser.add_argument("--clients", type=int, default=4)
+    server_parser.add_argument(
+        "--rate", type=float, default=10, help="page loads per second per client"
+    )
+    server_parser.add_argument("--interval", type=float, default=0.01)
+    server_parser.add_argument("--seconds", type=float, default=3.0)
+    server_parser.set_defaults(run=benchmark_server)
+
+    display_process_parser = subparsers.add_parser(
+        "display-process",
+        help="matrix refresh jitter under load, in-process against a display process",
+    )
+    display_process_parser.add_argument(
+        "--load", type=int, default=2, help="threads of busy Python work"
+    )
+    display_process_parser.add_argument("--fps", type=float, default=30)
+    display_process_parser.add_argument("--refresh-rate", type=float, default=1 / 60)
+    display_process_parser.add_argument("--seconds", type=float, default=3.0)
+    display_process_parser.set_defaults(run=benchmark_display_process)
+
+    allocations_parser = subparsers.add_parser(
+        "allocations", help="PIL images each screen creates per frame"
+    )
+    allocations_parser.add_argument("--frames", type=int, default=200)
+    allocations_parser.set_defaults(run=benchmark_allocations)
+
+    geometry_parser = subparsers.add_parser(
+        "geometry", help="frame cost on the sign and on 4x bigger panel layouts"
+    )
+    geometry_parser.add_argument("--frames", type=int, default=300)
+    geometry_parser.set_defaults(run=benchmark_geometry)
+
+    color_parser = subparsers.add_parser(
+        "color", help="full-frame swap with and without color correction"
+    )
+    color_parser.add_argument("--frames", type=int, default=500)
+    color_parser.set_defaults(run=benchmark_color)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
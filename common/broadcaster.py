@@ -1,5 +1,5 @@
 import threading
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 
 class StatusBroadcaster:
@@ -7,17 +7,30 @@ class StatusBroadcaster:
         self._status: Any = None
         self._status_changed = threading.Event()
         self._lock = threading.Lock()
+        # bumped on every change, so readers can tell whether they are behind
+        self.version = 0
+        self._listeners: list[Callable[[Any], None]] = []
 
     def set_status(self, new_status: Any) -> None:
         with self._lock:
-            if self._status != new_status:
-                self._status = new_status
-                self._status_changed.set()
+            if self._status == new_status:
+                return
+            self._status = new_status
+            self.version += 1
+            self._status_changed.set()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(new_status)
 
     def get_status(self) -> Any:
         with self._lock:
             return self._status
 
+    def add_listener(self, listener: Callable[[Any], None]) -> None:
+        """Calls listener with the new status after every change."""
+        with self._lock:
+            self._listeners.append(listener)
+
     def wait_for_status_change(self, timeout: Optional[float] = None) -> Any:
         """Wait for status to change and return the new status"""
         if self._status_changed.wait(timeout):
@@ -29,7 +29,9 @@ class Button:
             self.setup_gpio()
             # Only start the monitoring thread if there's a long press callback
             if self.long_press_callback:
-                self.monitor_thread = threading.Thread(target=self._monitor_long_press)
+                self.monitor_thread = threading.Thread(
+                    target=self._monitor_long_press, name="button"
+                )
                 self.monitor_thread.daemon = True
                 self.monitor_thread.start()
 
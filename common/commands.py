@@ -0,0 +1,176 @@
+import logging
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, TypeVar
+from .common import SignMode
+from providers.mta.types import Direction
+
+logger = logging.getLogger("led-matrix-sign")
+
+LATENCY_HISTORY = 100  # samples kept per command type
+
+
+@dataclass
+class BaseUICommand:
+    pass
+
+
+class UICommand:
+
+    @dataclass
+    class ModeShift(BaseUICommand):
+        pass
+
+    @dataclass
+    class ModeChange(BaseUICommand):
+        mode: SignMode
+
+    @dataclass
+    class MBTAChangeStation(BaseUICommand):
+        station: str
+
+    @dataclass
+    class MBTATestBanner(BaseUICommand):
+        lines: list[str]
+
+    @dataclass
+    class MTAChangeStation(BaseUICommand):
+        station: str
+
+    @dataclass
+    class MTAChangeDirection(BaseUICommand):
+        direction: Direction
+
+    @dataclass
+    class MTAAlert(BaseUICommand):
+        content: str
+
+    @dataclass
+    class SetBrightness(BaseUICommand):
+        brightness: int
+
+    @dataclass
+    class Test(BaseUICommand):
+        content: str
+
+    @dataclass
+    class Shutdown(BaseUICommand):
+        pass
+
+
+@dataclass
+class PendingCommand:
+    command: BaseUICommand
+    future: Future
+    # when the button was pressed or the request came in
+    submitted_at: float = field(default_factory=time.monotonic)
+    # set once the handler succeeded and once its frame was on the matrix,
+    # which can happen in either order
+    applied: bool = False
+    frame_latency: Optional[float] = None
+
+
+Command = TypeVar("Command", bound=BaseUICommand)
+
+
+class CommandBus:
+    """
+    Carries UI commands from the button and the web server to the UI thread,
+    which applies them through a table of handlers by command type.
+    submit() returns a Future that completes once the handler has run.
+    For every command type the bus records how long commands took to be
+    applied and to reach the matrix, counted from the button press or request.
+    Commands whose handler failed are not recorded.
+    """
+
+    def __init__(self, maxsize: int = 16) -> None:
+        self._queue: queue.Queue[PendingCommand] = queue.Queue(maxsize=maxsize)
+        self._handlers: dict[type, Callable[[Any], None]] = {}
+        self._latencies: dict[str, dict[str, deque[float]]] = {}
+        self._lock = threading.Lock()
+        # called with every submitted command, e.g. to record a trace
+        self.on_submit: Optional[Callable[[BaseUICommand], None]] = None
+
+    def register(
+        self, command_type: type[Command], handler: Callable[[Command], None]
+    ) -> None:
+        self._handlers[command_type] = handler
+
+    def submit(self, command: BaseUICommand) -> Future:
+        if self.on_submit is not None:
+            self.on_submit(command)
+        pending = PendingCommand(command, Future())
+        self._queue.put(pending)
+        return pending.future
+
+    def run(
+        self,
+        on_next_frame: Callable[[BaseUICommand, Callable[[], None]], None],
+    ) -> None:
+        """
+        Applies commands as they arrive, forever. on_next_frame(command,
+        callback) must call callback once the first frame that shows command
+        is on the matrix: not a frame that was only cleared, nor one another
+        thread drew in the meantime. It is called before the handler, so the
+        handler's own frames count.
+        """
+        while True:
+            pending = self._queue.get()
+            command = pending.command
+            handler = self._handlers.get(type(command))
+            if handler is None:
+                logger.error(f"No handler for command {command}")
+                pending.future.set_exception(LookupError(f"No handler for {command}"))
+                continue
+            on_next_frame(command, lambda pending=pending: self._on_frame(pending))
+            try:
+                handler(command)
+            except Exception as e:
+                logger.error(f"Error applying command {command}: {e}")
+                pending.future.set_exception(e)
+                continue
+            self._record(command, "applied", time.monotonic() - pending.submitted_at)
+            with self._lock:
+                pending.applied = True
+                frame_latency = pending.frame_latency
+            if frame_latency is not None:
+                self._record_frame(pending.command, frame_latency)
+            pending.future.set_result(None)
+
+    def _on_frame(self, pending: PendingCommand) -> None:
+        latency = time.monotonic() - pending.submitted_at
+        with self._lock:
+            # recorded by run() if the handler is still running
+            pending.frame_latency = latency
+            applied = pending.applied
+        if applied:
+            self._record_frame(pending.command, latency)
+
+    def _record_frame(self, command: BaseUICommand, latency: float) -> None:
+        self._record(command, "frame", latency)
+        logger.info(
+            f"Command {type(command).__name__} reached the matrix "
+            f"after {latency * 1000:.1f} ms"
+        )
+
+    def _record(self, command: BaseUICommand, kind: str, latency: float) -> None:
+        with self._lock:
+            samples = self._latencies.setdefault(type(command).__name__, {})
+            samples.setdefault(kind, deque(maxlen=LATENCY_HISTORY)).append(latency)
+
+    def get_latency_stats(self) -> dict[str, dict[str, Any]]:
+        """Sample count, median and worst latency in ms per command type."""
+        stats: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for name, latencies in self._latencies.items():
+                stats[name] = {}
+                for kind, samples in latencies.items():
+                    stats[name][f"{kind}_count"] = len(samples)
+                    stats[name][f"{kind}_median_ms"] = statistics.median(samples) * 1000
+                    stats[name][f"{kind}_max_ms"] = max(samples) * 1000
+        return stats
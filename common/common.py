@@ -5,6 +5,7 @@ from pathlib import Path
 CURRENT_FOLDER = Path(__file__).parent
 fonts_dir = CURRENT_FOLDER.parent / "fonts"
 img_dir = CURRENT_FOLDER.parent / "img"
+cache_dir = CURRENT_FOLDER.parent / "cache"
 
 
 class SignMode(Enum):
@@ -22,24 +23,17 @@ class SignMode(Enum):
 DISABLED_MODES = [SignMode.TEST, SignMode.WIDGET]
 
 
-class UIMessageType(Enum):
-    TEST = 0
-    MODE_SHIFT = 1
-    MODE_CHANGE = 2
-    MBTA_CHANGE_STATION = 3
-    MBTA_TEST_BANNER = 4
-    MTA_CHANGE_STATION = 5
-    MTA_CHANGE_DIRECTION = 6
-    MTA_ALERT = 7
-    SHUTDOWN = 8
-
-
 class ClockType(Enum):
     DEFAULT = 0
     MBTA = 1
     MTA = 2
 
 
+class GameOfLifeColorMode(Enum):
+    MONO = 0
+    AGE = 1
+
+
 class Fonts:
     MBTA = ImageFont.truetype(str(fonts_dir / "MBTASans-Regular.otf"), 8)
     SILKSCREEN = ImageFont.truetype(str(fonts_dir / "Silkscreen-Normal.ttf"), 8)
@@ -0,0 +1,74 @@
+import logging
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+from PIL import Image
+from .common import SignMode
+
+logger = logging.getLogger("led-matrix-sign")
+
+# bump when SignSnapshot changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class SignSnapshot:
+    """What the sign was showing, enough to come back up looking the same."""
+
+    # wall clock time, since the snapshot is read by the next process
+    saved_at: float
+    frame_size: tuple[int, int]
+    # raw RGB bytes of the last frame swapped onto the matrix
+    frame: bytes
+    mode: SignMode
+    mbta_station: str
+    # mta.Status
+    mta_status: Any
+    # (mbta.PredictionStatus, list[mbta.Prediction]) and when it was shown
+    mbta_predictions: Any = None
+    mbta_predictions_at: float = 0.0
+    # list[mta.TrainTime] and when it was shown
+    mta_predictions: Any = None
+    mta_predictions_at: float = 0.0
+    version: int = SNAPSHOT_VERSION
+
+    def get_frame(self) -> Image.Image:
+        return Image.frombytes("RGB", self.frame_size, self.frame)
+
+    def get_age(self) -> float:
+        return max(0.0, time.time() - self.saved_at)
+
+
+def save_snapshot(path: Path, snapshot: SignSnapshot) -> None:
+    """Writes snapshot to path atomically, so a crash never leaves half a file."""
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Error writing snapshot {path}: {e}")
+
+
+def load_snapshot(path: Path, max_age: float) -> Optional[SignSnapshot]:
+    """The snapshot at path, unless it is missing, unreadable or too old."""
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # the pickled classes may have changed since it was written
+        logger.warning(f"Discarding snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, SignSnapshot) or snapshot.version != SNAPSHOT_VERSION:
+        logger.warning(f"Discarding snapshot {path}: unknown version")
+        return None
+    if snapshot.get_age() > max_age:
+        logger.info(f"Discarding snapshot {path}: {snapshot.get_age():.0f}s old")
+        return None
+    return snapshot
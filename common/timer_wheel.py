@@ -0,0 +1,67 @@
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass(eq=False)
+class Timer:
+    deadline_tick: int
+    callback: Callable[[], None]
+    cancelled: bool = field(default=False)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel. Timers are dropped into one of `slots` buckets by
+    their deadline tick, so scheduling is O(1) and every tick only looks at
+    a single bucket. Timers more than `slots` ticks away stay in their
+    bucket for extra turns of the wheel. Callbacks run on whichever thread
+    calls advance(), and may schedule new timers.
+    """
+
+    def __init__(self, tick: float = 0.05, slots: int = 256) -> None:
+        self.tick = tick
+        self.slots = slots
+        self._buckets: list[list[Timer]] = [[] for _ in range(slots)]
+        self._start = time.monotonic()
+        self._current_tick = 0
+        self._lock = threading.Lock()
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Runs callback on the first tick at least delay seconds from now."""
+        now_tick = (time.monotonic() - self._start) / self.tick
+        with self._lock:
+            # a timer for the current tick would be missed, run it on the next
+            deadline_tick = max(
+                self._current_tick + 1, math.ceil(now_tick + delay / self.tick)
+            )
+            timer = Timer(deadline_tick, callback)
+            self._buckets[deadline_tick % self.slots].append(timer)
+        return timer
+
+    def advance(self) -> None:
+        """Runs the callbacks of every timer that became due."""
+        target_tick = int((time.monotonic() - self._start) / self.tick)
+        while True:
+            with self._lock:
+                if self._current_tick >= target_tick:
+                    return
+                self._current_tick += 1
+                bucket = self._buckets[self._current_tick % self.slots]
+                if not bucket:
+                    continue
+                due = [t for t in bucket if t.deadline_tick <= self._current_tick]
+                bucket[:] = [t for t in bucket if t.deadline_tick > self._current_tick]
+            for timer in due:
+                if not timer.cancelled:
+                    timer.callback()
+
+    def get_time_to_next_tick(self) -> float:
+        """Seconds until the tick after the last one advance() processed."""
+        elapsed = time.monotonic() - self._start
+        return (self._current_tick + 1) * self.tick - elapsed
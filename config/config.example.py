@@ -11,3 +11,50 @@ MBTA_API_KEY = ""
 IPDATA_API_KEY = ""
 MTA_API_KEY = ""
 MTA_FAKE_DATA = False
+
+# Optional settings, shown with their defaults. Uncomment to change one.
+
+# Panel layout: panels of PANEL_WIDTH x PANEL_HEIGHT pixels, PANEL_COUNT of
+# them daisy-chained side by side, on PANEL_CHAINS parallel chains stacked
+# as rows
+# PANEL_WIDTH = 32  # pixels
+# PANEL_HEIGHT = 32  # pixels
+# PANEL_COUNT = 5
+# PANEL_CHAINS = 1
+
+# Refresh the matrix from a separate process, so rendering never delays it
+# DISPLAY_PROCESS = False
+
+# Save what the sign shows every SNAPSHOT_INTERVAL seconds (0 to never) and
+# restore it on a restart within SNAPSHOT_MAX_AGE seconds (0 to never)
+# SNAPSHOT_INTERVAL = 10  # seconds
+# SNAPSHOT_MAX_AGE = 600  # seconds
+
+# Requests per minute spent fetching for other modes ahead of a switch,
+# 0 to turn warm-up off
+# WARMUP_REQUESTS_PER_MINUTE = 12
+
+# Game of Life: "torus" wraps at the edges of the sign, "hashlife" runs on
+# an unbounded plane. The pattern is one of the names in
+# providers/game_of_life.py PATTERNS, a random board when unset.
+# GAME_OF_LIFE_ENGINE = "torus"
+# GAME_OF_LIFE_PATTERN = "glider"
+# GAME_OF_LIFE_GENERATIONS_PER_STEP = 1  # generations per frame
+# GAME_OF_LIFE_COLOR_MODE = GameOfLifeColorMode.MONO  # or AGE, from common
+# GAME_OF_LIFE_RUN_AHEAD = 30  # frames computed ahead of the display
+
+# Color correction, applied to every frame on its way to the matrix: gamma,
+# then white balance, then brightness. The defaults change nothing. LED
+# panels are linear, so without a gamma of about 2.2 dim colors such as
+# MTA_RED_AMBER come out too bright and off in hue. COLOR_GAMMA is one
+# value or one per channel, COLOR_WHITE_BALANCE the gain of each channel.
+# COLOR_GAMMA = 1.0  # e.g. 2.2 for most panels
+# COLOR_WHITE_BALANCE = (1.0, 1.0, 1.0)  # red, green, blue gains
+# Percent of full output, the starting value for the web brightness
+# setting. It scales beneath the matrix's own hardware brightness, which
+# is fixed at 50% on the sign (100% emulated), so 100 here means that.
+# BRIGHTNESS = 100  # percent
+
+# Where to reach the Spotify API, e.g. spotify_stub.py when testing
+# SPOTIFY_ACCOUNTS_URL = "https://accounts.spotify.com"
+# SPOTIFY_API_URL = "https://api.spotify.com/v1"
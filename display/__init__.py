@@ -1,3 +1,3 @@
-from .display import Display  # type: ignore[attr-defined]
+from .display import Display, PanelGeometry  # type: ignore[attr-defined]
 from .utils import *  # type: ignore[attr-defined]
 from .types import *  # type: ignore[attr-defined]
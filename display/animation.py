@@ -8,6 +8,7 @@ from PIL import Image, ImageDraw, ImageFont
 from queue import Queue
 from typing import Dict, Generator, Optional, Tuple
 from common import hex_to_rgb
+from display.framebuffer import scratch_surfaces
 from display.utils import get_image_with_color
 from providers import mta
 from .types import BaseRenderMessage, RenderMessage, Rect, AnimationFrame
@@ -68,27 +69,25 @@ class TextScrollAnimation(Animation):
         self.start_blank = start_blank
 
     def text_width(self) -> float:
-        image = Image.new("RGB", (self.bbox.w, self.bbox.h))
-        draw = ImageDraw.Draw(image)
-        draw.fontmode = "1"  # antialiasing off
-        return draw.textlength(self.text, font=self.font)
+        # the same length ImageDraw.textlength() measures with antialiasing off
+        return self.font.getlength(self.text, mode="1")
 
     def frame_generator(self) -> Generator[AnimationFrame, None, None]:
         tx, ty = self.text_pos
         start = 0
         if self.start_blank:
             start = self.bbox.w
-        end = -int(max(self.bbox.w, self.text_width()))
+        text_width = self.text_width()
+        end = -int(max(self.bbox.w, text_width))
         for i in range(start, end, -1):
-            image = Image.new("RGB", (self.bbox.w, self.bbox.h))
-            draw = ImageDraw.Draw(image)
-            draw.fontmode = "1"  # antialiasing off
-            x_pos1 = i
+            # the display hands the surface back to the pool once it is drawn
+            surface = scratch_surfaces.acquire(self.bbox.w, self.bbox.h)
+            draw = surface.draw
             draw.text((i + tx, ty), self.text, font=self.font, fill=self.color)
             if self.wrap:
-                x_pos2 = i + self.text_width()
+                x_pos2 = i + text_width
                 draw.text((x_pos2 + tx, ty), self.text, font=self.font, fill=self.color)
-            yield (self.bbox, image)
+            yield (self.bbox, surface.image)
 
 
 class MoveAnimation(Animation):
@@ -286,7 +285,9 @@ class AnimationManager:
     def start(self) -> None:
         if not self.is_running:
             self.is_running = True
-            self.thread = threading.Thread(target=self._run_animations, daemon=True)
+            self.thread = threading.Thread(
+                target=self._run_animations, name="animation", daemon=True
+            )
             self.thread.start()
 
     def stop(self) -> None:
@@ -295,11 +296,14 @@ class AnimationManager:
             self.thread.join()
 
     def clear(self) -> None:
+        # a stopped manager, as in replays and benchmarks, stays stopped
+        was_running = self.is_running
         self.stop()
         with self.lock:
             self.animations = {}
             self.animation_groups = {}
-        self.start()
+        if was_running:
+            self.start()
 
     def is_animation_running(self, key: str) -> bool:
         with self.lock:
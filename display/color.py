@@ -0,0 +1,55 @@
+import numpy as np
+from typing import Union
+
+Channels = tuple[float, float, float]
+
+
+class ColorCorrection:
+    """
+    Per-channel lookup tables applied to every pixel on its way to the
+    matrix: gamma first, then white balance, then brightness. The tables are
+    computed once per setting, so correcting a frame is one table lookup per
+    channel and pixel. The framebuffer keeps the uncorrected colors, so a new
+    brightness applies to what is on screen without drawing it again. The
+    defaults change nothing and are skipped entirely.
+    """
+
+    def __init__(
+        self,
+        gamma: Union[float, Channels] = 1.0,
+        white_balance: Channels = (1.0, 1.0, 1.0),
+        brightness: int = 100,
+    ) -> None:
+        if isinstance(gamma, (int, float)):
+            gamma = (gamma, gamma, gamma)
+        self.gamma: Channels = gamma
+        # gain of each channel, the brightest one usually stays at 1.0
+        self.white_balance = white_balance
+        # percent of full output
+        self.brightness = max(0, min(100, int(brightness)))
+        self.lut = np.empty((3, 256), dtype=np.uint8)
+        self.is_identity = True
+        self._update()
+
+    def set_brightness(self, brightness: int) -> None:
+        self.brightness = max(0, min(100, int(brightness)))
+        self._update()
+
+    def apply(self, source: np.ndarray, out: np.ndarray) -> None:
+        """Writes the corrected RGB channels of source into those of out."""
+        for channel in range(3):
+            # mode="clip" lets numpy write the strided view without a buffer
+            np.take(
+                self.lut[channel],
+                source[..., channel],
+                out=out[..., channel],
+                mode="clip",
+            )
+
+    def _update(self) -> None:
+        levels = np.arange(256) / 255
+        for channel in range(3):
+            values = levels ** self.gamma[channel]
+            values *= self.white_balance[channel] * self.brightness / 100
+            self.lut[channel] = np.round(np.clip(values, 0, 1) * 255)
+        self.is_identity = bool((self.lut == np.arange(256)).all())
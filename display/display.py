@@ -5,30 +5,101 @@ if config.EMULATE_RGB_MATRIX:
 else:
     from rgbmatrix import RGBMatrix, RGBMatrixOptions
 from .animation import AnimationManager
+from .executor import RenderExecutor
+from .headless import HeadlessMatrix
+from .shm import SharedMemoryMatrix
 from .render_mbta import render_mbta_content, render_mbta_banner_content
 from .render_mta import *
-from .render_music import render_music_content
+from .render_music import render_music_content, MusicScreenState
 from .render_game_of_life import render_game_of_life_content
+from .color import ColorCorrection
+from .framebuffer import Framebuffer, scratch_surfaces
+from .preview import FrameSnapshot
+from .swap_chain import SwapChain
 from .types import RenderMessage, BaseRenderMessage
 from common import Fonts, Colors, ClockType
 from PIL import Image, ImageDraw, ImageFont
+from dataclasses import dataclass
 from queue import Queue
-from typing import Optional
+from typing import Callable, Optional
 import threading
+import time
 
 PANEL_WIDTH = 32
 PANEL_HEIGHT = 32
 PANEL_COUNT = 5
-SCREEN_WIDTH = PANEL_WIDTH * PANEL_COUNT
-SCREEN_HEIGHT = PANEL_HEIGHT
+PANEL_CHAINS = 1
+# messages that draw nothing new, so the swap after them shows no content
+# that an AfterSwap callback could be waiting for
+SWAP_ONLY_MESSAGES = (
+    RenderMessage.Clear,
+    RenderMessage.Swap,
+    RenderMessage.AfterSwap,
+)
+# messages drawn later by the render executor; the JobResult they cause is
+# what puts them on the matrix
+DEFERRED_MESSAGES = (RenderMessage.MTA,)
+# an AfterSwap callback whose message is not drawn by then is dropped
+AFTER_SWAP_TIMEOUT = 30  # seconds
+
+
+@dataclass
+class PanelGeometry:
+    panel_width: int = PANEL_WIDTH
+    panel_height: int = PANEL_HEIGHT
+    # panels daisy-chained on each chain, side by side on the sign
+    panel_count: int = PANEL_COUNT
+    # parallel chains, stacked as rows of panels
+    chains: int = PANEL_CHAINS
+
+    def get_width(self) -> int:
+        return self.panel_width * self.panel_count
+
+    def get_height(self) -> int:
+        return self.panel_height * self.chains
+
+
+def get_color_correction() -> ColorCorrection:
+    gamma = 1.0
+    if hasattr(config, "COLOR_GAMMA"):
+        gamma = config.COLOR_GAMMA
+    white_balance = (1.0, 1.0, 1.0)
+    if hasattr(config, "COLOR_WHITE_BALANCE"):
+        white_balance = config.COLOR_WHITE_BALANCE
+    brightness = 100
+    if hasattr(config, "BRIGHTNESS"):
+        brightness = config.BRIGHTNESS
+    return ColorCorrection(gamma, white_balance, brightness)
+
+
+def get_panel_geometry() -> PanelGeometry:
+    geometry = PanelGeometry()
+    if hasattr(config, "PANEL_WIDTH"):
+        geometry.panel_width = config.PANEL_WIDTH
+    if hasattr(config, "PANEL_HEIGHT"):
+        geometry.panel_height = config.PANEL_HEIGHT
+    if hasattr(config, "PANEL_COUNT"):
+        geometry.panel_count = config.PANEL_COUNT
+    if hasattr(config, "PANEL_CHAINS"):
+        geometry.chains = config.PANEL_CHAINS
+    return geometry
 
 
 class Display:
-    def __init__(self, render_queue: Queue[BaseRenderMessage]) -> None:
+    def __init__(
+        self,
+        render_queue: Queue[BaseRenderMessage],
+        headless: bool = False,
+        geometry: Optional[PanelGeometry] = None,
+    ) -> None:
+        if geometry is None:
+            geometry = get_panel_geometry()
+        self.geometry = geometry
         options = RGBMatrixOptions()
-        options.rows = PANEL_HEIGHT
-        options.cols = PANEL_WIDTH
-        options.chain_length = PANEL_COUNT
+        options.rows = geometry.panel_height
+        options.cols = geometry.panel_width
+        options.chain_length = geometry.panel_count
+        options.parallel = geometry.chains
         if config.EMULATE_RGB_MATRIX:
             options.brightness = 100
         else:
@@ -37,25 +108,60 @@ class Display:
 
         options.gpio_slowdown = 3
 
-        self.matrix = RGBMatrix(options=options)
-        self.canvas = self.matrix.CreateFrameCanvas()
-        self.SCREEN_WIDTH = SCREEN_WIDTH
-        self.SCREEN_HEIGHT = SCREEN_HEIGHT
-        self.PANEL_WIDTH = PANEL_WIDTH
+        if headless:
+            self.matrix = HeadlessMatrix(options)
+        elif hasattr(config, "DISPLAY_PROCESS") and config.DISPLAY_PROCESS:
+            # refresh the matrix from its own process, away from this GIL
+            self.matrix = SharedMemoryMatrix(options)
+        else:
+            self.matrix = RGBMatrix(options=options)
+        self.SCREEN_WIDTH = geometry.get_width()
+        self.SCREEN_HEIGHT = geometry.get_height()
+        self.PANEL_WIDTH = geometry.panel_width
+        self.PANEL_HEIGHT = geometry.panel_height
+        # each panel is a tile of the framebuffer with its own dirty flag
+        self.framebuffer = Framebuffer(
+            self.SCREEN_WIDTH,
+            self.SCREEN_HEIGHT,
+            geometry.panel_width,
+            geometry.panel_height,
+        )
+        self.color_correction = get_color_correction()
+        self.framebuffer.color_correction = self.color_correction
+        self.matrix_lock = threading.Lock()
+        self.swap_chain = SwapChain(self.matrix, self.framebuffer, self.matrix_lock)
+        # text is measured on an empty image instead of a new one per call
+        self.measure_draw = self._get_draw_context_antialiased(Image.new("RGB", (0, 0)))
+        self.snapshot = FrameSnapshot(self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
         self.default_font = Fonts.SILKSCREEN
         self.animation_manager = AnimationManager(render_queue)
         self.animation_manager.start()
+        self.render_executor = RenderExecutor(render_queue)
         self.last_mbta_image: Optional[Image.Image] = None
         self.last_mta_image: Optional[Image.Image] = None
-        self.matrix_lock = threading.Lock()
+        self.music_screen_state = MusicScreenState()
+        # AfterSwap messages wait here, with when they expire, until what
+        # they are waiting for is drawn
+        self.waiting_swaps: list[tuple[float, RenderMessage.AfterSwap]] = []
+        self.swap_callbacks: list[Callable[[], None]] = []
 
     def render(self, message: BaseRenderMessage) -> None:
+        if self.waiting_swaps:
+            shown = self._get_shown_message(message)
+            if shown is not None:
+                self._release_swap_callbacks(shown)
         if isinstance(message, RenderMessage.Clear):
             self.clear()
         elif isinstance(message, RenderMessage.Frame):
             self.render_frame_content(message)
         elif isinstance(message, RenderMessage.Swap):
             self.swap_canvas()
+        elif isinstance(message, RenderMessage.JobResult):
+            self.render_executor.apply(message)
+        elif isinstance(message, RenderMessage.Brightness):
+            self.set_brightness(message.brightness)
+        elif isinstance(message, RenderMessage.AfterSwap):
+            self.waiting_swaps.append((time.monotonic() + AFTER_SWAP_TIMEOUT, message))
         elif isinstance(message, RenderMessage.Text):
             self.render_text_content(message)
         elif isinstance(message, RenderMessage.Clock):
@@ -77,29 +183,72 @@ class Display:
         elif isinstance(message, RenderMessage.Music):
             render_music_content(self, message)
         elif isinstance(message, RenderMessage.GameOfLife):
-            self.render_game_of_life_content(message)
+            render_game_of_life_content(self, message)
+
+    def _get_shown_message(
+        self, message: BaseRenderMessage
+    ) -> Optional[BaseRenderMessage]:
+        """The message the next swap shows once message is rendered, if any."""
+        if isinstance(message, RenderMessage.JobResult):
+            if self.render_executor.is_stale(message.job):
+                return None
+            return message.job.source
+        if isinstance(message, SWAP_ONLY_MESSAGES + DEFERRED_MESSAGES):
+            return None
+        return message
+
+    def _release_swap_callbacks(self, message: BaseRenderMessage) -> None:
+        """
+        Moves the callbacks waiting for message to swap_callbacks, since the
+        next swap shows it, and drops those that waited too long.
+        """
+        now = time.monotonic()
+        waiting = []
+        for deadline, after_swap in self.waiting_swaps:
+            if not after_swap.shows or isinstance(message, after_swap.shows):
+                self.swap_callbacks.append(after_swap.callback)
+            elif now < deadline:
+                waiting.append((deadline, after_swap))
+        self.waiting_swaps = waiting
 
     def clear(self) -> None:
         self.animation_manager.clear()
-        self.canvas.Clear()
+        # a screen still being rasterized belongs to what is being cleared
+        self.render_executor.cancel()
+        self.music_screen_state = MusicScreenState()
+        self.framebuffer.clear()
         self.swap_canvas()
 
     def swap_canvas(self) -> None:
-        with self.matrix_lock:
-            self.matrix.SwapOnVSync(self.canvas)
+        boxes = self.swap_chain.swap()
+        if boxes:
+            self.snapshot.publish(self.framebuffer.rgb, boxes)
+        if self.swap_callbacks:
+            callbacks, self.swap_callbacks = self.swap_callbacks, []
+            for callback in callbacks:
+                callback()
+
+    def set_brightness(self, brightness: int) -> None:
+        self.color_correction.set_brightness(brightness)
+        # the frame is unchanged, but every canvas needs it corrected again
+        self.framebuffer.mark_dirty()
+        self.swap_canvas()
 
     def render_frame_content(self, message: RenderMessage.Frame) -> None:
-        self.canvas.SetImage(message.frame, int(message.bbox.x), int(message.bbox.y))
+        self.framebuffer.paste(message.frame, message.bbox.x, message.bbox.y)
+        # animation frames drawn on scratch surfaces go back to the pool
+        scratch_surfaces.release(message.frame)
 
     def render_text_content(self, message: RenderMessage.Text) -> None:
-        image = Image.new("RGB", (SCREEN_WIDTH, SCREEN_HEIGHT))
-        draw = self._get_draw_context_antialiased(image)
-        draw.text((0, 0), message.text, font=self.default_font, fill=Colors.WHITE)
-        self._update_display(image)
+        self.framebuffer.clear()
+        self.framebuffer.draw.text(
+            (0, 0), message.text, font=self.default_font, fill=Colors.WHITE
+        )
+        self.swap_canvas()
 
     def render_clock_content(self, message: RenderMessage.Clock) -> None:
-        image = Image.new("RGB", (SCREEN_WIDTH, SCREEN_HEIGHT), Colors.BLACK)
-        draw = self._get_draw_context_antialiased(image)
+        self.framebuffer.clear()
+        draw = self.framebuffer.draw
         if message.clock_type == ClockType.MTA:
             lines = [
                 message.time.strftime("%a, %b %-d, %Y"),
@@ -107,16 +256,16 @@ class Display:
             ]
             for i, line in enumerate(lines):
                 draw.text(
-                    (SCREEN_WIDTH / 2, 2 + 16 * i),
+                    (self.SCREEN_WIDTH / 2, 2 + 16 * i),
                     line,
                     font=Fonts.MTA,
                     fill=Colors.MTA_GREEN,
                     anchor="mt",
                 )
-        self._update_display(image)
+        self.swap_canvas()
 
     def _update_display(self, image: Image.Image, x: int = 0, y: int = 0) -> None:
-        self.canvas.SetImage(image, int(x), int(y))
+        self.framebuffer.paste(image, x, y)
         self.swap_canvas()
 
     def _get_draw_context_antialiased(self, image: Image.Image) -> ImageDraw.ImageDraw:
@@ -125,20 +274,11 @@ class Display:
         return draw
 
     def _get_text_length(self, text: str, font: ImageFont.FreeTypeFont) -> float:
-        draw = self._get_draw_context_antialiased(Image.new("RGB", (0, 0)))
-        return draw.textlength(text, font=font)
+        return self.measure_draw.textlength(text, font=font)
 
     def _trim_text_to_fit(
         self, text: str, font: ImageFont.FreeTypeFont, max_width: int
     ) -> str:
-        draw = self._get_draw_context_antialiased(Image.new("RGB", (0, 0)))
-        while draw.textlength(text, font=font) > max_width:
+        while self.measure_draw.textlength(text, font=font) > max_width:
             text = text[:-1]
         return text
-
-    def render_game_of_life_content(self, message: RenderMessage.GameOfLife) -> None:
-        """Render Conway's Game of Life to the display."""
-        image = render_game_of_life_content(
-            message, self.SCREEN_WIDTH, self.SCREEN_HEIGHT
-        )
-        self._update_display(image)
@@ -0,0 +1,153 @@
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from queue import Queue
+from typing import Any, Callable
+from .types import BaseRenderMessage, RenderMessage
+
+logger = logging.getLogger("led-matrix-sign")
+
+RENDER_JOB_HISTORY = 100  # timings kept per job key
+
+
+@dataclass
+class RenderJob:
+    key: str
+    job_id: int
+    rasterize: Callable[[], Any]
+    apply: Callable[[Any], None]
+    submitted_at: float
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    # the render message this job draws, so its result can stand in for it
+    source: Any = None
+
+
+@dataclass
+class RenderJobStats:
+    applied: int = 0
+    dropped: int = 0
+    failed: int = 0
+    queue_times: deque[float] = field(
+        default_factory=lambda: deque(maxlen=RENDER_JOB_HISTORY)
+    )
+    execution_times: deque[float] = field(
+        default_factory=lambda: deque(maxlen=RENDER_JOB_HISTORY)
+    )
+
+
+class RenderExecutor:
+    """
+    Rasterizes expensive screens on a fixed set of worker threads, so the
+    render thread stays the only one drawing on the canvas. A job is keyed
+    by the screen it draws: at most one job per key waits to run, and a new
+    one replaces it. rasterize() runs on a worker and must not touch the
+    canvas; its result comes back through the render queue as a
+    RenderMessage.JobResult, and apply() then runs on the render thread,
+    unless a newer job for the same key or a cancel() made it stale.
+    """
+
+    def __init__(self, results: Queue[BaseRenderMessage], workers: int = 1) -> None:
+        self.results = results
+        self._pending: dict[str, RenderJob] = {}
+        # newest job id per key, older results are stale
+        self._latest: dict[str, int] = {}
+        # results of jobs older than this are stale, see cancel()
+        self._cutoff = 0
+        self._next_id = 0
+        self._condition = threading.Condition()
+        self._stats: dict[str, RenderJobStats] = {}
+        for i in range(workers):
+            threading.Thread(
+                target=self._work, name=f"render-worker-{i}", daemon=True
+            ).start()
+
+    def submit(
+        self,
+        key: str,
+        rasterize: Callable[[], Any],
+        apply: Callable[[Any], None],
+        source: Any = None,
+    ) -> None:
+        with self._condition:
+            job = RenderJob(
+                key, self._next_id, rasterize, apply, time.monotonic(), source=source
+            )
+            self._next_id += 1
+            if key in self._pending:
+                self._get_stats(key).dropped += 1
+            self._pending[key] = job
+            self._latest[key] = job.job_id
+            self._condition.notify()
+
+    def cancel(self) -> None:
+        """Drops all waiting jobs and the results of running ones."""
+        with self._condition:
+            for key in self._pending:
+                self._get_stats(key).dropped += 1
+            self._pending.clear()
+            self._cutoff = self._next_id
+
+    def apply(self, message: RenderMessage.JobResult) -> None:
+        """Applies a finished job's result; call on the render thread only."""
+        job: RenderJob = message.job
+        with self._condition:
+            stats = self._get_stats(job.key)
+            if self.is_stale(job):
+                stats.dropped += 1
+                return
+            stats.applied += 1
+            stats.queue_times.append(job.started_at - job.submitted_at)
+            stats.execution_times.append(job.finished_at - job.started_at)
+        job.apply(message.result)
+
+    def is_stale(self, job: RenderJob) -> bool:
+        """Whether a newer job for the same key or a cancel() replaced job."""
+        with self._condition:
+            return job.job_id < self._cutoff or job.job_id != self._latest.get(job.key)
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        """Job counts, and median and worst queue and execution time in ms."""
+        stats: dict[str, dict[str, Any]] = {}
+        with self._condition:
+            for key, job_stats in self._stats.items():
+                stats[key] = {
+                    "applied": job_stats.applied,
+                    "dropped": job_stats.dropped,
+                    "failed": job_stats.failed,
+                }
+                for name, samples in [
+                    ("queue", job_stats.queue_times),
+                    ("execution", job_stats.execution_times),
+                ]:
+                    if samples:
+                        stats[key][f"{name}_median_ms"] = (
+                            statistics.median(samples) * 1000
+                        )
+                        stats[key][f"{name}_max_ms"] = max(samples) * 1000
+        return stats
+
+    def _get_stats(self, key: str) -> RenderJobStats:
+        if key not in self._stats:
+            self._stats[key] = RenderJobStats()
+        return self._stats[key]
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._pending) > 0)
+                key = next(iter(self._pending))
+                job = self._pending.pop(key)
+            job.started_at = time.monotonic()
+            try:
+                result = job.rasterize()
+            except Exception as e:
+                logger.error(f"Error rendering {key}: {e}")
+                with self._condition:
+                    self._get_stats(key).failed += 1
+                continue
+            job.finished_at = time.monotonic()
+            self.results.put(RenderMessage.JobResult(job=job, result=result))
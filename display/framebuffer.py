@@ -0,0 +1,225 @@
+import threading
+import numpy as np
+from PIL import Image, ImageDraw
+from typing import Any, Optional
+from .color import ColorCorrection
+from .types import Rect
+
+
+class Surface:
+    """
+    An RGB image whose pixels are also a numpy array. PIL draws into .image
+    and numpy code writes .rgb, and both see the same memory, so nothing is
+    copied between them.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        # RGBX, PIL only maps 4 byte pixels onto a buffer without copying it
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        self.pixels[..., 3] = 255
+        self.rgb = self.pixels[..., :3]
+        self.image = Image.frombuffer(
+            "RGBX", (width, height), self.pixels, "raw", "RGBX", 0, 1
+        )
+        # images mapped onto a buffer start out read-only, but we own it
+        self.image.readonly = 0
+        self.draw = ImageDraw.Draw(self.image)
+        self.draw.fontmode = "1"  # turn off antialiasing
+        # whether a SurfacePool handed this out and has not got it back
+        self.is_lent = False
+
+    def region(self, rect: Rect) -> np.ndarray:
+        """A view of the RGB pixels in rect, clipped to the surface."""
+        x0, y0 = max(int(rect.x), 0), max(int(rect.y), 0)
+        x1 = min(int(rect.x + rect.w), self.width)
+        y1 = min(int(rect.y + rect.h), self.height)
+        return self.rgb[y0 : max(y0, y1), x0 : max(x0, x1)]
+
+    def clear(
+        self, rect: Optional[Rect] = None, color: tuple[int, int, int] = (0, 0, 0)
+    ) -> None:
+        if rect is None:
+            self.rgb[:] = color
+        else:
+            self.region(rect)[:] = color
+
+    def paste(self, image: Image.Image, x: int = 0, y: int = 0) -> None:
+        """Copies image to (x, y), clipping whatever falls off the surface."""
+        box = (int(x), int(y), int(x) + image.width, int(y) + image.height)
+        if image.mode in ("RGB", "RGBX"):
+            # both keep 4 bytes per pixel, so the core can copy without the
+            # converted temporary image that Image.paste() would make
+            image.load()
+            self.image.im.paste(image.im, box)
+        else:
+            self.image.paste(image.convert("RGB"), box)
+
+
+# (left, top, right, bottom), right and bottom exclusive
+Box = tuple[int, int, int, int]
+# how many differently sized upload images to keep around
+UPLOAD_IMAGE_CACHE_SIZE = 16
+
+
+class Framebuffer(Surface):
+    """
+    The one drawing surface of the display. Renderers draw into it in place,
+    and swapping uploads it to the matrix canvas through reused RGB images,
+    since the drivers only accept RGB.
+
+    The frame is split into tiles, one per panel, and changes are tracked
+    per tile so distant updates do not drag everything between them along.
+    paste() and clear() mark the tiles they changed; code that draws through
+    .draw or writes .rgb directly must call mark_dirty() for what it touched.
+
+    Color correction happens on upload, into a second buffer, so the frame
+    itself always holds the colors as drawn.
+    """
+
+    def __init__(
+        self, width: int, height: int, tile_width: int, tile_height: int
+    ) -> None:
+        super().__init__(width, height)
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tile_rows = -(-height // tile_height)
+        self.tile_columns = -(-width // tile_width)
+        self.dirty = np.zeros((self.tile_rows, self.tile_columns), dtype=bool)
+        self._upload_images: dict[tuple[int, int], Image.Image] = {}
+        self.color_correction: Optional[ColorCorrection] = None
+        self._corrected: Optional[np.ndarray] = None
+
+    def mark_dirty(self, rect: Optional[Rect] = None) -> None:
+        if rect is None:
+            self.dirty[:] = True
+            return
+        x0, y0 = max(int(rect.x), 0), max(int(rect.y), 0)
+        x1 = min(int(rect.x + rect.w), self.width)
+        y1 = min(int(rect.y + rect.h), self.height)
+        if x0 < x1 and y0 < y1:
+            self.dirty[
+                y0 // self.tile_height : -(-y1 // self.tile_height),
+                x0 // self.tile_width : -(-x1 // self.tile_width),
+            ] = True
+
+    def take_dirty(self) -> np.ndarray:
+        """The tiles changed since the last call, as a boolean mask."""
+        dirty = self.dirty.copy()
+        self.dirty[:] = False
+        return dirty
+
+    def get_boxes(self, tiles: np.ndarray) -> list[Box]:
+        """The tiles set in the mask, with runs along a tile row merged."""
+        boxes = []
+        for row, columns in enumerate(tiles):
+            if not columns.any():
+                continue
+            y0 = row * self.tile_height
+            y1 = min(y0 + self.tile_height, self.height)
+            # starts and ends of the runs of set tiles in this row
+            edges = np.flatnonzero(np.diff(columns, prepend=False, append=False))
+            for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                x0 = start * self.tile_width
+                x1 = min(end * self.tile_width, self.width)
+                boxes.append((x0, y0, x1, y1))
+        return boxes
+
+    def clear(
+        self, rect: Optional[Rect] = None, color: tuple[int, int, int] = (0, 0, 0)
+    ) -> None:
+        super().clear(rect, color)
+        self.mark_dirty(rect)
+
+    def paste(self, image: Image.Image, x: int = 0, y: int = 0) -> None:
+        super().paste(image, x, y)
+        self.mark_dirty(Rect(int(x), int(y), image.width, image.height))
+
+    def upload(self, canvas: Any, box: Box) -> None:
+        """Puts the pixels in box on canvas."""
+        x0, y0, x1, y1 = box
+        pixels = self.pixels
+        correction = self.color_correction
+        if correction is not None and not correction.is_identity:
+            if self._corrected is None:
+                self._corrected = self.pixels.copy()
+            pixels = self._corrected
+            correction.apply(self.pixels[y0:y1, x0:x1], pixels[y0:y1, x0:x1])
+        image = self._get_upload_image(x1 - x0, y1 - y0)
+        # the raw decoder reads rows of the box straight out of the frame
+        offset = (y0 * self.width + x0) * 4
+        image.frombytes(
+            pixels.reshape(-1)[offset:].data, "raw", ("RGBX", self.width * 4)
+        )
+        canvas.SetImage(image, x0, y0)
+
+    def _get_upload_image(self, width: int, height: int) -> Image.Image:
+        image = self._upload_images.get((width, height))
+        if image is None:
+            if len(self._upload_images) >= UPLOAD_IMAGE_CACHE_SIZE:
+                self._upload_images.clear()
+            image = Image.new("RGB", (width, height))
+            self._upload_images[(width, height)] = image
+        return image
+
+
+class SurfacePool:
+    """
+    Recycles scratch surfaces by size, so frames that are drawn off the
+    framebuffer, by animations or render workers, reuse their pixels instead
+    of allocating a new image each time. release() takes the image of a
+    surface from acquire() and ignores any other; a surface that is never
+    released is simply garbage collected.
+    """
+
+    def __init__(self, max_free: int = 8) -> None:
+        self.max_free = max_free
+        self._free: dict[tuple[int, int], list[Surface]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, width: int, height: int) -> Surface:
+        """A cleared surface of the given size."""
+        with self._lock:
+            free = self._free.get((width, height))
+            surface = free.pop() if free else None
+            if surface is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if surface is None:
+            surface = Surface(width, height)
+            # lets release() find the surface from the image it handed out
+            setattr(surface.image, "_pool_surface", surface)
+        else:
+            surface.clear()
+        surface.is_lent = True
+        return surface
+
+    def release(self, image: Optional[Image.Image]) -> None:
+        surface: Optional[Surface] = getattr(image, "_pool_surface", None)
+        if surface is None:
+            return
+        with self._lock:
+            if not surface.is_lent:
+                return
+            surface.is_lent = False
+            self.released += 1
+            free = self._free.setdefault((surface.width, surface.height), [])
+            if len(free) < self.max_free:
+                free.append(surface)
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "released": self.released,
+            }
+
+
+# shared by the render thread, the animation thread and the render workers
+scratch_surfaces = SurfacePool()
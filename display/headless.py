@@ -0,0 +1,58 @@
+from PIL import Image
+from typing import Any, Optional
+
+
+class HeadlessCanvas:
+    """An in-memory stand-in for an rgbmatrix FrameCanvas."""
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.image = Image.new("RGB", (width, height))
+
+    def Clear(self) -> None:
+        self.image.paste((0, 0, 0), (0, 0, self.width, self.height))
+
+    def Fill(self, r: int, g: int, b: int) -> None:
+        self.image.paste((r, g, b), (0, 0, self.width, self.height))
+
+    def SetPixel(self, x: int, y: int, r: int, g: int, b: int) -> None:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.image.putpixel((int(x), int(y)), (r, g, b))
+
+    def SetImage(
+        self,
+        image: Image.Image,
+        offset_x: int = 0,
+        offset_y: int = 0,
+        unsafe: bool = True,
+    ) -> None:
+        self.image.paste(image, (int(offset_x), int(offset_y)))
+
+
+class HeadlessMatrix:
+    """
+    An rgbmatrix RGBMatrix replacement that keeps frames in memory instead of
+    driving any hardware or emulator window. Used for benchmarks and replays.
+    Like the real driver, SwapOnVSync returns the buffer that was on screen
+    before the swap.
+    """
+
+    def __init__(self, options: Any) -> None:
+        self.width = options.cols * options.chain_length
+        self.height = options.rows * options.parallel
+        self.front: Optional[HeadlessCanvas] = None
+        self.swap_count = 0
+
+    def CreateFrameCanvas(self) -> HeadlessCanvas:
+        return HeadlessCanvas(self.width, self.height)
+
+    def SwapOnVSync(
+        self, canvas: HeadlessCanvas, framerate_fraction: int = 1
+    ) -> HeadlessCanvas:
+        previous = self.front
+        self.front = canvas
+        self.swap_count += 1
+        if previous is None:
+            return self.CreateFrameCanvas()
+        return previous
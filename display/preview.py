@@ -0,0 +1,165 @@
+import struct
+import threading
+import time
+import numpy as np
+from PIL import Image
+from typing import Iterator, Optional
+from .framebuffer import Box
+
+# Preview frames are sent as changed square tiles of this many pixels
+PREVIEW_TILE_SIZE = 8
+PREVIEW_MAX_FPS = 20
+# how long a one-off read waits for the render thread to catch the copy up
+SNAPSHOT_CATCH_UP_TIMEOUT = 0.2  # seconds
+
+
+class FrameSnapshot:
+    """
+    The last frame swapped onto the matrix. publish() is called on every
+    swap. While a stream is subscribed it copies the boxes that changed;
+    otherwise it only marks them stale, and a one-off read has the render
+    thread copy them at its next swap. Only the render thread copies, and
+    only at a swap, since between swaps the frame may be half drawn. A read
+    that waits in vain gets the last frame copied, which is older but whole.
+    Encoding happens on the threads of whoever reads the frames, so there
+    is no cost when nobody watches.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        self.frame_id = 0
+        self.subscribers = 0
+        self._stale = np.zeros((height, width, 1), dtype=bool)
+        self._has_stale = False
+        self._catch_up = False
+        self._condition = threading.Condition()
+
+    def subscribe(self) -> None:
+        with self._condition:
+            self.subscribers += 1
+
+    def unsubscribe(self) -> None:
+        with self._condition:
+            self.subscribers -= 1
+
+    def publish(self, frame: np.ndarray, boxes: list[Box]) -> None:
+        """Takes the boxes of the RGB frame that changed since the last one."""
+        with self._condition:
+            if self.subscribers or self._catch_up:
+                if self._has_stale:
+                    self._copy_stale(frame)
+                for x0, y0, x1, y1 in boxes:
+                    self.pixels[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+                self._catch_up = False
+            else:
+                for x0, y0, x1, y1 in boxes:
+                    self._stale[y0:y1, x0:x1] = True
+                    self._has_stale = True
+            self.frame_id += 1
+            self._condition.notify_all()
+
+    def get_frame(self) -> tuple[int, np.ndarray]:
+        """Returns the frame id and a copy of the pixels as an RGB array."""
+        with self._condition:
+            self._update()
+            return self.frame_id, self.pixels.copy()
+
+    def wait_for_frame(self, last_frame_id: int, timeout: float) -> bool:
+        """Waits until a frame newer than last_frame_id was published."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.frame_id != last_frame_id, timeout
+            )
+
+    def get_image(self) -> Image.Image:
+        with self._condition:
+            self._update()
+            return Image.fromarray(self.pixels)
+
+    def get_current_image(self) -> Optional[Image.Image]:
+        """Like get_image(), but None if the frame on show could not be had."""
+        with self._condition:
+            self._update()
+            if self._has_stale:
+                return None
+            return Image.fromarray(self.pixels)
+
+    def _update(self) -> None:
+        """
+        Has the render thread bring stale pixels up to date at its next swap
+        and waits for it, with the condition held. On a timeout the request
+        stands, so a later read gets the frame that is on show by then.
+        """
+        if not self._has_stale:
+            return
+        self._catch_up = True
+        self._condition.wait_for(lambda: not self._has_stale, SNAPSHOT_CATCH_UP_TIMEOUT)
+
+    def _copy_stale(self, frame: np.ndarray) -> None:
+        np.copyto(self.pixels, frame, where=self._stale)
+        self._stale[:] = False
+        self._has_stale = False
+
+
+def encode_tiles(
+    frame: np.ndarray, previous: Optional[np.ndarray], tile_size: int
+) -> bytes:
+    """
+    Encodes the tiles of frame that differ from previous, or all of them
+    when previous is None, as one length-prefixed binary message:
+
+        u32 length, u16 width, u16 height, u8 tile size, u16 tile count,
+        then per tile: u8 column, u8 row, tile_size * tile_size RGB pixels
+    """
+    height, width, _ = frame.shape
+    # panel sides are multiples of 8 pixels, so tiles always fit exactly
+    assert height % tile_size == 0 and width % tile_size == 0
+    rows, columns = height // tile_size, width // tile_size
+    tiles = frame.reshape(rows, tile_size, columns, tile_size, 3).swapaxes(1, 2)
+    if previous is None:
+        changed = np.ones((rows, columns), dtype=bool)
+    else:
+        previous_tiles = previous.reshape(
+            rows, tile_size, columns, tile_size, 3
+        ).swapaxes(1, 2)
+        changed = (tiles != previous_tiles).any(axis=(2, 3, 4))
+    tile_rows, tile_columns = np.nonzero(changed)
+    chunks = [struct.pack("<HHBH", width, height, tile_size, len(tile_rows))]
+    for row, column in zip(tile_rows.tolist(), tile_columns.tolist()):
+        chunks.append(struct.pack("<BB", column, row))
+        chunks.append(tiles[row, column].tobytes())
+    body = b"".join(chunks)
+    return struct.pack("<I", len(body)) + body
+
+
+def stream_tiles(
+    snapshot: FrameSnapshot,
+    max_fps: float = PREVIEW_MAX_FPS,
+    tile_size: int = PREVIEW_TILE_SIZE,
+    keepalive: float = 5.0,
+) -> Iterator[bytes]:
+    """
+    Yields a full frame and then only the tiles that changed, at most
+    max_fps times per second. Sends an empty update every keepalive
+    seconds so a closed connection is noticed.
+    """
+    previous: Optional[np.ndarray] = None
+    frame_id = -1
+    interval = 1 / max_fps
+    snapshot.subscribe()
+    try:
+        while True:
+            if not snapshot.wait_for_frame(frame_id, keepalive):
+                if previous is not None:
+                    yield encode_tiles(previous, previous, tile_size)
+                continue
+            frame_id, frame = snapshot.get_frame()
+            yield encode_tiles(frame, previous, tile_size)
+            previous = frame
+            # frames published in the meantime are merged into the next update
+            time.sleep(interval)
+    finally:
+        # runs when the server closes the generator of a dropped client
+        snapshot.unsubscribe()
@@ -1,25 +1,62 @@
-from PIL import Image
-from common import Colors
-from .types import RenderMessage
+from common import Colors, GameOfLifeColorMode
+from providers.game_of_life import DYING, NEWBORN, OLDEST
+from typing import Any
+from .types import RenderMessage, Rect
 import numpy as np
 
+# Generations it takes a newborn cell to fade to the mature color
+MATURE_AGE = 16
+NEWBORN_COLOR = Colors.WHITE
+YOUNG_COLOR = (255, 200, 0)
+MATURE_COLOR = (0, 90, 255)
+DYING_COLOR = (90, 0, 0)
+
+
+def _get_mono_lut() -> np.ndarray:
+    lut = np.zeros((256, 3), dtype=np.uint8)
+    lut[NEWBORN : OLDEST + 1] = Colors.WHITE
+    return lut
+
+
+def _get_age_lut() -> np.ndarray:
+    lut = np.zeros((256, 3), dtype=np.uint8)
+    lut[NEWBORN] = NEWBORN_COLOR
+    fade = np.linspace(0, 1, MATURE_AGE)[:, np.newaxis]
+    young, mature = np.array(YOUNG_COLOR), np.array(MATURE_COLOR)
+    lut[NEWBORN + 1 : NEWBORN + 1 + MATURE_AGE] = young + (mature - young) * fade
+    lut[NEWBORN + 1 + MATURE_AGE : OLDEST + 1] = MATURE_COLOR
+    lut[DYING] = DYING_COLOR
+    return lut
+
+
+# Maps the uint8 cell codes of RenderMessage.GameOfLife to colors. Plain
+# 0/1 grids are valid age codes, so every mode works with either.
+COLOR_LUTS = {
+    GameOfLifeColorMode.MONO: _get_mono_lut(),
+    GameOfLifeColorMode.AGE: _get_age_lut(),
+}
+
 
 def render_game_of_life_content(
-    message: RenderMessage.GameOfLife, screen_width: int, screen_height: int
-) -> Image.Image:
+    display: Any, message: RenderMessage.GameOfLife
+) -> None:
+    """Render Conway's Game of Life to the display."""
+    framebuffer = display.framebuffer
     grid = message.grid
+    if grid.dtype == np.bool_:
+        grid = grid.view(np.uint8)
+    grid = grid[: framebuffer.height, : framebuffer.width]
     grid_height, grid_width = grid.shape
-
-    # Convert boolean numpy array to RGB image data
-    # Create RGB array: alive cells = white (255,255,255), dead cells = black (0,0,0)
-    rgb_array = np.zeros((grid_height, grid_width, 3), dtype=np.uint8)
-    rgb_array[grid] = [255, 255, 255]  # Set alive cells to white
-    game_img = Image.fromarray(rgb_array, "RGB")
-
-    # If grid is smaller than screen, paste onto black background
-    if grid_width != screen_width or grid_height != screen_height:
-        img = Image.new("RGB", (screen_width, screen_height), Colors.BLACK)
-        img.paste(game_img, (0, 0))
-        return img
-    else:
-        return game_img
+    if grid.shape != (framebuffer.height, framebuffer.width):
+        # anything outside a grid smaller than the screen stays black
+        framebuffer.clear()
+    # colors go straight into the framebuffer, so rendering allocates nothing
+    np.take(
+        COLOR_LUTS[message.color_mode],
+        grid,
+        axis=0,
+        out=framebuffer.rgb[:grid_height, :grid_width],
+        mode="clip",
+    )
+    framebuffer.mark_dirty(Rect(0, 0, grid_width, grid_height))
+    display.swap_canvas()
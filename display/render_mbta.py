@@ -7,11 +7,9 @@ from .types import RenderMessage, Rect
 
 
 def render_mbta_content(display: Any, message: RenderMessage.MBTA) -> None:
-    # Create new image with black background
-    image = Image.new(
-        "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-    )
-    draw = display._get_draw_context_antialiased(image)
+    framebuffer = display.framebuffer
+    framebuffer.clear()
+    draw = framebuffer.draw
     status, predictions = message.status, message.predictions
 
     if status in [
@@ -43,8 +41,13 @@ def render_mbta_content(display: Any, message: RenderMessage.MBTA) -> None:
             fill=Colors.MBTA_AMBER,
         )
 
-    display.last_mbta_image = image
-    display._update_display(image)
+    if display.last_mbta_image is None:
+        display.last_mbta_image = Image.new(
+            "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT)
+        )
+    # kept for the banner to scroll away, always copied into the same image
+    display.last_mbta_image.frombytes(framebuffer.pixels.data, "raw", "RGBX")
+    display.swap_canvas()
 
 
 def render_mbta_banner_content(display: Any, message: RenderMessage.MBTABanner) -> None:
@@ -1,7 +1,9 @@
 import providers.mta as mta
-import threading
-from typing import Any
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
 from .animation import MTAAlertAnimation, MTABlinkAnimation, MTAStartupAnimation
+from .framebuffer import Surface, scratch_surfaces
 from .utils import get_image_with_color
 from common import Colors, Fonts
 from datetime import datetime
@@ -14,42 +16,49 @@ abbreviations = {
 }
 
 
+@dataclass
+class MTAFrame:
+    # a scratch surface, back to the pool once it is no longer shown
+    surface: Surface
+    # no predictions, the image says the schedule is not available
+    is_empty: bool = False
+    # the first train is close enough for the blinking "0min"
+    wants_blink: bool = False
+
+
 def render_mta_content(display: Any, message: RenderMessage.MTA) -> None:
-    mta_render_thread = threading.Thread(
-        target=_render_mta_content_task, args=(display, message)
+    # drawing the board is slow, so it happens on the render executor and
+    # only the finished image is put on the canvas here
+    display.render_executor.submit(
+        "mta",
+        lambda: _rasterize_mta_content(display, message),
+        lambda frame: _apply_mta_content(display, frame),
+        source=message,
     )
-    mta_render_thread.start()
 
 
-def _render_mta_content_task(display: Any, message: RenderMessage.MTA) -> None:
+def _rasterize_mta_content(display: Any, message: RenderMessage.MTA) -> MTAFrame:
     if message.predictions is None or len(message.predictions) == 0:
-        render_mta_empty(display)
-        return
-    image = Image.new(
-        "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-    )
-    draw = display._get_draw_context_antialiased(image)
-    should_run_blink_animation = False
-    is_alert_running = display.animation_manager.is_animation_running("mta_alert")
-    is_blink_running = display.animation_manager.is_animation_running("mta_blink")
+        return MTAFrame(_rasterize_mta_empty(display), is_empty=True)
+    surface = scratch_surfaces.acquire(display.SCREEN_WIDTH, display.SCREEN_HEIGHT)
+    draw = surface.draw
+    wants_blink = False
     for i, train in enumerate(message.predictions):
         minutes = int(round(train.time / 60.0))
         text_color = Colors.MTA_GREEN
         if train.time <= 30 and i == 0:
             text_color = Colors.MTA_RED_AMBER
-            if train.time > 20 and not is_blink_running:
-                should_run_blink_animation = True
+            if train.time > 20:
+                wants_blink = True
         x_cursor = 0
         y_cursor = 2 + 16 * i
         number_str = f"{train.display_order+1}."
         number_str_width = display._get_text_length(number_str, Fonts.MTA)
         draw.text((x_cursor, y_cursor), number_str, font=Fonts.MTA, fill=text_color)
         x_cursor += int(number_str_width)
-        route_img_data = mta.get_route_image(train.route_id, bool(train.is_express))
-        if route_img_data is not None:
-            route_img, color = route_img_data
-            route_img = get_image_with_color(route_img, color)
-            image.paste(route_img, (x_cursor, 16 * i))
+        route_img = _get_colored_route_image(train.route_id, bool(train.is_express))
+        if route_img is not None:
+            surface.paste(route_img, x_cursor, 16 * i)
             x_cursor += 16 + 1
         minutes_str = f"{minutes}min"
         minutes_str_width = display._get_text_length(minutes_str, Fonts.MTA)
@@ -65,25 +74,36 @@ def _render_mta_content_task(display: Any, message: RenderMessage.MTA) -> None:
             fill=text_color,
             anchor="rt",
         )
-    display.last_mta_image = image
+    return MTAFrame(surface, wants_blink=wants_blink)
+
+
+def _apply_mta_content(display: Any, frame: MTAFrame) -> None:
+    surface = frame.surface
+    if frame.is_empty:
+        display._update_display(surface.image)
+        scratch_surfaces.release(surface.image)
+        return
+    is_alert_running = display.animation_manager.is_animation_running("mta_alert")
+    is_blink_running = display.animation_manager.is_animation_running("mta_blink")
+    scratch_surfaces.release(display.last_mta_image)
+    display.last_mta_image = surface.image
     half_screen_h = int(display.SCREEN_HEIGHT / 2)
-    x, y = 0, 0
+    rect = Rect(0, 0, display.SCREEN_WIDTH, display.SCREEN_HEIGHT)
     if is_alert_running and is_blink_running:
         return
     if is_alert_running:
         # if there is an alert in progress, we only draw the top half of the
         # screen, so the alert can be displayed in the bottom half
-        crop_rect = Rect(0, 0, display.SCREEN_WIDTH, half_screen_h)
-        image = image.copy().crop(crop_rect.to_crop_tuple())
+        rect = Rect(0, 0, display.SCREEN_WIDTH, half_screen_h)
     if is_blink_running:
         # if the blink animation is running, we only draw the bottom half of the
         # screen, so the blink animation can be displayed in the top half
-        crop_rect = Rect(0, half_screen_h, display.SCREEN_WIDTH, half_screen_h)
-        image = image.copy().crop(crop_rect.to_crop_tuple())
-        x, y = crop_rect.x, crop_rect.y
-    if should_run_blink_animation:
+        rect = Rect(0, half_screen_h, display.SCREEN_WIDTH, half_screen_h)
+    if frame.wants_blink and not is_blink_running:
         render_mta_blink(display, "0min")
-    display._update_display(image, x, y)
+    display.framebuffer.region(rect)[:] = surface.region(rect)
+    display.framebuffer.mark_dirty(rect)
+    display.swap_canvas()
 
 
 def render_mta_alert_content(display: Any, message: RenderMessage.MTAAlert) -> None:
@@ -104,11 +124,9 @@ def render_mta_blink(display: Any, text: str) -> None:
     display.animation_manager.add_animation("mta_blink", blink_animation)
 
 
-def render_mta_empty(display: Any) -> None:
-    image = Image.new(
-        "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-    )
-    draw = display._get_draw_context_antialiased(image)
+def _rasterize_mta_empty(display: Any) -> Surface:
+    surface = scratch_surfaces.acquire(display.SCREEN_WIDTH, display.SCREEN_HEIGHT)
+    draw = surface.draw
     now = datetime.now()
     draw.text(
         (0, 2 + 16 * 0),
@@ -122,7 +140,7 @@ def render_mta_empty(display: Any) -> None:
         font=Fonts.MTA,
         fill=Colors.MTA_GREEN,
     )
-    display._update_display(image)
+    return surface
 
 
 def render_mta_all_images(display: Any) -> None:
@@ -181,28 +199,33 @@ def render_mta_startup(display: Any) -> None:
 def render_mta_station_banner_content(
     display: Any, message: RenderMessage.MTAStationBanner
 ) -> None:
-    image = Image.new(
-        "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-    )
-    draw = display._get_draw_context_antialiased(image)
+    framebuffer = display.framebuffer
+    framebuffer.clear()
     station_name = _trim_train_name(
         display, message.station_name, Fonts.MTA, display.SCREEN_WIDTH
     )
-    draw.text((1, 2), station_name, font=Fonts.MTA, fill=Colors.MTA_GREEN)
+    framebuffer.draw.text((1, 2), station_name, font=Fonts.MTA, fill=Colors.MTA_GREEN)
     for i, route in enumerate(message.routes):
-        route_img_data = mta.get_route_image(route, False)
-        if route_img_data is not None:
-            route_img, color = route_img_data
-            route_img = get_image_with_color(route_img, color)
-            image.paste(route_img, (16 * i, 16))
-    display._update_display(image)
+        route_img = _get_colored_route_image(route, False)
+        if route_img is not None:
+            framebuffer.paste(route_img, 16 * i, 16)
+    display.swap_canvas()
+
+
+@lru_cache(maxsize=None)
+def _get_colored_route_image(route_id: str, is_express: bool) -> Optional[Image.Image]:
+    """Route bullets in their line color, colored once per route."""
+    route_img_data = mta.get_route_image(route_id, is_express)
+    if route_img_data is None:
+        return None
+    route_img, color = route_img_data
+    return get_image_with_color(route_img, color)
 
 
 def _trim_train_name(
     display: Any, text: str, font: ImageFont.FreeTypeFont, max_width: int
 ) -> str:
-    draw = display._get_draw_context_antialiased(Image.new("RGB", (0, 0)))
-    if draw.textlength(text, font=font) <= max_width:
+    if display.measure_draw.textlength(text, font=font) <= max_width:
         return text
     if "-" in text:
         parts = text.split("-")
@@ -1,11 +1,25 @@
-from typing import Any
-from PIL import Image
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+from PIL import Image, ImageDraw
 from providers.music.types import SpotifyResponse, Song
-from io import BytesIO
 from common import Colors, Fonts
 from .animation import TextScrollAnimation
 from .types import RenderMessage, Rect
 
+PROGRESS_BAR_HEIGHT = 8
+PROGRESS_TEXT_HEIGHT = 6  # the progress bar itself uses the last 2 rows
+
+
+@dataclass
+class MusicScreenState:
+    """What the music screen currently shows, so a tick only redraws changes."""
+
+    song_key: Optional[tuple[str, str, str, bool]] = None
+    bar_width: int = 0
+    progress_time: str = ""
+    time_to_end: str = ""
+
 
 def render_music_content(display: Any, message: RenderMessage.Music) -> None:
     status, song = message.status, message.song
@@ -19,84 +33,209 @@ def render_music_content(display: Any, message: RenderMessage.Music) -> None:
         ]
         and song is not None
     ):
-
-        progress_bar_image = _get_progress_bar_image(display, song)
-        display.canvas.SetImage(
-            progress_bar_image, 32, display.SCREEN_HEIGHT - progress_bar_image.height
-        )
-
-        if status == SpotifyResponse.OK_NEW_SONG:
-            display.animation_manager.remove_animation("song_title")
-            display.animation_manager.remove_animation("song_artist")
-            title_and_artist_image = _get_title_and_artist_image(display, song)
-            display.canvas.SetImage(title_and_artist_image, 32, 0)
-            animations = {}
-            if (
-                display._get_text_length(song.title, Fonts.SILKSCREEN)
-                > title_and_artist_image.width
-            ):
-                animations["song_title"] = TextScrollAnimation(
-                    Rect(32, 0, title_and_artist_image.width, 8),
-                    10,
-                    True,
-                    True,
-                    song.title,
-                    Fonts.SILKSCREEN,
-                    Colors.WHITE,
-                )
-            if (
-                display._get_text_length(song.artist, Fonts.SILKSCREEN)
-                > title_and_artist_image.width
-            ):
-                animations["song_artist"] = TextScrollAnimation(
-                    Rect(32, 8, title_and_artist_image.width, 8),
-                    10,
-                    True,
-                    True,
-                    song.artist,
-                    Fonts.SILKSCREEN,
-                    Colors.WHITE,
-                )
-            display.animation_manager.add_animations(animations)
-        if song.cover.data is not None:
-            opened_image = Image.open(BytesIO(song.cover.data), formats=["JPEG"])
-            album_art_image = opened_image.resize((32, 32))
-            display.canvas.SetImage(album_art_image, 0, 0)
-        display.swap_canvas()
+        state: MusicScreenState = display.music_screen_state
+        song_key = _get_song_key(song)
+        if status == SpotifyResponse.OK_NEW_SONG or song_key != state.song_key:
+            _render_song(display, song)
+            display.swap_canvas()
+        elif _render_progress_changes(display, song):
+            display.swap_canvas()
 
     elif status == SpotifyResponse.EMPTY:
-        image = Image.new(
-            "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-        )
-        draw = display._get_draw_context_antialiased(image)
-        draw.text(
+        display.music_screen_state = MusicScreenState()
+        display.framebuffer.clear()
+        display.framebuffer.draw.text(
             (0, 0),
             "Nothing is playing",
             font=display.default_font,
             fill=Colors.SPOTIFY_GREEN,
         )
-        display._update_display(image)
+        display.swap_canvas()
     else:
-        image = Image.new(
-            "RGB", (display.SCREEN_WIDTH, display.SCREEN_HEIGHT), Colors.BLACK
-        )
-        draw = display._get_draw_context_antialiased(image)
-        draw.text(
+        display.music_screen_state = MusicScreenState()
+        display.framebuffer.clear()
+        display.framebuffer.draw.text(
             (0, 0),
             "Error querying the spotify API",
             font=display.default_font,
             fill=Colors.SPOTIFY_GREEN,
         )
-        display._update_display(image)
+        display.swap_canvas()
+
+
+def _get_song_key(song: Song) -> tuple[str, str, str, bool]:
+    return (song.title, song.artist, song.cover.url, song.cover.image is not None)
+
+
+def _render_song(display: Any, song: Song) -> None:
+    """Draws the whole music screen for a song that is not shown yet."""
+    progress_bar_image = _get_progress_bar_image(display, song)
+    display.framebuffer.paste(
+        progress_bar_image, 32, display.SCREEN_HEIGHT - progress_bar_image.height
+    )
+    progress_time, time_to_end = _get_progress_times(song)
+    display.music_screen_state = MusicScreenState(
+        song_key=_get_song_key(song),
+        bar_width=_get_progress_bar_width(display, song),
+        progress_time=progress_time,
+        time_to_end=time_to_end,
+    )
+    display.animation_manager.remove_animation("song_title")
+    display.animation_manager.remove_animation("song_artist")
+    title_and_artist_image = _get_title_and_artist_image(display, song)
+    display.framebuffer.paste(title_and_artist_image, 32, 0)
+    animations = {}
+    if (
+        display._get_text_length(song.title, Fonts.SILKSCREEN)
+        > title_and_artist_image.width
+    ):
+        animations["song_title"] = TextScrollAnimation(
+            Rect(32, 0, title_and_artist_image.width, 8),
+            10,
+            True,
+            True,
+            song.title,
+            Fonts.SILKSCREEN,
+            Colors.WHITE,
+        )
+    if (
+        display._get_text_length(song.artist, Fonts.SILKSCREEN)
+        > title_and_artist_image.width
+    ):
+        animations["song_artist"] = TextScrollAnimation(
+            Rect(32, 8, title_and_artist_image.width, 8),
+            10,
+            True,
+            True,
+            song.artist,
+            Fonts.SILKSCREEN,
+            Colors.WHITE,
+        )
+    display.animation_manager.add_animations(animations)
+    if song.cover.image is not None:
+        display.framebuffer.paste(song.cover.image, 0, 0)
+
+
+def _render_progress_changes(display: Any, song: Song) -> bool:
+    """
+    Redraws only the parts of the progress bar and the elapsed/remaining
+    times that changed since the last tick. Returns False if nothing changed.
+    """
+    state: MusicScreenState = display.music_screen_state
+    changed = False
+    bar_y = display.SCREEN_HEIGHT - 2
+    bar_width = _get_progress_bar_width(display, song)
+    if bar_width != state.bar_width:
+        start = min(bar_width, state.bar_width)
+        end = min(max(bar_width, state.bar_width), display.SCREEN_WIDTH - 32 - 1)
+        framebuffer = display.framebuffer
+        framebuffer.clear(Rect(32 + start, bar_y, end - start + 1, 2), Colors.WHITE)
+        if bar_width > 0:
+            framebuffer.clear(
+                Rect(32 + start, bar_y, min(bar_width, end) - start + 1, 2),
+                Colors.SPOTIFY_GREEN,
+            )
+        state.bar_width = bar_width
+        changed = True
+
+    progress_time, time_to_end = _get_progress_times(song)
+    text_y = display.SCREEN_HEIGHT - PROGRESS_BAR_HEIGHT
+    if progress_time != state.progress_time:
+        # the elapsed time is drawn 1px from the left edge of the progress bar
+        _render_time_changes(display, state.progress_time, progress_time, 33, text_y)
+        state.progress_time = progress_time
+        changed = True
+    if time_to_end != state.time_to_end:
+        old_x = display.SCREEN_WIDTH - _get_time_width(state.time_to_end)
+        new_x = display.SCREEN_WIDTH - _get_time_width(time_to_end)
+        old_time_to_end = state.time_to_end
+        if old_x != new_x:
+            _clear_time(display, old_time_to_end, old_x, text_y)
+            old_time_to_end = ""
+        _render_time_changes(display, old_time_to_end, time_to_end, new_x, text_y)
+        state.time_to_end = time_to_end
+        changed = True
+    return changed
+
+
+def _render_time_changes(
+    display: Any, old_text: str, new_text: str, x: int, y: int
+) -> None:
+    """
+    Draws new_text over old_text starting at x, only pasting the glyphs whose
+    character or position changed.
+    """
+    old_glyphs = _get_glyph_positions(old_text, x)
+    new_glyphs = _get_glyph_positions(new_text, x)
+    for glyph in new_glyphs:
+        if glyph not in old_glyphs:
+            char, glyph_x = glyph
+            display.framebuffer.paste(_get_time_glyph(char), glyph_x, y)
+    end_x = x + _get_time_width(new_text)
+    old_end_x = x + _get_time_width(old_text)
+    if old_end_x > end_x:
+        display.framebuffer.clear(
+            Rect(end_x, y, old_end_x - end_x, PROGRESS_TEXT_HEIGHT)
+        )
+
+
+def _clear_time(display: Any, text: str, x: int, y: int) -> None:
+    width = _get_time_width(text)
+    if width > 0:
+        display.framebuffer.clear(Rect(x, y, width, PROGRESS_TEXT_HEIGHT))
+
+
+def _get_glyph_positions(text: str, x: int) -> set[tuple[str, int]]:
+    positions = set()
+    for char in text:
+        positions.add((char, x))
+        x += _get_time_glyph(char).width
+    return positions
+
+
+def _get_time_width(text: str) -> int:
+    return sum(_get_time_glyph(char).width for char in text)
+
+
+@lru_cache(maxsize=None)
+def _get_time_glyph(char: str) -> Image.Image:
+    """
+    Pre-rendered glyphs for the elapsed/remaining times, so a tick pastes a
+    few small images instead of rasterizing text. Picopixel glyphs never
+    extend past their advance, so pasting them side by side is identical to
+    drawing the whole string.
+    """
+    width = int(Fonts.PICOPIXEL.getlength(char))
+    image = Image.new("RGB", (width, PROGRESS_TEXT_HEIGHT), Colors.BLACK)
+    draw = ImageDraw.Draw(image)
+    draw.fontmode = "1"  # turn off antialiasing
+    draw.text((0, 0), char, font=Fonts.PICOPIXEL, fill=Colors.SPOTIFY_GREEN)
+    return image
+
+
+def _get_progress_bar_width(display: Any, song: Song) -> int:
+    progress_bar_width = display.SCREEN_WIDTH - 32
+    if song.duration_ms <= 0:
+        return 0
+    progress = song.progress_ms / song.duration_ms
+    return int(progress_bar_width * progress)
+
+
+def _get_progress_times(song: Song) -> tuple[str, str]:
+    progress_time = _format_elapsed_time(song.progress_ms // 1000, False)
+    time_to_end = _format_elapsed_time(
+        (song.duration_ms - song.progress_ms) // 1000, True
+    )
+    return progress_time, time_to_end
 
 
 def _get_progress_bar_image(display: Any, song: Song) -> Image.Image:
-    image = Image.new("RGB", (display.SCREEN_WIDTH - 32, 8), Colors.BLACK)
+    image = Image.new(
+        "RGB", (display.SCREEN_WIDTH - 32, PROGRESS_BAR_HEIGHT), Colors.BLACK
+    )
     draw = display._get_draw_context_antialiased(image)
     # Draw progress bar
-    progress_bar_width = display.SCREEN_WIDTH - 32
-    progress = song.progress_ms / song.duration_ms
-    current_bar_width = int(progress_bar_width * progress)
+    current_bar_width = _get_progress_bar_width(display, song)
 
     # Draw progress bar background
     draw.rectangle(
@@ -111,10 +250,7 @@ def _get_progress_bar_image(display: Any, song: Song) -> Image.Image:
         )
 
     # Draw time progress
-    progress_time = _format_elapsed_time(song.progress_ms // 1000, False)
-    time_to_end = _format_elapsed_time(
-        (song.duration_ms - song.progress_ms) // 1000, True
-    )
+    progress_time, time_to_end = _get_progress_times(song)
 
     small_font = Fonts.PICOPIXEL
     # Draw progress time (left side)
@@ -0,0 +1,228 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import numpy as np
+from collections import deque
+from multiprocessing import shared_memory
+from multiprocessing.synchronize import Event
+from PIL import Image
+from typing import Any
+from .headless import HeadlessCanvas, HeadlessMatrix
+
+# how often the display process puts the newest frame on the matrix
+DISPLAY_PROCESS_REFRESH_RATE = 1 / 60  # seconds
+# refresh timings kept for close(), about three minutes at 60 Hz
+PRESENT_HISTORY = 10_000
+HEADER_SIZE = 16
+
+logger = logging.getLogger("led-matrix-sign")
+
+
+class SharedFramebuffer:
+    """
+    Two RGB frames in shared memory plus a sequence counter. The writer
+    fills the frame that is not on show and then flips to it; the reader
+    copies the frame on show. The flip and the copy both hold a
+    process-shared lock, so the reader never sees a half-written frame.
+    The lock is a semaphore, whose acquire and release are full memory
+    barriers, which a bare counter in shared memory is not on ARM. It is
+    held for a flip or a memcpy, never for a write. There is one writer
+    process and one reader process.
+    """
+
+    def __init__(self, width: int, height: int, lock: Any = None) -> None:
+        self.width = width
+        self.height = height
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        frame_size = width * height * 3
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=HEADER_SIZE + 2 * frame_size
+        )
+        # sequence counter and index of the frame on show
+        self.header = np.ndarray((2,), dtype=np.uint64, buffer=self.memory.buf)
+        self.frames = np.ndarray(
+            (2, height, width, 3),
+            dtype=np.uint8,
+            buffer=self.memory.buf,
+            offset=HEADER_SIZE,
+        )
+
+    def write(self, image: Image.Image) -> None:
+        # only the writer flips, so the frame not on show is its own to fill
+        back = 1 - int(self.header[1])
+        self.frames[back] = np.asarray(image)
+        with self.lock:
+            self.header[1] = back
+            self.header[0] += 1
+
+    def read(self, last_sequence: int, out: np.ndarray) -> int:
+        """
+        Copies the frame on show into out if it is newer than last_sequence.
+        Returns its sequence number, or last_sequence when nothing changed.
+        """
+        with self.lock:
+            sequence = int(self.header[0])
+            if sequence != last_sequence:
+                np.copyto(out, self.frames[int(self.header[1])])
+            return sequence
+
+    def close(self) -> None:
+        del self.header, self.frames
+        self.memory.close()
+        self.memory.unlink()
+
+
+def present_frames(
+    framebuffer: SharedFramebuffer,
+    matrix: Any,
+    stop: Event | threading.Event,
+    refresh_rate: float = DISPLAY_PROCESS_REFRESH_RATE,
+) -> list[float]:
+    """
+    Puts each new frame from framebuffer on matrix, checking every
+    refresh_rate seconds. Returns how late the last PRESENT_HISTORY checks
+    were, in seconds.
+    """
+    frame = np.zeros((framebuffer.height, framebuffer.width, 3), dtype=np.uint8)
+    canvas = matrix.CreateFrameCanvas()
+    sequence = 0
+    lateness: deque[float] = deque(maxlen=PRESENT_HISTORY)
+    target = time.perf_counter()
+    while not stop.is_set():
+        target += refresh_rate
+        time.sleep(max(target - time.perf_counter(), 0))
+        lateness.append(max(time.perf_counter() - target, 0))
+        new_sequence = framebuffer.read(sequence, frame)
+        if new_sequence == sequence:
+            continue
+        sequence = new_sequence
+        canvas.SetImage(Image.fromarray(frame))
+        canvas = matrix.SwapOnVSync(canvas)
+    return list(lateness)
+
+
+def _run_display_process(
+    framebuffer: SharedFramebuffer,
+    options: dict[str, Any],
+    stop: Event,
+    results: Any,
+    refresh_rate: float,
+) -> None:
+    # forked, so framebuffer is the parent's mapping and the parent owns it
+    parent_pid = os.getppid()
+
+    def watch_parent() -> None:
+        # a parent that was killed cannot stop us, so leave the matrix too
+        while not stop.wait(1):
+            if os.getppid() != parent_pid:
+                stop.set()
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    matrix: Any
+    if options.pop("headless"):
+        matrix = HeadlessMatrix(SimpleOptions(options))
+    else:
+        import config
+
+        if config.EMULATE_RGB_MATRIX:
+            from RGBMatrixEmulator import RGBMatrix, RGBMatrixOptions
+        else:
+            from rgbmatrix import RGBMatrix, RGBMatrixOptions
+        matrix_options = RGBMatrixOptions()
+        for key, value in options.items():
+            setattr(matrix_options, key, value)
+        matrix = RGBMatrix(options=matrix_options)
+    results.put(present_frames(framebuffer, matrix, stop, refresh_rate))
+
+
+class SimpleOptions:
+    def __init__(self, options: dict[str, Any]) -> None:
+        self.__dict__.update(options)
+
+
+class SharedMemoryMatrix(HeadlessMatrix):
+    """
+    A matrix driven from a separate process, so refreshing it never waits
+    for the GIL of the process that renders. Canvases are drawn in memory as
+    with HeadlessMatrix, and SwapOnVSync copies the frame into a shared
+    framebuffer, which the display process picks up on its next refresh.
+    The child is forked rather than spawned, which would import the whole
+    sign again. A fork copies only the thread that forks, along with any
+    lock another thread held at the time, so create this before starting
+    any threads, GPIO callbacks included.
+    """
+
+    OPTION_NAMES = [
+        "rows",
+        "cols",
+        "chain_length",
+        "parallel",
+        "brightness",
+        "hardware_mapping",
+        "gpio_slowdown",
+    ]
+
+    def __init__(
+        self,
+        options: Any,
+        headless: bool = False,
+        refresh_rate: float = DISPLAY_PROCESS_REFRESH_RATE,
+    ) -> None:
+        super().__init__(options)
+        if threading.active_count() > 1:
+            logger.warning(
+                "Forking the display process with "
+                f"{threading.active_count() - 1} other threads running"
+            )
+        context = multiprocessing.get_context("fork")
+        self.framebuffer = SharedFramebuffer(self.width, self.height, context.Lock())
+        child_options: dict[str, Any] = {
+            name: getattr(options, name) for name in self.OPTION_NAMES
+        }
+        child_options["headless"] = headless
+        self.stop = context.Event()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=_run_display_process,
+            args=(
+                self.framebuffer,
+                child_options,
+                self.stop,
+                self.results,
+                refresh_rate,
+            ),
+            name="display",
+            daemon=True,
+        )
+        self.process.start()
+        self.closed = False
+        atexit.register(self.close)
+
+    def SwapOnVSync(
+        self, canvas: HeadlessCanvas, framerate_fraction: int = 1
+    ) -> HeadlessCanvas:
+        self.framebuffer.write(canvas.image)
+        return super().SwapOnVSync(canvas, framerate_fraction)
+
+    def close(self) -> list[float]:
+        """
+        Stops the display process. Returns how late each of its refreshes
+        was, in seconds.
+        """
+        if self.closed:
+            return []
+        self.closed = True
+        lateness: list[float] = []
+        if self.process.is_alive():
+            self.stop.set()
+            try:
+                lateness = self.results.get(timeout=5)
+            except queue.Empty:
+                pass
+            self.process.join(timeout=5)
+        self.framebuffer.close()
+        return lateness
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from typing import Any, Optional
+import numpy as np
+from .framebuffer import Box, Framebuffer
+
+
+class SwapChain:
+    """
+    The matrix canvases the framebuffer is shown on. SwapOnVSync puts the
+    canvas it is given on screen and hands back the one that was showing,
+    which is drawn on next, so it still has the frame from before and has
+    missed every change uploaded since. An upload therefore copies the
+    tiles the frame changed plus the tiles changed while that canvas was
+    away, rather than the whole frame.
+
+    rgbmatrix wraps the returned canvas in a new object on every swap, so
+    canvases are told apart by their place in the chain, not by identity:
+    two for the real driver and the headless matrix, one for the emulator,
+    which hands back the canvas it was given.
+    """
+
+    def __init__(
+        self, matrix: Any, framebuffer: Framebuffer, lock: threading.Lock
+    ) -> None:
+        self.matrix = matrix
+        self.framebuffer = framebuffer
+        self.lock = lock
+        self.back = matrix.CreateFrameCanvas()
+        # canvases in the chain, known after the first swap
+        self.length: Optional[int] = None
+        # tiles changed by the last length - 1 swaps, which the back canvas
+        # missed while it was on screen
+        self.missed: deque[np.ndarray] = deque()
+        # swaps left until every canvas had the whole frame once
+        self.unknown_canvases = 2
+        self.uploaded_pixels = 0
+
+    def swap(self) -> list[Box]:
+        """
+        Uploads what the back canvas lacks and puts it on screen. Returns the
+        boxes of the frame that changed since the last swap.
+        """
+        dirty = self.framebuffer.take_dirty()
+        stale = dirty.copy()
+        if self.unknown_canvases > 0:
+            # what a canvas fresh from the driver shows is not known
+            stale[:] = True
+            self.unknown_canvases -= 1
+        else:
+            for missed in self.missed:
+                stale |= missed
+        for box in self.framebuffer.get_boxes(stale):
+            self.framebuffer.upload(self.back, box)
+            self.uploaded_pixels += (box[2] - box[0]) * (box[3] - box[1])
+        with self.lock:
+            front = self.matrix.SwapOnVSync(self.back)
+        if self.length is None:
+            self.length = 1 if front is self.back else 2
+            self.unknown_canvases = min(self.unknown_canvases, self.length - 1)
+            self.missed = deque(maxlen=self.length - 1)
+        if self.length > 1:
+            self.missed.append(dirty)
+        self.back = front
+        return self.framebuffer.get_boxes(dirty)
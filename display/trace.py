@@ -0,0 +1,203 @@
+import hashlib
+import io
+import logging
+import pickle
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Queue
+from typing import Any, BinaryIO, Iterator, Optional
+from PIL import Image
+from .types import BaseRenderMessage, RenderMessage
+
+logger = logging.getLogger("led-matrix-sign")
+
+TRACE_MAGIC = b"LMSTRACE"
+# bump when the record layout changes, older traces are then refused
+TRACE_VERSION = 1
+# zlib level, traces are written on the Raspberry Pi while the sign runs
+TRACE_COMPRESSION = 1
+# only exist inside one process: a callback and a render worker's result
+UNTRACED_MESSAGES = (RenderMessage.AfterSwap, RenderMessage.JobResult)
+
+
+@dataclass
+class TraceHeader:
+    version: int
+    # wall clock time the recording started
+    started_at: float
+    # display.PanelGeometry of the sign that was recorded
+    geometry: Any
+
+
+@dataclass
+class TraceEvent:
+    # seconds since the recording started
+    time: float
+    # "render" for a BaseRenderMessage, "command" for a BaseUICommand
+    kind: str
+    payload: Any
+
+
+class TraceRecorder:
+    """
+    Writes render messages and UI commands to a binary trace as they
+    happen. The file is TRACE_MAGIC followed by records, each a u32 length
+    and a zlib-compressed pickle of (kind, time, payload). Images in a
+    payload are pickled as the hash of their contents, and the pixels of
+    every hash are written once, in an "image" record before the first
+    record using them, so frames that repeat cost a few bytes each.
+    """
+
+    def __init__(self, path: Path, geometry: Any) -> None:
+        self.path = path
+        self.started = time.monotonic()
+        self.file: Optional[BinaryIO] = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self._images: set[bytes] = set()
+        self._lock = threading.Lock()
+        self.event_count = 0
+        header = TraceHeader(TRACE_VERSION, time.time(), geometry)
+        self._write_pickled(
+            pickle.dumps(("header", 0.0, header), protocol=pickle.HIGHEST_PROTOCOL),
+            {},
+        )
+
+    def record_render(self, message: BaseRenderMessage) -> None:
+        if not isinstance(message, UNTRACED_MESSAGES):
+            self.record("render", message)
+
+    def record_command(self, command: Any) -> None:
+        self.record("command", command)
+
+    def record(self, kind: str, payload: Any) -> None:
+        elapsed = time.monotonic() - self.started
+        # pickled on the caller's thread, before anything can change it
+        buffer = io.BytesIO()
+        pickler = _ImagePickler(buffer)
+        try:
+            pickler.dump((kind, elapsed, payload))
+        except Exception as e:
+            logger.error(f"Not tracing {type(payload).__name__}: {e}")
+            return
+        self._write_pickled(buffer.getvalue(), pickler.images)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _write_pickled(self, data: bytes, images: dict[bytes, Image.Image]) -> None:
+        with self._lock:
+            if self.file is None:
+                return
+            for digest, image in images.items():
+                if digest in self._images:
+                    continue
+                self._images.add(digest)
+                image_record = (digest, image.mode, image.size, image.tobytes())
+                self._write_record(
+                    pickle.dumps(
+                        ("image", 0.0, image_record),
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+                )
+            self._write_record(data)
+            self.event_count += 1
+
+    def _write_record(self, data: bytes) -> None:
+        assert self.file is not None
+        compressed = zlib.compress(data, TRACE_COMPRESSION)
+        self.file.write(struct.pack("<I", len(compressed)))
+        self.file.write(compressed)
+
+
+class _ImagePickler(pickle.Pickler):
+    """Pickles images as the hash of their contents, collected in .images."""
+
+    def __init__(self, file: BinaryIO) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.images: dict[bytes, Image.Image] = {}
+
+    def persistent_id(self, obj: Any) -> Any:
+        if not isinstance(obj, Image.Image):
+            return None
+        content = hashlib.blake2b(digest_size=16)
+        content.update(f"{obj.mode} {obj.width}x{obj.height}".encode())
+        content.update(obj.tobytes())
+        digest = content.digest()
+        self.images[digest] = obj
+        return digest
+
+
+class _ImageUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, images: dict[bytes, Image.Image]) -> None:
+        super().__init__(file)
+        self.images = images
+
+    def persistent_load(self, pid: Any) -> Image.Image:
+        return self.images[pid]
+
+
+class TraceReader:
+    """Reads a trace written by TraceRecorder, one event at a time."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a trace")
+        self._images: dict[bytes, Image.Image] = {}
+        kind, _, header = self._read_record()
+        if kind != "header" or header.version != TRACE_VERSION:
+            raise ValueError(f"{path} has an unknown trace version")
+        self.header: TraceHeader = header
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        while True:
+            try:
+                kind, elapsed, payload = self._read_record()
+            except EOFError:
+                return
+            if kind == "image":
+                digest, mode, size, data = payload
+                self._images[digest] = Image.frombytes(mode, size, data)
+                continue
+            yield TraceEvent(elapsed, kind, payload)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def _read_record(self) -> tuple[str, float, Any]:
+        length_bytes = self.file.read(4)
+        if len(length_bytes) < 4:
+            raise EOFError
+        (length,) = struct.unpack("<I", length_bytes)
+        data = self.file.read(length)
+        if len(data) < length:
+            # the recorder was killed halfway through a record
+            raise EOFError
+        buffer = io.BytesIO(zlib.decompress(data))
+        return _ImageUnpickler(buffer, self._images).load()
+
+
+class TracedQueue(Queue):
+    """
+    The render queue, which also hands every message put on it to a
+    recorder while one is set.
+    """
+
+    def __init__(self, maxsize: int = 0) -> None:
+        super().__init__(maxsize)
+        self.recorder: Optional[TraceRecorder] = None
+
+    def put(
+        self, item: Any, block: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        if self.recorder is not None:
+            self.recorder.record_render(item)
+        super().put(item, block, timeout)
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from PIL import Image
-from common import ClockType
-from typing import List, Optional, Tuple
+from common import ClockType, GameOfLifeColorMode
+from typing import Any, Callable, List, Optional, Tuple
 from datetime import datetime
 import providers.mbta.types as mbta
 import providers.mta.types as mta
@@ -47,6 +47,27 @@ class RenderMessage:
     class Swap(BaseRenderMessage):
         pass
 
+    @dataclass
+    class Brightness(BaseRenderMessage):
+        # percent, applied to the frame on screen without redrawing it
+        brightness: int
+
+    @dataclass
+    class AfterSwap(BaseRenderMessage):
+        # called on the render thread once the first frame drawn after it,
+        # rather than just cleared or swapped again, is on the matrix. With
+        # shows, only a frame drawn from a message of one of these types
+        # counts, so frames other threads queue in between are not taken
+        # for it.
+        callback: Callable[[], None]
+        shows: tuple[type, ...] = ()
+
+    @dataclass
+    class JobResult(BaseRenderMessage):
+        # a display.executor.RenderJob and what its rasterize() returned
+        job: Any
+        result: Any
+
     @dataclass
     class Text(BaseRenderMessage):
         text: str
@@ -100,6 +121,8 @@ class RenderMessage:
 
     @dataclass
     class GameOfLife(BaseRenderMessage):
+        # uint8 cell codes, either 0/1 cells or ages from CellAges
         grid: np.ndarray
         generation: int
+        color_mode: GameOfLifeColorMode = GameOfLifeColorMode.MONO
         z_index: int = 0
@@ -1,3 +1,4 @@
+import atexit
 import socket
 import config
 import argparse
@@ -8,27 +9,82 @@ import threading
 import time
 import os
 import logging
-from typing import Any
-from common import SignMode, UIMessageType, ClockType, get_next_mode
+from collections import deque
+import numpy as np
+from typing import Any, Callable, Optional
+from common import (
+    SignMode,
+    ClockType,
+    cache_dir,
+    GameOfLifeColorMode,
+    get_next_mode,
+)
 from common.broadcaster import StatusBroadcaster
+from common.commands import BaseUICommand, CommandBus, UICommand
+from common.snapshot import SignSnapshot, load_snapshot, save_snapshot
 from common.button import Button
 from datetime import datetime
+from pathlib import Path
 from display import Display
 from providers.music import Spotify
 from providers.music.types import SpotifyResponse
 from providers.widget import WidgetManager, ClockWidget, WeatherWidget
-from providers.game_of_life import GameOfLife
+from providers.game_of_life import (
+    GameOfLife,
+    PATTERNS,
+    find_population_period,
+    parse_rle,
+)
+from providers.game_of_life_pipeline import GameOfLifePipeline, LifeFrame
+from providers.hashlife import HashLife, Viewport
+from providers.warmup import WarmupScheduler
 from server import Server
+from display.trace import TraceRecorder, TracedQueue
 from display.types import BaseRenderMessage, RenderMessage, Rect
 
 # Constants
 BUTTON_PIN = 25
 REFRESH_RATE = 0.1  # seconds
 DEFAULT_SIGN_MODE = SignMode.MBTA
+HASHLIFE_MAX_GENERATIONS = 100_000
+# HashLife resets once its population repeats for this many frames
+HASHLIFE_POPULATION_WINDOW = 100  # frames
+HASHLIFE_MAX_PERIOD = 30  # frames
+GAME_OF_LIFE_RUN_AHEAD = 30  # frames
+WARMUP_REQUESTS_PER_MINUTE = 12
+SNAPSHOT_PATH = cache_dir / "sign-snapshot.pickle"
+SNAPSHOT_INTERVAL = 10  # seconds
+SNAPSHOT_MAX_AGE = 10 * 60  # seconds
+
+# the render messages that first show each mode and each command
+MODE_MESSAGES: dict[SignMode, tuple[type, ...]] = {
+    SignMode.TEST: (RenderMessage.Text, RenderMessage.MTATestImages),
+    SignMode.CLOCK: (RenderMessage.Clock,),
+    SignMode.MBTA: (RenderMessage.MBTA, RenderMessage.MBTABanner),
+    SignMode.MTA: (
+        RenderMessage.MTA,
+        RenderMessage.MTAAlert,
+        RenderMessage.MTAStartup,
+    ),
+    SignMode.MUSIC: (RenderMessage.Music,),
+    # widgets draw Frames, but so do animations left over from other modes
+    SignMode.WIDGET: (RenderMessage.Frame,),
+    SignMode.GAME_OF_LIFE: (RenderMessage.GameOfLife,),
+}
+COMMAND_MESSAGES: dict[type, tuple[type, ...]] = {
+    UICommand.MBTAChangeStation: (RenderMessage.Text,),
+    UICommand.MBTATestBanner: (RenderMessage.MBTABanner,),
+    UICommand.MTAChangeStation: (RenderMessage.MTAStationBanner,),
+    UICommand.MTAChangeDirection: (RenderMessage.MTA,),
+    UICommand.SetBrightness: (RenderMessage.Brightness,),
+    UICommand.Test: (RenderMessage.Text, RenderMessage.MTATestImages),
+    UICommand.MTAAlert: (RenderMessage.MTAAlert,),
+    UICommand.Shutdown: (RenderMessage.Text,),
+}
 
 # Global queues
-ui_queue: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=16)
-render_queue: queue.Queue[BaseRenderMessage] = queue.Queue(maxsize=32)
+command_bus = CommandBus(maxsize=16)
+render_queue: TracedQueue[BaseRenderMessage] = TracedQueue(maxsize=32)
 
 mode_broadcaster = StatusBroadcaster()
 
@@ -37,6 +93,11 @@ user_threads: list[threading.Thread] = []
 
 mbta_client = mbta.MBTA(config.MBTA_API_KEY)
 mta_client = mta.MTA(config.MTA_API_KEY)
+spotify = Spotify(
+    config.SPOTIFY_CLIENT_ID,
+    config.SPOTIFY_CLIENT_SECRET,
+    config.SPOTIFY_REFRESH_TOKEN,
+)
 
 logger = logging.getLogger("led-matrix-sign")
 
@@ -77,99 +138,127 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--mta-fake-data", action="store_true", help="Use fake MTA data"
     )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        help="Record render messages and commands to this file, see replay.py",
+    )
     return parser.parse_args()
 
 
-def ui_task() -> None:
-    while True:
-        try:
-            message = ui_queue.get(timeout=REFRESH_RATE)
-
-            if message["type"] == UIMessageType.MODE_SHIFT:
-                next_mode = get_next_mode(mode_broadcaster.get_status())
-                render_queue.put(RenderMessage.Clear())
-                mode_broadcaster.set_status(next_mode)
-                logger.info(f"Mode changed to: {next_mode}")
-            elif message["type"] == UIMessageType.MODE_CHANGE:
-                # Direct mode change
-                new_mode = message.get("mode")
-                if new_mode in SignMode:
-                    render_queue.put(RenderMessage.Clear())
-                    mode_broadcaster.set_status(new_mode)
-                    logger.info(f"Mode changed to: {new_mode}")
-            elif message["type"] == UIMessageType.MBTA_CHANGE_STATION:
-                new_station = message.get("station")
-                if (
-                    new_station is not None
-                    and isinstance(new_station, str)
-                    and mbta.station_by_id(new_station) is not None
-                ):
-                    mbta_client.set_station(new_station)
-                    logger.info(f"Station changed to: {new_station}")
-                    render_queue.put(RenderMessage.Clear())
-                    render_queue.put(
-                        RenderMessage.Text(text=mbta.train_station_to_str(new_station))
-                    )
-            elif message["type"] == UIMessageType.MBTA_TEST_BANNER:
-                render_queue.put(RenderMessage.Clear())
-                render_queue.put(
-                    RenderMessage.MBTABanner(
-                        lines=["Alewife train", "is now arriving."]
-                    )
-                )
-            elif message["type"] == UIMessageType.MTA_CHANGE_STATION:
-                new_station = message.get("station")
-                if new_station is not None and isinstance(new_station, str):
-                    mta_client.set_current_station(new_station)
-                    logger.info(f"Station changed to: {new_station}")
-                    render_queue.put(RenderMessage.Clear())
-                    station = mta.station_by_id(new_station)
-                    if station is not None:
-                        render_queue.put(
-                            RenderMessage.MTAStationBanner(
-                                station_name=mta.train_station_to_str(new_station),
-                                routes=mta.sort_routes(station.routes),
-                            )
-                        )
-            elif message["type"] == UIMessageType.MTA_CHANGE_DIRECTION:
-                new_direction = message.get("direction")
-                if new_direction is not None and isinstance(
-                    new_direction, mta.Direction
-                ):
-                    mta_client.set_current_direction(new_direction)
-                    logger.info(f"Direction changed to: {new_direction}")
-            elif message["type"] == UIMessageType.TEST:
-                new_message = message.get("content")
-                if new_message == "mta_all_images":
-                    render_queue.put(RenderMessage.MTATestImages())
-                else:
-                    render_queue.put(
-                        RenderMessage.Text(
-                            text=new_message if new_message is not None else ""
-                        )
-                    )
-            elif message["type"] == UIMessageType.MTA_ALERT:
-                content = message.get("content")
-                if content is not None and isinstance(content, str):
-                    render_queue.put(RenderMessage.MTAAlert(text=content))
-            elif message["type"] == UIMessageType.SHUTDOWN:
-                mode_broadcaster.set_status(SignMode.TEST)
-                if not config.EMULATE_RGB_MATRIX:
-                    logger.info("Shutting down")
-                    render_queue.put(RenderMessage.Clear())
-                    render_queue.put(RenderMessage.Text(text="Shutting down..."))
-                    time.sleep(1)
-                    os.system("sudo shutdown -h now")
-                else:
-                    logger.info("Not shutting down (emulated)")
+def get_command_messages(command: BaseUICommand) -> tuple[type, ...]:
+    """
+    The render messages that show command has taken effect. After a mode
+    change they come from the new mode's provider, so a frame the old mode
+    queued before it noticed is not mistaken for the new mode.
+    """
+    if isinstance(command, UICommand.ModeShift):
+        # the UI thread is the only one to change the mode, so this is
+        # the mode the handler is about to switch to
+        return MODE_MESSAGES[get_next_mode(mode_broadcaster.get_status())]
+    if isinstance(command, UICommand.ModeChange):
+        return MODE_MESSAGES.get(command.mode, ())
+    return COMMAND_MESSAGES.get(type(command), ())
 
-        except queue.Empty:
-            time.sleep(REFRESH_RATE)
-            continue
 
+def on_mode_shift(command: UICommand.ModeShift) -> None:
+    next_mode = get_next_mode(mode_broadcaster.get_status())
+    render_queue.put(RenderMessage.Clear())
+    mode_broadcaster.set_status(next_mode)
+    logger.info(f"Mode changed to: {next_mode}")
 
-def render_task() -> None:
-    display = Display(render_queue)
+
+def on_mode_change(command: UICommand.ModeChange) -> None:
+    if command.mode in SignMode:
+        render_queue.put(RenderMessage.Clear())
+        mode_broadcaster.set_status(command.mode)
+        logger.info(f"Mode changed to: {command.mode}")
+
+
+def on_mbta_change_station(command: UICommand.MBTAChangeStation) -> None:
+    new_station = command.station
+    if mbta.station_by_id(new_station) is not None:
+        mbta_client.set_station(new_station)
+        logger.info(f"Station changed to: {new_station}")
+        render_queue.put(RenderMessage.Clear())
+        render_queue.put(
+            RenderMessage.Text(text=mbta.train_station_to_str(new_station))
+        )
+
+
+def on_mbta_test_banner(command: UICommand.MBTATestBanner) -> None:
+    render_queue.put(RenderMessage.Clear())
+    render_queue.put(RenderMessage.MBTABanner(lines=command.lines))
+
+
+def on_mta_change_station(command: UICommand.MTAChangeStation) -> None:
+    new_station = command.station
+    mta_client.set_current_station(new_station)
+    logger.info(f"Station changed to: {new_station}")
+    render_queue.put(RenderMessage.Clear())
+    station = mta.station_by_id(new_station)
+    if station is not None:
+        render_queue.put(
+            RenderMessage.MTAStationBanner(
+                station_name=mta.train_station_to_str(new_station),
+                routes=mta.sort_routes(station.routes),
+            )
+        )
+
+
+def on_mta_change_direction(command: UICommand.MTAChangeDirection) -> None:
+    mta_client.set_current_direction(command.direction)
+    logger.info(f"Direction changed to: {command.direction}")
+
+
+def on_set_brightness(command: UICommand.SetBrightness) -> None:
+    render_queue.put(RenderMessage.Brightness(command.brightness))
+    logger.info(f"Brightness set to: {command.brightness}")
+
+
+def on_test(command: UICommand.Test) -> None:
+    if command.content == "mta_all_images":
+        render_queue.put(RenderMessage.MTATestImages())
+    else:
+        render_queue.put(RenderMessage.Text(text=command.content))
+
+
+def on_mta_alert(command: UICommand.MTAAlert) -> None:
+    render_queue.put(RenderMessage.MTAAlert(text=command.content))
+
+
+def on_shutdown(command: UICommand.Shutdown) -> None:
+    mode_broadcaster.set_status(SignMode.TEST)
+    if not config.EMULATE_RGB_MATRIX:
+        logger.info("Shutting down")
+        render_queue.put(RenderMessage.Clear())
+        render_queue.put(RenderMessage.Text(text="Shutting down..."))
+        time.sleep(1)
+        os.system("sudo shutdown -h now")
+    else:
+        logger.info("Not shutting down (emulated)")
+
+
+def ui_task() -> None:
+    command_bus.register(UICommand.ModeShift, on_mode_shift)
+    command_bus.register(UICommand.ModeChange, on_mode_change)
+    command_bus.register(UICommand.MBTAChangeStation, on_mbta_change_station)
+    command_bus.register(UICommand.MBTATestBanner, on_mbta_test_banner)
+    command_bus.register(UICommand.MTAChangeStation, on_mta_change_station)
+    command_bus.register(UICommand.MTAChangeDirection, on_mta_change_direction)
+    command_bus.register(UICommand.SetBrightness, on_set_brightness)
+    command_bus.register(UICommand.Test, on_test)
+    command_bus.register(UICommand.MTAAlert, on_mta_alert)
+    command_bus.register(UICommand.Shutdown, on_shutdown)
+    # blocks until a command arrives, so there is no polling delay
+    command_bus.run(
+        lambda command, callback: render_queue.put(
+            RenderMessage.AfterSwap(callback, shows=get_command_messages(command))
+        )
+    )
+
+
+def render_task(display: Display) -> None:
     while True:
         try:
             message = render_queue.get(timeout=REFRESH_RATE)
@@ -178,12 +267,18 @@ def render_task() -> None:
             continue
 
 
-def web_server_task() -> None:
+def web_server_task(
+    display: Display, game_of_life_pipeline: GameOfLifePipeline
+) -> None:
     server = Server(
-        ui_queue,
+        command_bus,
         mode_broadcaster,
         mbta_client.station_broadcaster,
         mta_client.status_broadcaster,
+        display,
+        mbta_client.prediction_broadcaster,
+        mta_client.prediction_broadcaster,
+        game_of_life_pipeline,
     )
     server.web_server_task()
 
@@ -199,10 +294,23 @@ def clock_provider_task() -> None:
 
 
 def mbta_provider_task() -> None:
+    active = False
     while True:
         if mode_broadcaster.get_status() == SignMode.MBTA:
+            if not active:
+                # show what warm-up fetched while the fetch below runs
+                warm_predictions = mbta_client.take_warm_predictions()
+                if warm_predictions is not None:
+                    render_queue.put(
+                        RenderMessage.MBTA(
+                            status=mbta.PredictionStatus.OK,
+                            predictions=warm_predictions,
+                        )
+                    )
+                active = True
             status, predictions = mbta_client.get_predictions_both_directions()
             render_queue.put(RenderMessage.MBTA(status=status, predictions=predictions))
+            mbta_client.prediction_broadcaster.set_status((status, predictions))
             logger.info(status)
             logger.info(predictions)
             if status == mbta.PredictionStatus.OK:
@@ -221,25 +329,46 @@ def mbta_provider_task() -> None:
                 mbta_client.update_latest_predictions(predictions, [0, 1])
             time.sleep(5)
         else:
+            active = False
             time.sleep(REFRESH_RATE)
 
 
-def mta_provider_task() -> None:
+def show_mta_predictions(predictions: list[mta.TrainTime]) -> None:
+    if len(predictions) < 2:
+        mta.print_predictions(predictions)
+        render_queue.put(RenderMessage.MTA(predictions=predictions))
+        mta_client.prediction_broadcaster.set_status(predictions)
+    else:
+        second_train = mta.get_second_train(predictions, mta_client.last_second_train)
+        if second_train is not None:
+            mta.print_predictions([predictions[0], second_train])
+            render_queue.put(
+                RenderMessage.MTA(predictions=[predictions[0], second_train])
+            )
+            mta_client.prediction_broadcaster.set_status([predictions[0], second_train])
+            mta_client.last_second_train = second_train
+
+
+def mta_provider_task(show_station_banner: bool = True) -> None:
     last_alert_time = time.time()
     alert_messages = mta.AlertMessages()
     if config.MTA_FAKE_DATA:
         logger.info("Using MTA historical data")
         mta_client.load_historical_data()
     # show the station banner for 2 seconds initially
-    ui_queue.put(
-        {
-            "type": UIMessageType.MTA_CHANGE_STATION,
-            "station": mta_client.get_current_station(),
-        }
-    )
-    time.sleep(2)
+    initial_station = mta_client.get_current_station()
+    if show_station_banner and initial_station is not None:
+        command_bus.submit(UICommand.MTAChangeStation(initial_station))
+        time.sleep(2)
+    active = False
     while True:
         if mode_broadcaster.get_status() == SignMode.MTA:
+            if not active:
+                # show what warm-up fetched while the fetch below runs
+                warm_predictions = mta_client.take_warm_predictions()
+                if warm_predictions is not None:
+                    show_mta_predictions(warm_predictions)
+                active = True
             station = mta_client.get_current_station()
             direction = mta_client.get_current_direction()
             if station is not None:
@@ -249,66 +378,50 @@ def mta_provider_task() -> None:
                 else:
                     predictions = mta_client.get_fake_predictions(station)
                 if predictions is not None:
-                    if len(predictions) < 2:
-                        mta.print_predictions(predictions)
-                        render_queue.put(RenderMessage.MTA(predictions=predictions))
-                    else:
-                        second_train = mta.get_second_train(
-                            predictions, mta_client.last_second_train
-                        )
-                        if second_train is not None:
-                            mta.print_predictions([predictions[0], second_train])
-                            render_queue.put(
-                                RenderMessage.MTA(
-                                    predictions=[predictions[0], second_train]
-                                )
-                            )
-                            mta_client.last_second_train = second_train
+                    show_mta_predictions(predictions)
                 else:
                     logger.info("No predictions")
+                    # the board keeps its last trains, but the status API and
+                    # the snapshot must not pass them off as current
+                    mta_client.prediction_broadcaster.set_status([])
                 if time.time() - last_alert_time > 60 * 5:
                     last_alert_time = time.time()
                     render_queue.put(RenderMessage.MTAAlert(text=alert_messages.next()))
             time.sleep(5)
         else:
+            active = False
             last_alert_time = time.time()
             time.sleep(REFRESH_RATE)
 
 
 def music_provider_task() -> None:
-    spotify = Spotify(
-        config.SPOTIFY_CLIENT_ID,
-        config.SPOTIFY_CLIENT_SECRET,
-        config.SPOTIFY_REFRESH_TOKEN,
-    )
     spotify.setup()
     while True:
         if mode_broadcaster.get_status() == SignMode.MUSIC:
-            status, currently_playing = spotify.get_currently_playing()
-            logger.info(status)
-            logger.info(currently_playing)
-            if status == SpotifyResponse.OK_NEW_SONG and currently_playing is not None:
-                img_status, img = spotify.get_album_cover(currently_playing)
-                if img_status == SpotifyResponse.OK:
-                    currently_playing.cover.data = img
-                    logger.info(
-                        f"Album cover fetched for {currently_playing.title} by {currently_playing.artist}"
-                    )
-                spotify.update_current_song(currently_playing)
-            elif status == SpotifyResponse.OK:
-                pass
-            elif status == SpotifyResponse.OK_SHOW_CACHED:
-                currently_playing = spotify.get_current_song()
-            else:
-                spotify.clear_current_song()
+            status, currently_playing = spotify.refresh_playback()
             render_queue.put(RenderMessage.Music(status=status, song=currently_playing))
             time.sleep(1)
         else:
-            if spotify.get_current_song() is not None:
+            # keep the song if warm-up is keeping it fresh for the next switch
+            if spotify.get_current_song() is not None and not spotify.is_warm():
                 spotify.clear_current_song()
             time.sleep(REFRESH_RATE)
 
 
+def warmup_task() -> None:
+    requests_per_minute = WARMUP_REQUESTS_PER_MINUTE
+    if hasattr(config, "WARMUP_REQUESTS_PER_MINUTE"):
+        requests_per_minute = config.WARMUP_REQUESTS_PER_MINUTE
+    if requests_per_minute <= 0:
+        return
+    scheduler = WarmupScheduler(mode_broadcaster, requests_per_minute)
+    scheduler.register(SignMode.MBTA, mbta_client.warm_up, interval=30)
+    scheduler.register(SignMode.MTA, mta_client.warm_up, interval=30)
+    # a poll, plus a cover download when the song changed
+    scheduler.register(SignMode.MUSIC, spotify.warm_up, interval=10, cost=2)
+    scheduler.run()
+
+
 def widget_provider_task() -> None:
     widget_manager = WidgetManager(render_queue)
     widget_manager.add_widget(ClockWidget(Rect(40, 8, 80, 16)))
@@ -324,26 +437,178 @@ def widget_provider_task() -> None:
         time.sleep(REFRESH_RATE)
 
 
-def game_of_life_provider_task() -> None:
-    grid_width = 160
-    grid_height = 32
+def get_game_of_life_pipeline(
+    grid_width: int, grid_height: int
+) -> tuple[GameOfLifePipeline, GameOfLifeColorMode]:
+    engine = "torus"
+    if hasattr(config, "GAME_OF_LIFE_ENGINE"):
+        engine = config.GAME_OF_LIFE_ENGINE
+    pattern = None
+    if hasattr(config, "GAME_OF_LIFE_PATTERN"):
+        if config.GAME_OF_LIFE_PATTERN in PATTERNS:
+            pattern = parse_rle(PATTERNS[config.GAME_OF_LIFE_PATTERN])
+        else:
+            logger.error(
+                f"Game of Life: Unknown pattern {config.GAME_OF_LIFE_PATTERN!r}, "
+                f"using a random board instead (known: {', '.join(PATTERNS)})"
+            )
+    generations_per_step = 1
+    if hasattr(config, "GAME_OF_LIFE_GENERATIONS_PER_STEP"):
+        generations_per_step = config.GAME_OF_LIFE_GENERATIONS_PER_STEP
+    color_mode = GameOfLifeColorMode.MONO
+    if hasattr(config, "GAME_OF_LIFE_COLOR_MODE"):
+        color_mode = config.GAME_OF_LIFE_COLOR_MODE
+    run_ahead = GAME_OF_LIFE_RUN_AHEAD
+    if hasattr(config, "GAME_OF_LIFE_RUN_AHEAD"):
+        run_ahead = config.GAME_OF_LIFE_RUN_AHEAD
+
+    if engine == "hashlife":
+        produce, reset = get_hashlife_producer(
+            grid_width, grid_height, pattern, generations_per_step
+        )
+    else:
+        produce, reset = get_game_of_life_torus_producer(
+            grid_width, grid_height, pattern, generations_per_step
+        )
+    # Frames are views into the pipeline's buffers, so keep enough of them
+    # for a full render queue plus the frame being drawn.
+    pipeline = GameOfLifePipeline(
+        grid_width,
+        grid_height,
+        produce,
+        reset,
+        frame_interval=REFRESH_RATE,
+        capacity=run_ahead,
+        buffers=render_queue.maxsize + 2,
+        track_ages=color_mode == GameOfLifeColorMode.AGE,
+    )
+    return pipeline, color_mode
 
-    game = GameOfLife(grid_width, grid_height, density=0.3)
 
+def game_of_life_provider_task(
+    pipeline: GameOfLifePipeline, color_mode: GameOfLifeColorMode
+) -> None:
+    underrun = False
+    next_tick = time.monotonic()
     while True:
         if mode_broadcaster.get_status() == SignMode.GAME_OF_LIFE:
-            game.step()
-            render_queue.put(
-                RenderMessage.GameOfLife(
-                    grid=game.get_grid(), generation=game.get_generation()
+            if not pipeline.active and not pipeline.failed:
+                pipeline.start()
+            frame = pipeline.next_frame()
+            if frame is None:
+                if not underrun and pipeline.active:
+                    logger.warning(
+                        f"Game of Life: Simulation fell behind the display "
+                        f"{pipeline.get_stats()}"
+                    )
+                underrun = True
+            else:
+                grid, generation = frame
+                render_queue.put(
+                    RenderMessage.GameOfLife(
+                        grid=grid, generation=generation, color_mode=color_mode
+                    )
                 )
+                underrun = False
+        elif pipeline.active:
+            # nobody sees the frames simulated meanwhile, and they would be
+            # stale by the time the mode comes back
+            pipeline.stop()
+        # tick on a fixed schedule, without bursting to catch up after a stall
+        next_tick = max(next_tick + REFRESH_RATE, time.monotonic())
+        time.sleep(next_tick - time.monotonic())
+
+
+def get_game_of_life_torus_producer(
+    grid_width: int,
+    grid_height: int,
+    pattern: Optional[list[tuple[int, int]]],
+    generations_per_step: int,
+) -> tuple[Callable[[], LifeFrame], Callable[[], None]]:
+    game = GameOfLife(grid_width, grid_height, density=0.3)
+    new_board = True
+
+    def reset() -> None:
+        nonlocal new_board
+        new_board = True
+        if pattern is not None:
+            game.load_pattern(pattern, grid_width // 2, grid_height // 2)
+        else:
+            game.reset()
+
+    def produce() -> LifeFrame:
+        nonlocal new_board
+        game.step(generations_per_step)
+        # the grid stays valid through a reset, which starts a new buffer
+        frame = LifeFrame(game.get_grid(), game.get_generation(), reset=new_board)
+        new_board = False
+        if game.is_stable_or_empty() or game.get_generation() >= 300:
+            period = game.get_period()
+            cycle = f" (period {period})" if period is not None else ""
+            logger.info(
+                f"Game of Life: Resetting after {game.get_generation()} generations{cycle}"
             )
-            if game.is_stable_or_empty() or game.get_generation() >= 300:
-                logger.info(
-                    f"Game of Life: Resetting after {game.get_generation()} generations"
-                )
-                game.reset()
-        time.sleep(REFRESH_RATE)
+            reset()
+        return frame
+
+    reset()
+    return produce, reset
+
+
+def get_hashlife_producer(
+    grid_width: int,
+    grid_height: int,
+    pattern: Optional[list[tuple[int, int]]],
+    generations_per_step: int,
+) -> tuple[Callable[[], LifeFrame], Callable[[], None]]:
+    life = HashLife()
+    viewport = Viewport(grid_width, grid_height)
+    # the world is unbounded, so instead of grid hashes only the population
+    # is watched for a cycle, like the torus engine does for slow cycles
+    populations: deque[int] = deque(maxlen=HASHLIFE_POPULATION_WINDOW)
+    new_board = True
+
+    def reset() -> None:
+        nonlocal new_board
+        new_board = True
+        populations.clear()
+        if pattern is not None:
+            life.load_pattern(pattern)
+        else:
+            life.load_random(grid_width, grid_height, density=0.3)
+
+    def produce() -> LifeFrame:
+        nonlocal new_board
+        life.step(generations_per_step)
+        x, y = viewport.x, viewport.y
+        viewport.follow(*life.find_activity(grid_width))
+        frame = LifeFrame(
+            viewport.get_grid(life).view(np.uint8),
+            life.get_generation(),
+            shift_x=viewport.x - x,
+            shift_y=viewport.y - y,
+            reset=new_board,
+        )
+        new_board = False
+        populations.append(life.get_population())
+        period = None
+        if len(populations) == HASHLIFE_POPULATION_WINDOW:
+            period = find_population_period(populations, HASHLIFE_MAX_PERIOD)
+        if (
+            life.is_empty()
+            or period is not None
+            or life.get_generation() >= HASHLIFE_MAX_GENERATIONS
+        ):
+            cycle = f", period {period} frames" if period is not None else ""
+            logger.info(
+                f"Game of Life: Resetting after {life.get_generation()} generations "
+                f"(population {life.get_population()}{cycle})"
+            )
+            reset()
+        return frame
+
+    reset()
+    return produce, reset
 
 
 def wait_for_network_connection() -> bool:
@@ -379,6 +644,17 @@ def setup_network() -> bool:
         return False
 
 
+def network_check_task() -> None:
+    """
+    The network check of a restart from a snapshot, which runs behind the
+    restored frame instead of replacing it with status messages. Without
+    a network the predictions restored from the snapshot would only get
+    older, so the sign falls back to the clock like on a cold start.
+    """
+    if not wait_for_network_connection():
+        command_bus.submit(UICommand.ModeChange(SignMode.CLOCK))
+
+
 def get_ip_address() -> str:
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.connect(("8.8.8.8", 80))
@@ -387,6 +663,77 @@ def get_ip_address() -> str:
     return ip_address
 
 
+def snapshot_task(display: Display) -> None:
+    interval = SNAPSHOT_INTERVAL
+    if hasattr(config, "SNAPSHOT_INTERVAL"):
+        interval = config.SNAPSHOT_INTERVAL
+    if interval <= 0:
+        return
+    predictions_at = {"mbta": 0.0, "mta": 0.0}
+
+    def on_predictions(name: str) -> Callable[[Any], None]:
+        def update(status: Any) -> None:
+            predictions_at[name] = time.time()
+
+        return update
+
+    mbta_client.prediction_broadcaster.add_listener(on_predictions("mbta"))
+    mta_client.prediction_broadcaster.add_listener(on_predictions("mta"))
+    last_versions = None
+    while True:
+        time.sleep(interval)
+        versions = (
+            display.snapshot.frame_id,
+            mode_broadcaster.version,
+            mbta_client.station_broadcaster.version,
+            mta_client.status_broadcaster.version,
+        )
+        if versions == last_versions:
+            continue
+        frame = display.snapshot.get_current_image()
+        if frame is None:
+            # nothing was swapped to copy it on, the next try will have it
+            continue
+        last_versions = versions
+        save_snapshot(
+            SNAPSHOT_PATH,
+            SignSnapshot(
+                saved_at=time.time(),
+                frame_size=frame.size,
+                frame=frame.tobytes(),
+                mode=mode_broadcaster.get_status(),
+                mbta_station=mbta_client.station,
+                mta_status=mta_client.status_broadcaster.get_status(),
+                mbta_predictions=mbta_client.prediction_broadcaster.get_status(),
+                mbta_predictions_at=predictions_at["mbta"],
+                mta_predictions=mta_client.prediction_broadcaster.get_status(),
+                mta_predictions_at=predictions_at["mta"],
+            ),
+        )
+
+
+def restore_snapshot(display: Display, snapshot: SignSnapshot) -> None:
+    """Puts the sign back the way a previous run left it, before any fetch."""
+    logger.info(f"Restoring snapshot from {snapshot.get_age():.1f}s ago")
+    if snapshot.frame_size == (display.SCREEN_WIDTH, display.SCREEN_HEIGHT):
+        display.framebuffer.paste(snapshot.get_frame())
+        display.swap_canvas()
+    else:
+        # the panel geometry changed since, the old frame would not fit
+        logger.info(f"Not restoring a {snapshot.frame_size} frame")
+    mbta_client.set_station(snapshot.mbta_station)
+    mta_client.status_broadcaster.set_status(snapshot.mta_status)
+    now = time.time()
+    if snapshot.mbta_predictions is not None:
+        status, predictions = snapshot.mbta_predictions
+        if status == mbta.PredictionStatus.OK:
+            age = now - snapshot.mbta_predictions_at
+            mbta_client.restore_predictions(predictions, age)
+    if snapshot.mta_predictions:
+        age = now - snapshot.mta_predictions_at
+        mta_client.restore_predictions(snapshot.mta_predictions, age)
+
+
 def startup_animation() -> None:
     # render the startup animation and wait for it to finish
     render_queue.put(RenderMessage.Clear())
@@ -405,38 +752,87 @@ def main() -> None:
         initial_mode = SignMode[args.mode]
     if args.mta_fake_data:
         config.MTA_FAKE_DATA = True
+    snapshot = None
+    snapshot_max_age = SNAPSHOT_MAX_AGE
+    if hasattr(config, "SNAPSHOT_MAX_AGE"):
+        snapshot_max_age = config.SNAPSHOT_MAX_AGE
+    if snapshot_max_age > 0:
+        snapshot = load_snapshot(SNAPSHOT_PATH, snapshot_max_age)
+    if snapshot is not None and not args.mode:
+        initial_mode = snapshot.mode
     logger.info(f"Initial mode: {initial_mode}")
     mode_broadcaster.set_status(initial_mode)
 
+    # shared by the render loop and the web server's preview. Created first:
+    # with DISPLAY_PROCESS it forks, and the button starts GPIO threads
+    display = Display(render_queue)
     button_handler = None
     if not config.EMULATE_RGB_MATRIX:
         button_handler = Button(
             BUTTON_PIN,
-            short_press_callback=lambda: ui_queue.put(
-                {"type": UIMessageType.MODE_SHIFT}
-            ),
-            long_press_callback=lambda: ui_queue.put({"type": UIMessageType.SHUTDOWN}),
+            short_press_callback=lambda: command_bus.submit(UICommand.ModeShift()),
+            long_press_callback=lambda: command_bus.submit(UICommand.Shutdown()),
             long_press_duration=3.0,
         )
+    if args.trace:
+        recorder = TraceRecorder(args.trace, display.geometry)
+        atexit.register(recorder.close)
+        render_queue.recorder = recorder
+        command_bus.on_submit = recorder.record_command
+        logger.info(f"Recording a trace to {args.trace}")
+    if snapshot is not None:
+        restore_snapshot(display, snapshot)
+    # shared by the Game of Life provider and the web server's stats
+    game_of_life_pipeline, game_of_life_color_mode = get_game_of_life_pipeline(
+        display.SCREEN_WIDTH, display.SCREEN_HEIGHT
+    )
 
     system_threads = [
-        threading.Thread(target=ui_task, daemon=True),
-        threading.Thread(target=render_task, daemon=True),
-        threading.Thread(target=web_server_task, daemon=True),
+        threading.Thread(target=ui_task, name="ui", daemon=True),
+        threading.Thread(
+            target=render_task, args=(display,), name="render", daemon=True
+        ),
+        threading.Thread(
+            target=web_server_task,
+            args=(display, game_of_life_pipeline),
+            name="web-server",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=snapshot_task, args=(display,), name="snapshot", daemon=True
+        ),
     ]
     user_threads = [
-        threading.Thread(target=clock_provider_task, daemon=True),
-        threading.Thread(target=mbta_provider_task, daemon=True),
-        threading.Thread(target=music_provider_task, daemon=True),
-        threading.Thread(target=widget_provider_task, daemon=True),
-        threading.Thread(target=mta_provider_task, daemon=True),
-        threading.Thread(target=game_of_life_provider_task, daemon=True),
+        threading.Thread(target=clock_provider_task, name="clock", daemon=True),
+        threading.Thread(target=mbta_provider_task, name="mbta", daemon=True),
+        threading.Thread(target=music_provider_task, name="music", daemon=True),
+        threading.Thread(target=widget_provider_task, name="widget", daemon=True),
+        threading.Thread(
+            target=mta_provider_task,
+            args=(snapshot is None,),
+            name="mta",
+            daemon=True,
+        ),
+        threading.Thread(
+            target=game_of_life_provider_task,
+            args=(game_of_life_pipeline, game_of_life_color_mode),
+            name="game-of-life-provider",
+            daemon=True,
+        ),
+        threading.Thread(target=warmup_task, name="warmup", daemon=True),
     ]
     for thread in system_threads:
         thread.start()
-    if not setup_network():
-        mode_broadcaster.set_status(SignMode.CLOCK)
-    startup_animation()
+    # after a restart the restored frame stays up while the providers start,
+    # they cope with the network still coming up on their own
+    if snapshot is None:
+        if not setup_network():
+            mode_broadcaster.set_status(SignMode.CLOCK)
+        startup_animation()
+    else:
+        threading.Thread(
+            target=network_check_task, name="network-check", daemon=True
+        ).start()
     for thread in user_threads:
         thread.start()
 
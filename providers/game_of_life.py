@@ -1,60 +1,323 @@
-import random
 import numpy as np
-from scipy.ndimage import convolve
+from collections import deque
 from numpy.typing import NDArray
+from typing import Optional, Sequence
+
+# A few classic patterns in run length encoded format, see
+# https://conwaylife.com/wiki/Run_Length_Encoded
+PATTERNS = {
+    "glider": "bob$2bo$3o!",
+    "lightweight_spaceship": "bo2bo$o4b$o3bo$4o!",
+    "r_pentomino": "b2o$2ob$bo!",
+    "acorn": "bo5b$3bo3b$2o2b3o!",
+    "diehard": "6bob$2o6b$bo3b3o!",
+    "gosper_glider_gun": (
+        "24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$"
+        "2o8bo3bob2o4bobo$10bo5bo7bo$11bo3bo$12b2o!"
+    ),
+}
+
+
+def parse_rle(rle: str) -> list[tuple[int, int]]:
+    """Returns the (x, y) coordinates of the live cells of an RLE pattern."""
+    cells: list[tuple[int, int]] = []
+    x, y = 0, 0
+    count = ""
+    for line in rle.splitlines():
+        line = line.strip()
+        # skip comments and the "x = m, y = n" header line
+        if not line or line.startswith("#") or line.startswith("x"):
+            continue
+        for char in line:
+            if char.isdigit():
+                count += char
+                continue
+            run = int(count) if count else 1
+            count = ""
+            if char == "!":
+                return cells
+            if char == "$":
+                x = 0
+                y += run
+            elif char in "b.":
+                x += run
+            elif char.isalpha():
+                cells.extend((x + i, y) for i in range(run))
+                x += run
+    return cells
+
+
+# Cell age codes. Live cells count their age from NEWBORN up to OLDEST,
+# cells that died in the last generation are DYING and all others are DEAD.
+DEAD = 0
+NEWBORN = 1
+OLDEST = 254
+DYING = 255
+
+
+def find_population_period(
+    populations: Sequence[int], max_period: int
+) -> Optional[int]:
+    """
+    The shortest period, up to max_period, with which the whole population
+    history repeats, or None. A constant population has a period of 1.
+    """
+    populations = list(populations)
+    for period in range(1, min(max_period, len(populations) // 2) + 1):
+        if populations[-1] != populations[-1 - period]:
+            continue
+        if populations[period:] == populations[:-period]:
+            return period
+    return None
+
+
+class CellAges:
+    """
+    Tracks how many generations each cell has been alive for, as uint8 age
+    codes that a renderer can map to colors with a single lookup table.
+    Ages are written into a ring of buffers, so a frame can be handed to the
+    display without copying and stays valid for buffers - 1 more updates.
+    """
+
+    def __init__(self, width: int, height: int, buffers: int = 2) -> None:
+        self._ages = [np.zeros((height, width), dtype=np.uint8) for _ in range(buffers)]
+        self._current = 0
+        self._shifted = np.zeros((height, width), dtype=np.uint8)
+        self._scratch = np.empty((height, width), dtype=np.uint8)
+        self._was_alive = np.empty((height, width), dtype=bool)
+        self._died = np.empty((height, width), dtype=bool)
+
+    @property
+    def ages(self) -> NDArray[np.uint8]:
+        return self._ages[self._current]
+
+    def reset(self, cells: NDArray[np.uint8]) -> None:
+        """Marks every live cell as newborn."""
+        self._current = (self._current + 1) % len(self._ages)
+        np.copyto(self.ages, cells)
+
+    def update(
+        self, cells: NDArray[np.uint8], shift_x: int = 0, shift_y: int = 0
+    ) -> NDArray[np.uint8]:
+        """
+        Ages the cells by one generation given the new live cells, and
+        returns the new ages. shift_x and shift_y move the previous ages
+        along with a panning viewport.
+        """
+        previous = self.ages
+        if shift_x or shift_y:
+            previous = self._shift(previous, shift_x, shift_y)
+        self._current = (self._current + 1) % len(self._ages)
+        ages = self.ages
+        # alive before means a code between NEWBORN and OLDEST, which are the
+        # only codes that stay below OLDEST after subtracting one with wrap
+        np.subtract(previous, 1, out=self._scratch)
+        np.less(self._scratch, OLDEST, out=self._was_alive)
+        np.minimum(previous, OLDEST - 1, out=ages)
+        np.multiply(ages, self._was_alive, out=ages)
+        np.add(ages, 1, out=ages)
+        np.multiply(ages, cells, out=ages)
+        np.greater(self._was_alive, cells, out=self._died)
+        np.copyto(ages, DYING, where=self._died)
+        return ages
+
+    def _shift(
+        self, ages: NDArray[np.uint8], shift_x: int, shift_y: int
+    ) -> NDArray[np.uint8]:
+        """Moves ages by (-shift_x, -shift_y), as seen by a moving viewport."""
+        height, width = ages.shape
+        shifted = self._shifted
+        shifted.fill(DEAD)
+        if abs(shift_x) < width and abs(shift_y) < height:
+            src_x, dst_x = max(shift_x, 0), max(-shift_x, 0)
+            src_y, dst_y = max(shift_y, 0), max(-shift_y, 0)
+            w, h = width - abs(shift_x), height - abs(shift_y)
+            shifted[dst_y : dst_y + h, dst_x : dst_x + w] = ages[
+                src_y : src_y + h, src_x : src_x + w
+            ]
+        return shifted
 
 
 class GameOfLife:
-    def __init__(self, width: int, height: int, density: float = 0.3) -> None:
+    """
+    Conway's Game of Life on a torus. Cells are stored as uint8 (0 or 1)
+    inside grids with a one cell border, which is refreshed with the wrapped
+    opposite edge before every generation. Neighbour counts are then plain
+    slice sums into preallocated buffers, so stepping allocates nothing.
+    Each step() writes its last generation into the next grid of a ring, so
+    get_grid() can hand out views that stay valid for buffers - 1 more
+    calls to step(), however many generations each of them advances.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        density: float = 0.3,
+        max_period: int = 30,
+        population_window: int = 100,
+        buffers: int = 2,
+    ) -> None:
         self.width = width
         self.height = height
-        self.grid: NDArray[np.bool_] = np.zeros((height, width), dtype=bool)
         self.generation = 0
-        self.stable_count = 0
-        self.max_stable_generations = 50
         self.density = density
+        # Cycles up to max_period generations long are detected exactly from
+        # a rolling window of grid hashes. Patterns that only repeat after a
+        # long time, like gliders travelling around the torus, are caught by
+        # their population repeating with a short period for a whole window.
+        self.max_period = max_period
+        self.population_window = population_window
+        self.period: Optional[int] = None
+        self.population_period: Optional[int] = None
+        self._hashes: deque[int] = deque(maxlen=max_period)
+        self._populations: deque[int] = deque(maxlen=population_window)
+        self._rng = np.random.default_rng()
+        # the current generation, the next one and the ones still being
+        # displayed, each with a wrapped border
+        self._grids = [
+            np.zeros((height + 2, width + 2), dtype=np.uint8)
+            for _ in range(max(buffers, 2))
+        ]
+        self._current = 0
+        # the generations a multi-generation step passes through on its way
+        # to the next grid alternate between that grid and this one
+        self._between = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        # scratch buffers for the neighbour counts and the rule masks
+        self._column_sums = np.empty((height, width + 2), dtype=np.uint8)
+        self._counts = np.empty((height, width), dtype=np.uint8)
+        self._births = np.empty((height, width), dtype=bool)
+        self._survivals = np.empty((height, width), dtype=bool)
+        self._random = np.empty((height, width), dtype=np.float64)
         self._initialize_random_grid()
 
+    @property
+    def grid(self) -> NDArray[np.uint8]:
+        """The current generation, as a view without the wrapped border."""
+        return self._grids[self._current][1:-1, 1:-1]
+
     def _initialize_random_grid(self) -> None:
         """Initialize grid with random living cells based on density."""
-        for y in range(self.height):
-            for x in range(self.width):
-                self.grid[y, x] = random.random() < self.density
+        self._advance_buffer()
+        self._rng.random(out=self._random)
+        np.less(self._random, self.density, out=self.grid.view(bool))
+        self._restart()
+
+    def _advance_buffer(self) -> None:
+        """Moves to the next grid, leaving the current one to the display."""
+        self._current = (self._current + 1) % len(self._grids)
+
+    def _restart(self) -> None:
+        """Starts counting generations and cycles from the current grid."""
         self.generation = 0
-        self.stable_count = 0
+        self.period = None
+        self.population_period = None
+        self._hashes.clear()
+        self._populations.clear()
+        self._record_generation(self.grid)
+
+    def _record_generation(self, cells: NDArray[np.uint8]) -> None:
+        """Looks for a cycle ending in the generation cells."""
+        grid_hash = hash(np.packbits(cells).tobytes())
+        if self.period is None:
+            for period, previous_hash in enumerate(reversed(self._hashes), 1):
+                if previous_hash == grid_hash:
+                    self.period = period
+                    break
+        self._hashes.append(grid_hash)
 
-    def step(self) -> bool:
-        """Advance the game by one generation. Returns True if grid changed."""
-        kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-        # Count neighbors for all cells using convolution with wraparound
-        neighbor_count = convolve(self.grid.astype(int), kernel, mode="wrap")
-        survives = self.grid & ((neighbor_count == 2) | (neighbor_count == 3))
-        births = (~self.grid) & (neighbor_count == 3)
-        new_grid = survives | births
+        self._populations.append(int(np.count_nonzero(cells)))
+        if (
+            self.population_period is None
+            and len(self._populations) == self.population_window
+        ):
+            self.population_period = find_population_period(
+                self._populations, self.max_period
+            )
 
-        # Check if grid changed
-        changed = not np.array_equal(self.grid, new_grid)
-        self.grid = new_grid
-        self.generation += 1
+    def _wrap_edges(self, padded: NDArray[np.uint8]) -> None:
+        padded[0, 1:-1] = padded[-2, 1:-1]
+        padded[-1, 1:-1] = padded[1, 1:-1]
+        # the columns include the corners, which need both wraps
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
 
-        if not changed:
-            self.stable_count += 1
-        else:
-            self.stable_count = 0
+    def _compute_generation(
+        self, current: NDArray[np.uint8], following: NDArray[np.uint8]
+    ) -> None:
+        """Writes the generation after the padded grid current into following."""
+        self._wrap_edges(current)
+        # 3x3 sums including the cell itself: sum the rows, then the columns
+        column_sums, counts = self._column_sums, self._counts
+        np.add(current[:-2], current[1:-1], out=column_sums)
+        np.add(column_sums, current[2:], out=column_sums)
+        np.add(column_sums[:, :-2], column_sums[:, 1:-1], out=counts)
+        np.add(counts, column_sums[:, 2:], out=counts)
+        # a cell is alive next if its 3x3 sum is 3, or 4 and it is alive now
+        cells = current[1:-1, 1:-1]
+        np.equal(counts, 3, out=self._births)
+        np.equal(counts, 4, out=self._survivals)
+        np.logical_and(self._survivals, cells, out=self._survivals)
+        next_cells = following[1:-1, 1:-1]
+        np.logical_or(self._births, self._survivals, out=next_cells.view(bool))
 
-        return changed
+    def step(self, generations: int = 1) -> bool:
+        """
+        Advance the game by the given number of generations. Returns True if
+        the last generation changed the grid.
+        """
+        if generations <= 0:
+            return False
+        next_index = (self._current + 1) % len(self._grids)
+        current = self._grids[self._current]
+        for remaining in range(generations, 0, -1):
+            # counted back from the last generation, which must land in the
+            # next grid, so grids still being displayed are never written
+            if remaining % 2 == 1:
+                following = self._grids[next_index]
+            else:
+                following = self._between
+            self._compute_generation(current, following)
+            self.generation += 1
+            self._record_generation(following[1:-1, 1:-1])
+            current = following
+        self._current = next_index
+        return self.period != 1
+
+    def get_period(self) -> Optional[int]:
+        """
+        The period of the cycle the game settled into, or None. Still lifes
+        have a period of 1. Falls back to the period of the population when
+        the grid itself repeats too slowly to be detected.
+        """
+        if self.period is not None:
+            return self.period
+        return self.population_period
 
     def is_stable_or_empty(self) -> bool:
-        """Check if the game has reached a stable state or is empty."""
-        return self.stable_count >= self.max_stable_generations or not np.any(self.grid)
+        """Check if the game has settled into a cycle or is empty."""
+        return self.get_period() is not None or self._populations[-1] == 0
 
     def reset(self) -> None:
         """Reset the game with a new random configuration."""
         self._initialize_random_grid()
 
-    def get_grid(self) -> NDArray[np.bool_]:
-        """Get the current grid state."""
-        return self.grid.copy()
+    def load_pattern(
+        self, cells: list[tuple[int, int]], offset_x: int = 0, offset_y: int = 0
+    ) -> None:
+        """Replace the grid with the given live cells, wrapped onto the torus."""
+        self._advance_buffer()
+        self.grid.fill(0)
+        for x, y in cells:
+            self.grid[(y + offset_y) % self.height, (x + offset_x) % self.width] = 1
+        self._restart()
+
+    def get_grid(self) -> NDArray[np.uint8]:
+        """
+        Get the current grid state, as a view that stays valid for
+        buffers - 1 more calls to step().
+        """
+        return self.grid
 
     def get_generation(self) -> int:
         """Get the current generation number."""
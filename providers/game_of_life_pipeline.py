@@ -0,0 +1,221 @@
+import logging
+import numpy as np
+import threading
+from dataclasses import dataclass
+from numpy.typing import NDArray
+from typing import Callable, Optional
+from .game_of_life import CellAges
+
+logger = logging.getLogger("led-matrix-sign")
+
+# Row i holds the eight cells packed into the byte i, in np.packbits order
+UNPACK_LUT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1)
+# the worker gives up after this many produce() errors in a row
+PIPELINE_MAX_ERRORS = 3
+
+
+@dataclass
+class LifeFrame:
+    """A generation as produced by an engine, before it is packed."""
+
+    cells: NDArray[np.uint8]
+    generation: int
+    # how far the view moved since the previous frame, for panning engines
+    shift_x: int = 0
+    shift_y: int = 0
+    # the first frame of a new board, which shares no history with the last
+    reset: bool = False
+
+
+@dataclass
+class PipelineStats:
+    depth: int
+    capacity: int
+    produced: int
+    consumed: int
+    underruns: int
+    lead_seconds: float
+    active: bool
+    errors: int
+    failed: bool
+
+
+class GameOfLifePipeline:
+    """
+    Runs a Game of Life engine ahead of the display on its own thread. The
+    worker calls produce() for every frame and packs the cells into a ring
+    of bit-packed grids, blocking while the ring is full. The display thread
+    takes one frame per tick with next_frame(), so a slow step or a reset
+    eats into the lead instead of showing up as a stutter. stop() pauses the
+    worker and drops the frames it ran ahead, so a screen that comes back
+    continues from fresh frames.
+
+    When produce() raises, the error is logged and reset() starts a new
+    board; after PIPELINE_MAX_ERRORS errors in a row the worker ends and
+    the pipeline reports itself failed.
+
+    Unpacked frames are written into a ring of buffers, so they can be put
+    on the render queue without copying and stay valid for buffers - 1 more
+    frames. Cell ages are tracked on this side, counting frames.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        produce: Callable[[], LifeFrame],
+        reset: Callable[[], None],
+        frame_interval: float,
+        capacity: int = 30,
+        buffers: int = 2,
+        track_ages: bool = False,
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.produce = produce
+        self.reset = reset
+        self.frame_interval = frame_interval
+        self.capacity = capacity
+        packed_width = (width + 7) // 8
+        self._packed = np.zeros((capacity, height, packed_width), dtype=np.uint8)
+        self._generations = [0] * capacity
+        self._shifts = [(0, 0)] * capacity
+        self._resets = [False] * capacity
+        self._read_index = 0
+        self._write_index = 0
+        self._count = 0
+        # the next frame read does not follow the last one, see stop()
+        self._discontinued = False
+        # an empty ring only counts as an underrun once a frame was read
+        # since start(), not while the worker fills it for the first time
+        self._primed = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.active = False
+        self.produced = 0
+        self.consumed = 0
+        self.underruns = 0
+        self.errors = 0
+        self.failed = False
+        self._cells = [
+            np.zeros((height, packed_width, 8), dtype=np.uint8) for _ in range(buffers)
+        ]
+        self._current = 0
+        self.ages = CellAges(width, height, buffers) if track_ages else None
+
+    def start(self) -> None:
+        if self.active or self.failed:
+            return
+        self.active = True
+        self._primed = False
+        self._thread = threading.Thread(
+            target=self._run, name="game-of-life", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self.active = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._condition:
+            self._read_index = self._write_index
+            self._count = 0
+            self._discontinued = True
+
+    def _run(self) -> None:
+        consecutive_errors = 0
+        while True:
+            with self._condition:
+                while self.active and self._count == self.capacity:
+                    self._condition.wait()
+                if not self.active:
+                    return
+            try:
+                frame = self.produce()
+            except Exception:
+                consecutive_errors += 1
+                self.errors += 1
+                logger.exception("Game of Life: Simulation step failed")
+                if consecutive_errors >= PIPELINE_MAX_ERRORS or not self._reset():
+                    logger.error(
+                        f"Game of Life: Stopping the simulation after "
+                        f"{consecutive_errors} errors in a row"
+                    )
+                    with self._condition:
+                        self.active = False
+                        self.failed = True
+                        self._condition.notify_all()
+                    return
+                continue
+            consecutive_errors = 0
+            # the slot is free until _count says otherwise, so it can be
+            # written without holding the lock
+            index = self._write_index
+            self._packed[index] = np.packbits(frame.cells, axis=1)
+            self._generations[index] = frame.generation
+            self._shifts[index] = (frame.shift_x, frame.shift_y)
+            self._resets[index] = frame.reset
+            with self._condition:
+                self._write_index = (index + 1) % self.capacity
+                self._count += 1
+                self.produced += 1
+                self._condition.notify_all()
+
+    def _reset(self) -> bool:
+        try:
+            self.reset()
+            return True
+        except Exception:
+            logger.exception("Game of Life: Resetting the board failed")
+            return False
+
+    def next_frame(self) -> Optional[tuple[NDArray[np.uint8], int]]:
+        """
+        Returns the next frame and its generation, or None if the worker
+        fell behind or is not running. Frames are cell codes: 0/1 cells, or ages when the
+        pipeline tracks them.
+        """
+        with self._condition:
+            if self._count == 0:
+                if self._primed:
+                    self.underruns += 1
+                return None
+            self._primed = True
+            discontinued = self._discontinued
+            self._discontinued = False
+        index = self._read_index
+        self._current = (self._current + 1) % len(self._cells)
+        unpacked = self._cells[self._current]
+        np.take(UNPACK_LUT, self._packed[index], axis=0, out=unpacked)
+        cells = unpacked.reshape(self.height, -1)[:, : self.width]
+        generation = self._generations[index]
+        shift_x, shift_y = self._shifts[index]
+        is_new_board = self._resets[index] or discontinued
+        self._read_index = (index + 1) % self.capacity
+        with self._condition:
+            self._count -= 1
+            self.consumed += 1
+            self._condition.notify_all()
+        if self.ages is not None:
+            if is_new_board:
+                self.ages.reset(cells)
+                return self.ages.ages, generation
+            return self.ages.update(cells, shift_x, shift_y), generation
+        return cells, generation
+
+    def get_stats(self) -> PipelineStats:
+        with self._condition:
+            return PipelineStats(
+                depth=self._count,
+                capacity=self.capacity,
+                produced=self.produced,
+                consumed=self.consumed,
+                underruns=self.underruns,
+                lead_seconds=self._count * self.frame_interval,
+                active=self.active,
+                errors=self.errors,
+                failed=self.failed,
+            )
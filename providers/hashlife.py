@@ -0,0 +1,377 @@
+import numpy as np
+from functools import lru_cache
+from numpy.typing import NDArray
+from typing import Any, Optional
+
+# Upper bound on the entries of each memo table. A node with its cache entry
+# costs a couple hundred bytes, so the default keeps the engine well below
+# 100 MB even on a Raspberry Pi.
+HASHLIFE_CACHE_SIZE = 1 << 17
+# Nodes of this level and below are converted to numpy tiles (8x8 cells)
+# when drawing a viewport.
+TILE_LEVEL = 3
+
+
+class Node:
+    """
+    A square of 2**level by 2**level cells, made of four quadrants of the
+    level below. Level 0 nodes are single cells. Nodes are immutable and
+    hashed by structure, so identical regions share their memoized results.
+    """
+
+    __slots__ = ("level", "nw", "ne", "sw", "se", "population", "_hash")
+
+    def __init__(
+        self,
+        level: int,
+        nw: Optional["Node"] = None,
+        ne: Optional["Node"] = None,
+        sw: Optional["Node"] = None,
+        se: Optional["Node"] = None,
+        population: int = 0,
+    ) -> None:
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        if level == 0:
+            self.population = population
+            self._hash = population
+        else:
+            assert nw and ne and sw and se
+            self.population = (
+                nw.population + ne.population + sw.population + se.population
+            )
+            self._hash = hash((level, nw._hash, ne._hash, sw._hash, se._hash))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Node) or self._hash != other._hash:
+            return False
+        if self.level == 0:
+            return self.population == other.population
+        return (
+            self.level == other.level
+            and self.nw == other.nw
+            and self.ne == other.ne
+            and self.sw == other.sw
+            and self.se == other.se
+        )
+
+
+OFF = Node(0, population=0)
+ON = Node(0, population=1)
+
+
+class HashLife:
+    """
+    Conway's Game of Life on an unbounded plane, using Gosper's HashLife
+    algorithm. The world is a quadtree whose root is centred on the origin.
+    Repeated regions are stored once, and the future of each region is
+    memoized, so patterns with a lot of repetition can be advanced by
+    millions of generations in a single step. The memo tables are LRU caches
+    with a fixed size; evicting an entry only costs recomputing it later.
+    """
+
+    def __init__(self, max_cache_size: int = HASHLIFE_CACHE_SIZE) -> None:
+        self.generation = 0
+        self._join = lru_cache(maxsize=max_cache_size)(self._join_uncached)
+        self._successor = lru_cache(maxsize=max_cache_size)(self._successor_uncached)
+        self._tile = lru_cache(maxsize=max_cache_size >> 4)(self._tile_uncached)
+        self._moments = lru_cache(maxsize=max_cache_size >> 4)(self._moments_uncached)
+        self._empty = lru_cache(maxsize=None)(self._empty_uncached)
+        self.root = self._empty(TILE_LEVEL)
+
+    def _empty_uncached(self, level: int) -> Node:
+        if level == 0:
+            return OFF
+        child = self._empty(level - 1)
+        return self._join(child, child, child, child)
+
+    def _join_uncached(self, nw: Node, ne: Node, sw: Node, se: Node) -> Node:
+        return Node(nw.level + 1, nw, ne, sw, se)
+
+    def _centre(self, node: Node) -> Node:
+        """Returns the node one level up with node in its middle."""
+        border = self._empty(node.level - 1)
+        assert node.nw and node.ne and node.sw and node.se
+        return self._join(
+            self._join(border, border, border, node.nw),
+            self._join(border, border, node.ne, border),
+            self._join(border, node.sw, border, border),
+            self._join(node.se, border, border, border),
+        )
+
+    def _life_4x4(self, node: Node) -> Node:
+        """Advances the middle 2x2 cells of a level 2 node by one generation."""
+        cells = [[self._cell(node, x, y) for x in range(4)] for y in range(4)]
+        result = []
+        for y in (1, 2):
+            for x in (1, 2):
+                neighbours = sum(
+                    cells[y + dy][x + dx]
+                    for dy in (-1, 0, 1)
+                    for dx in (-1, 0, 1)
+                    if dx or dy
+                )
+                alive = neighbours == 3 or (neighbours == 2 and cells[y][x])
+                result.append(ON if alive else OFF)
+        return self._join(*result)
+
+    def _cell(self, node: Node, x: int, y: int) -> int:
+        while node.level > 0:
+            half = 1 << (node.level - 1)
+            if y < half:
+                node = node.nw if x < half else node.ne  # type: ignore[assignment]
+            else:
+                node = node.sw if x < half else node.se  # type: ignore[assignment]
+            x, y = x % half, y % half
+        return node.population
+
+    def _successor_uncached(self, node: Node, j: int) -> Node:
+        """
+        Returns the middle half of node advanced by 2**j generations, where
+        j is at most node.level - 2. The result is one level below node.
+        """
+        if node.population == 0:
+            return self._empty(node.level - 1)
+        if node.level == 2:
+            return self._life_4x4(node)
+        j = min(j, node.level - 2)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        assert nw and ne and sw and se
+        join = self._join
+        # the nine overlapping sub-squares one level down, advanced
+        c1 = self._successor(nw, j)
+        c2 = self._successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+        c3 = self._successor(ne, j)
+        c4 = self._successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+        c5 = self._successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+        c6 = self._successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+        c7 = self._successor(sw, j)
+        c8 = self._successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+        c9 = self._successor(se, j)
+        if j < node.level - 2:
+            # the sub-squares already went far enough, keep their middles
+            return join(
+                join(c1.se, c2.sw, c4.ne, c5.nw),
+                join(c2.se, c3.sw, c5.ne, c6.nw),
+                join(c4.se, c5.sw, c7.ne, c8.nw),
+                join(c5.se, c6.sw, c8.ne, c9.nw),
+            )
+        # otherwise advance the four overlapping quadrants once more
+        return join(
+            self._successor(join(c1, c2, c4, c5), j),
+            self._successor(join(c2, c3, c5, c6), j),
+            self._successor(join(c4, c5, c7, c8), j),
+            self._successor(join(c5, c6, c8, c9), j),
+        )
+
+    def _is_padded(self, node: Node) -> bool:
+        """Checks that all live cells are in the middle half of node."""
+        assert node.nw and node.ne and node.sw and node.se
+        inner = (
+            node.nw.se.population  # type: ignore[union-attr]
+            + node.ne.sw.population  # type: ignore[union-attr]
+            + node.sw.ne.population  # type: ignore[union-attr]
+            + node.se.nw.population  # type: ignore[union-attr]
+        )
+        return inner == node.population
+
+    def _advance(self, j: int) -> None:
+        root = self.root
+        # A pattern grows at most one cell per generation, so it has to
+        # stay clear of the edges by 2**j cells to be advanced in one go.
+        while root.level < j + 2 or not self._is_padded(root):
+            root = self._centre(root)
+        self.root = self._successor(self._centre(root), j)
+
+    def step(self, generations: int = 1) -> None:
+        """Advance the world by any number of generations."""
+        remaining, j = generations, 0
+        while remaining:
+            if remaining & 1:
+                self._advance(j)
+            remaining >>= 1
+            j += 1
+        self.generation += generations
+
+    def load_pattern(
+        self, cells: list[tuple[int, int]], offset_x: int = 0, offset_y: int = 0
+    ) -> None:
+        """Replace the world with the given live cells."""
+        cells = [(x + offset_x, y + offset_y) for x, y in cells]
+        level = TILE_LEVEL
+        # the root covers -half to half - 1 on both axes
+        extent = max((max(-x, x + 1, -y, y + 1) for x, y in cells), default=0)
+        while (1 << (level - 1)) < extent:
+            level += 1
+        half = 1 << (level - 1)
+        self.root = self._build(level, -half, -half, cells)
+        self.generation = 0
+
+    def load_random(self, width: int, height: int, density: float = 0.3) -> None:
+        """Replace the world with a random soup of the given size."""
+        ys, xs = np.nonzero(np.random.random((height, width)) < density)
+        cells = list(zip(xs.tolist(), ys.tolist()))
+        self.load_pattern(cells, -width // 2, -height // 2)
+
+    def _build(self, level: int, x: int, y: int, cells: list[tuple[int, int]]) -> Node:
+        if not cells:
+            return self._empty(level)
+        if level == 0:
+            return ON
+        half = 1 << (level - 1)
+        quadrants: list[list[tuple[int, int]]] = [[], [], [], []]
+        for cx, cy in cells:
+            quadrants[(cy >= y + half) * 2 + (cx >= x + half)].append((cx, cy))
+        return self._join(
+            self._build(level - 1, x, y, quadrants[0]),
+            self._build(level - 1, x + half, y, quadrants[1]),
+            self._build(level - 1, x, y + half, quadrants[2]),
+            self._build(level - 1, x + half, y + half, quadrants[3]),
+        )
+
+    def get_viewport(
+        self, x: int, y: int, width: int, height: int
+    ) -> NDArray[np.bool_]:
+        """Returns the cells of the given rectangle of the world."""
+        out = np.zeros((height, width), dtype=bool)
+        half = 1 << (self.root.level - 1)
+        self._paint(self.root, -half - x, -half - y, out)
+        return out
+
+    def _paint(self, node: Node, x: int, y: int, out: NDArray[np.bool_]) -> None:
+        """Draws node into out, with its top left corner at (x, y) in out."""
+        size = 1 << node.level
+        height, width = out.shape
+        if (
+            node.population == 0
+            or x >= width
+            or y >= height
+            or x + size <= 0
+            or y + size <= 0
+        ):
+            return
+        if node.level <= TILE_LEVEL:
+            tile = self._tile(node)
+            left, top = max(x, 0), max(y, 0)
+            right, bottom = min(x + size, width), min(y + size, height)
+            out[top:bottom, left:right] = tile[
+                top - y : bottom - y, left - x : right - x
+            ]
+            return
+        half = size >> 1
+        assert node.nw and node.ne and node.sw and node.se
+        self._paint(node.nw, x, y, out)
+        self._paint(node.ne, x + half, y, out)
+        self._paint(node.sw, x, y + half, out)
+        self._paint(node.se, x + half, y + half, out)
+
+    def _tile_uncached(self, node: Node) -> NDArray[np.bool_]:
+        if node.level == 0:
+            return np.full((1, 1), node.population == 1)
+        assert node.nw and node.ne and node.sw and node.se
+        tile = np.block(
+            [
+                [self._tile(node.nw), self._tile(node.ne)],
+                [self._tile(node.sw), self._tile(node.se)],
+            ]
+        )
+        tile.flags.writeable = False
+        return tile
+
+    def _moments_uncached(self, node: Node) -> tuple[int, int, int]:
+        """Population and sums of the x and y coordinates of the live cells."""
+        if node.level == 0 or node.population == 0:
+            return node.population, 0, 0
+        half = 1 << (node.level - 1)
+        population, sum_x, sum_y = 0, 0, 0
+        assert node.nw and node.ne and node.sw and node.se
+        for child, dx, dy in (
+            (node.nw, 0, 0),
+            (node.ne, half, 0),
+            (node.sw, 0, half),
+            (node.se, half, half),
+        ):
+            p, sx, sy = self._moments(child)
+            population += p
+            sum_x += sx + p * dx
+            sum_y += sy + p * dy
+        return population, sum_x, sum_y
+
+    def find_activity(self, size: int) -> tuple[float, float]:
+        """
+        Returns the centre of the busiest part of the world, found by
+        descending into the most populated quadrant until the region is
+        about size cells wide.
+        """
+        node = self.root
+        half = 1 << (node.level - 1)
+        x, y = -half, -half
+        while node.level > 0 and (1 << (node.level - 1)) >= size:
+            half = 1 << (node.level - 1)
+            assert node.nw and node.ne and node.sw and node.se
+            node, x, y = max(
+                (
+                    (node.nw, x, y),
+                    (node.ne, x + half, y),
+                    (node.sw, x, y + half),
+                    (node.se, x + half, y + half),
+                ),
+                key=lambda candidate: candidate[0].population,
+            )
+        population, sum_x, sum_y = self._moments(node)
+        if population == 0:
+            return 0.0, 0.0
+        return x + sum_x / population, y + sum_y / population
+
+    def get_population(self) -> int:
+        return self.root.population
+
+    def get_generation(self) -> int:
+        """Get the current generation number."""
+        return self.generation
+
+    def is_empty(self) -> bool:
+        return self.root.population == 0
+
+    def cache_info(self) -> dict[str, Any]:
+        return {
+            "join": self._join.cache_info(),
+            "successor": self._successor.cache_info(),
+            "tile": self._tile.cache_info(),
+            "moments": self._moments.cache_info(),
+        }
+
+
+class Viewport:
+    """
+    A window onto a HashLife world that pans towards a target point by at
+    most max_speed cells per update, and jumps there when it is far away.
+    """
+
+    def __init__(self, width: int, height: int, max_speed: int = 1) -> None:
+        self.width = width
+        self.height = height
+        self.max_speed = max_speed
+        self.x = -width // 2
+        self.y = -height // 2
+
+    def follow(self, target_x: float, target_y: float) -> None:
+        dx = round(target_x - self.width / 2) - self.x
+        dy = round(target_y - self.height / 2) - self.y
+        if abs(dx) > self.width or abs(dy) > self.height:
+            self.x += dx
+            self.y += dy
+            return
+        self.x += max(-self.max_speed, min(self.max_speed, dx))
+        self.y += max(-self.max_speed, min(self.max_speed, dy))
+
+    def get_grid(self, life: HashLife) -> NDArray[np.bool_]:
+        return life.get_viewport(self.x, self.y, self.width, self.height)
@@ -1,5 +1,6 @@
 import json
 import os
+import re
 import time
 import config
 from datetime import datetime, timezone
@@ -17,6 +18,8 @@ logger = logging.getLogger("led-matrix-sign")
 DIRECTION_SOUTHBOUND = 0
 DIRECTION_NORTHBOUND = 1
 MBTA_MAX_ERROR_COUNT = 3
+# predictions fetched by warm_up are shown for at most this long
+MBTA_WARM_MAX_AGE = 60  # seconds
 
 MBTA_PREDICTIONS_URL = "https://api-v3.mbta.com/predictions"
 
@@ -55,6 +58,24 @@ def train_station_to_str(station: str) -> str:
     return ""
 
 
+def advance_prediction(prediction: Prediction, seconds: float) -> Prediction:
+    """The prediction as it would read seconds later, as far as its value tells."""
+    match = re.fullmatch(r"(\d+) min", prediction.value)
+    if match is None:
+        # ARR, BRD and statuses cannot be counted down, only dropped when old
+        value = prediction.value if seconds < 30 else ""
+        return Prediction(label=prediction.label, value=value)
+    # "N min" is anywhere from N to N+1 minutes away
+    remaining = int(match.group(1)) * 60 + 30 - seconds
+    if remaining > 60:
+        value = f"{int(remaining / 60)} min"
+    elif remaining > 0:
+        value = "ARR"
+    else:
+        value = ""
+    return Prediction(label=prediction.label, value=value)
+
+
 class MBTA:
     def __init__(self, api_key: str) -> None:
         self.api_key = api_key
@@ -62,6 +83,10 @@ class MBTA:
         self.error_count = 0
         self.station_broadcaster = StatusBroadcaster()
         self.station_broadcaster.set_status(DEFAULT_MBTA_STATION)
+        # the status and predictions last shown on the sign
+        self.prediction_broadcaster = StatusBroadcaster()
+        # (fetched at, station, predictions) from the last warm_up
+        self.warm_predictions: Optional[tuple[float, str, List[Prediction]]] = None
 
     @property
     def station(self) -> str:
@@ -70,6 +95,19 @@ class MBTA:
     def get_predictions(
         self, num_predictions: int, directions: List[int], nth_positions: List[int]
     ) -> tuple[PredictionStatus, List[Prediction]]:
+        status, dst = self._get_predictions(num_predictions, directions, nth_positions)
+        if status == PredictionStatus.ERROR:
+            self.error_count += 1
+            if self.error_count <= MBTA_MAX_ERROR_COUNT:
+                return PredictionStatus.ERROR_SHOW_CACHED, dst
+            return PredictionStatus.ERROR, dst
+        self.error_count = 0
+        return status, dst
+
+    def _get_predictions(
+        self, num_predictions: int, directions: List[int], nth_positions: List[int]
+    ) -> tuple[PredictionStatus, List[Prediction]]:
+        """Like get_predictions, but a failed fetch is only ERROR, not counted."""
         dst = [Prediction() for _ in range(num_predictions)]
 
         if self.station == "test":
@@ -80,12 +118,8 @@ class MBTA:
 
         prediction_data = self._fetch_predictions()
         if prediction_data is None:
-            self.error_count += 1
-            if self.error_count <= MBTA_MAX_ERROR_COUNT:
-                return PredictionStatus.ERROR_SHOW_CACHED, dst
             return PredictionStatus.ERROR, dst
 
-        self.error_count = 0
         if len(prediction_data["data"]) == 0:
             return PredictionStatus.ERROR_EMPTY, dst
 
@@ -111,6 +145,36 @@ class MBTA:
         nth_positions = [0, 1]
         return self.get_predictions(2, directions, nth_positions)
 
+    def warm_up(self) -> None:
+        """Fetches predictions ahead of time for take_warm_predictions."""
+        station = self.station
+        # a failed warm-up is not the sign's own error to count, and the
+        # provider thread may be counting them at the same time
+        status, predictions = self._get_predictions(
+            2, [DIRECTION_SOUTHBOUND, DIRECTION_NORTHBOUND], [0, 0]
+        )
+        if status == PredictionStatus.OK:
+            self.warm_predictions = (time.monotonic(), station, predictions)
+
+    def take_warm_predictions(self) -> Optional[List[Prediction]]:
+        """
+        The predictions from the last warm_up, if still fresh, counted down
+        to now. Each warm_up is taken only once.
+        """
+        warm, self.warm_predictions = self.warm_predictions, None
+        if warm is None:
+            return None
+        fetched_at, station, predictions = warm
+        age = time.monotonic() - fetched_at
+        if station != self.station or age > MBTA_WARM_MAX_AGE:
+            return None
+        return [advance_prediction(p, age) for p in predictions]
+
+    def restore_predictions(self, predictions: List[Prediction], age: float) -> None:
+        """Shows predictions from a previous run next, counted down by age."""
+        advanced = [advance_prediction(p, age) for p in predictions]
+        self.warm_predictions = (time.monotonic(), self.station, advanced)
+
     def _fetch_predictions(self) -> Optional[dict]:
         try:
             station = station_by_id(self.station)
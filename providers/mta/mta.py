@@ -6,8 +6,9 @@ import requests
 import config
 import pickle
 import pytz
+import time
 from common.broadcaster import StatusBroadcaster
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pprint import pprint
 from typing import Dict, List, Optional, TypedDict
@@ -21,6 +22,8 @@ DEFAULT_MTA_STATION = "121"  # 86 St 1,2,3 station
 if hasattr(config, "DEFAULT_MTA_STATION"):
     DEFAULT_MTA_STATION = config.DEFAULT_MTA_STATION
 MAX_NUM_PREDICTIONS = 6
+# predictions fetched by warm_up are shown for at most this long
+MTA_WARM_MAX_AGE = 60  # seconds
 
 
 station_data = json.load(open(os.path.join(CURRENT_FOLDER, "stations.json")))
@@ -128,6 +131,20 @@ def get_second_train(
     return predictions[1]
 
 
+def advance_train_times(
+    train_times: List[TrainTime], seconds: float
+) -> List[TrainTime]:
+    """The train times as they would be seconds later, without departed trains."""
+    advanced = [
+        replace(train, time=int(train.time - seconds))
+        for train in train_times
+        if train.time - seconds >= 0
+    ]
+    for i, train in enumerate(advanced):
+        train.display_order = i
+    return advanced
+
+
 def print_predictions(predictions: List[TrainTime]) -> None:
     for train in predictions:
         logger.info(
@@ -153,8 +170,16 @@ class MTA:
         self.api_key = api_key
         self.status_broadcaster = StatusBroadcaster()
         self.status_broadcaster.set_status(Status(station=DEFAULT_MTA_STATION))
+        # The predictions last shown on the board.
+        self.prediction_broadcaster = StatusBroadcaster()
         # The last train to be shown in the second slot on the board.
         self.last_second_train: Optional[TrainTime] = None
+        # filled by load_historical_data, for MTA_FAKE_DATA
+        self.historical_data: Dict[str, List[HistoricalTrainTime]] = {}
+        # (fetched at, station, direction, predictions) from the last warm_up
+        self.warm_predictions: Optional[
+            tuple[float, str, Direction, List[TrainTime]]
+        ] = None
 
     def get_predictions(
         self, stop_id: str, direction: Direction = Direction.DIRECTION_NONE
@@ -210,6 +235,50 @@ class MTA:
             logger.error("unable to fetch nearby api", exc_info=err)
             return None
 
+    def warm_up(self) -> None:
+        """Fetches predictions ahead of time for take_warm_predictions."""
+        station = self.get_current_station()
+        direction = self.get_current_direction()
+        if station is None:
+            return
+        if config.MTA_FAKE_DATA:
+            predictions = self.get_fake_predictions(station)
+        else:
+            predictions = self.get_predictions(station, direction)
+        if predictions:
+            self.warm_predictions = (time.monotonic(), station, direction, predictions)
+
+    def take_warm_predictions(self) -> Optional[List[TrainTime]]:
+        """
+        The predictions from the last warm_up, if still fresh, counted down
+        to now. Each warm_up is taken only once.
+        """
+        warm, self.warm_predictions = self.warm_predictions, None
+        if warm is None:
+            return None
+        fetched_at, station, direction, predictions = warm
+        if (
+            station != self.get_current_station()
+            or direction != self.get_current_direction()
+            or time.monotonic() - fetched_at > MTA_WARM_MAX_AGE
+        ):
+            return None
+        # trains that left since are dropped, not shown at 0min
+        advanced = advance_train_times(predictions, time.monotonic() - fetched_at)
+        return advanced or None
+
+    def restore_predictions(self, predictions: List[TrainTime], age: float) -> None:
+        """Shows predictions from a previous run next, counted down by age."""
+        station = self.get_current_station()
+        advanced = advance_train_times(predictions, age)
+        if station is not None and advanced:
+            self.warm_predictions = (
+                time.monotonic(),
+                station,
+                self.get_current_direction(),
+                advanced,
+            )
+
     def _seconds_since_midnight(self) -> int:
         # this function will always be in EST timezone, since the historical
         # data is in EST timezone
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+from PIL import Image
+
+logger = logging.getLogger("led-matrix-sign")
+
+COVER_SIZE = (32, 32)
+COVER_MEMORY_CACHE_SIZE = 64
+
+
+class AlbumCoverCache:
+    """
+    Two-tier cache of album covers keyed by cover URL. The memory tier is an
+    LRU of decoded, resized RGB images that can be blitted directly. The disk
+    tier stores the same pixels as raw RGB bytes (32 * 32 * 3 = 3 KB per
+    cover), so each album is decoded only once across restarts.
+    """
+
+    def __init__(
+        self, cache_dir: Path, max_memory_entries: int = COVER_MEMORY_CACHE_SIZE
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self._memory: OrderedDict[str, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[Image.Image]:
+        """Returns the decoded cover for url, or None if it was never stored."""
+        with self._lock:
+            image = self._memory.get(url)
+            if image is not None:
+                self._memory.move_to_end(url)
+                self.memory_hits += 1
+                self._log_lookup("memory hit", url)
+                return image
+        image = self._read_from_disk(url)
+        with self._lock:
+            if image is not None:
+                self._store_in_memory(url, image)
+                self.disk_hits += 1
+                self._log_lookup("disk hit", url)
+            else:
+                self.misses += 1
+                self._log_lookup("miss", url)
+        return image
+
+    def put(self, url: str, data: bytes) -> Image.Image:
+        """Decodes the encoded cover in data, stores it and returns it."""
+        image = decode_cover(data)
+        with self._lock:
+            self._store_in_memory(url, image)
+        self._write_to_disk(url, image)
+        return image
+
+    def warm(self, url: str) -> bool:
+        """
+        Makes sure the cover for url is in the memory tier, loading it from
+        disk if needed, without counting a lookup. Returns False if neither
+        tier has it.
+        """
+        with self._lock:
+            if url in self._memory:
+                self._memory.move_to_end(url)
+                return True
+        image = self._read_from_disk(url)
+        if image is None:
+            return False
+        with self._lock:
+            self._store_in_memory(url, image)
+        return True
+
+    def _store_in_memory(self, url: str, image: Image.Image) -> None:
+        self._memory[url] = image
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_path(self, url: str) -> Path:
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{name}.rgb"
+
+    def _read_from_disk(self, url: str) -> Optional[Image.Image]:
+        path = self._get_path(url)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading album cover cache {path}: {e}")
+            return None
+        if len(data) != COVER_SIZE[0] * COVER_SIZE[1] * 3:
+            logger.warning(f"Discarding corrupt album cover cache {path}")
+            return None
+        return Image.frombytes("RGB", COVER_SIZE, data)
+
+    def _write_to_disk(self, url: str, image: Image.Image) -> None:
+        path = self._get_path(url)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(image.tobytes())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing album cover cache {path}: {e}")
+
+    def _log_lookup(self, result: str, url: str) -> None:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hit_rate = (self.memory_hits + self.disk_hits) / lookups
+        logger.info(
+            f"Album cover cache {result} for {url} "
+            f"(memory hits: {self.memory_hits}, disk hits: {self.disk_hits}, "
+            f"misses: {self.misses}, hit rate: {hit_rate:.0%})"
+        )
+
+
+def decode_cover(data: bytes) -> Image.Image:
+    opened_image = Image.open(BytesIO(data), formats=["JPEG"])
+    return opened_image.convert("RGB").resize(COVER_SIZE)
@@ -1,24 +1,62 @@
 import base64
+import config
+import dataclasses
 import json
+import threading
 import time
 import logging
 from typing import Optional, Dict, Any
 import requests
+from common import cache_dir
+from PIL import Image
+from .cover_cache import AlbumCoverCache
 from .types import AlbumCover, Song, SpotifyResponse
 
 logger = logging.getLogger("led-matrix-sign")
 
-SPOTIFY_REFRESH_TOKEN_URL = "https://accounts.spotify.com/api/token"
-SPOTIFY_CURRENTLY_PLAYING_URL = "https://api.spotify.com/v1/me/player/currently-playing"
+SPOTIFY_ACCOUNTS_URL = "https://accounts.spotify.com"
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+# Point these at a local stand-in for the Spotify API when testing
+if hasattr(config, "SPOTIFY_ACCOUNTS_URL"):
+    SPOTIFY_ACCOUNTS_URL = config.SPOTIFY_ACCOUNTS_URL
+if hasattr(config, "SPOTIFY_API_URL"):
+    SPOTIFY_API_URL = config.SPOTIFY_API_URL
 SPOTIFY_TOKEN_REFRESH_RATE = 30 * 60 * 1000  # 30 minutes in milliseconds
+SPOTIFY_POLL_INTERVAL = 5 * 1000  # while something is playing or paused
+SPOTIFY_IDLE_POLL_INTERVAL = 10 * 1000  # while nothing is playing
+SPOTIFY_MIN_POLL_INTERVAL = 1000
+SPOTIFY_TRACK_END_MARGIN = 500  # poll this long after a track should end
+SPOTIFY_DEFAULT_RETRY_AFTER = 5  # seconds, if a 429 has no Retry-After header
+SPOTIFY_PREFETCH_COUNT = 2  # number of upcoming tracks to prefetch covers for
+# a song polled by warm_up is kept while the music screen is off for this long
+SPOTIFY_WARM_MAX_AGE = 30 * 1000
 
 
 class Spotify:
-    def __init__(self, client_id: str, client_secret: str, refresh_token: str) -> None:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        refresh_token: str,
+        accounts_url: str = SPOTIFY_ACCOUNTS_URL,
+        api_url: str = SPOTIFY_API_URL,
+    ) -> None:
+        self.refresh_token_url = f"{accounts_url}/api/token"
+        self.currently_playing_url = f"{api_url}/me/player/currently-playing"
+        self.queue_url = f"{api_url}/me/player/queue"
         self.access_token = ""
         self.last_refresh_time = 0
         self.current_song: Optional[Song] = None
+        self.last_status = SpotifyResponse.EMPTY
+        self.next_poll_time = 0
+        self.rate_limited_until = 0
         self.session = requests.Session()
+        self.cover_cache = AlbumCoverCache(cache_dir / "album-covers")
+        self.prefetch_session = requests.Session()
+        self._prefetch_thread: Optional[threading.Thread] = None
+        # the music screen and warm_up poll from different threads
+        self._playback_lock = threading.Lock()
+        self.last_warm_up_time = 0
         self.secrets = {
             "client_id": client_id,
             "client_secret": client_secret,
@@ -57,7 +95,7 @@ class Spotify:
 
         try:
             response = self.session.post(
-                SPOTIFY_REFRESH_TOKEN_URL, headers=headers, data=data
+                self.refresh_token_url, headers=headers, data=data
             )
             response.raise_for_status()
             data = response.json()
@@ -67,12 +105,103 @@ class Spotify:
             logger.error(f"Error refreshing token: {e}")
             return SpotifyResponse.ERROR
 
+    def get_playback(self) -> tuple[SpotifyResponse, Optional[Song]]:
+        """
+        Returns the same values as get_currently_playing, but only calls the
+        API when the next poll is due. In between polls, the progress of the
+        current song is extrapolated from the last response.
+        """
+        now = int(time.time() * 1000)
+        is_rate_limited = now < self.rate_limited_until
+        is_poll_due = now >= self.next_poll_time or (
+            # the current song was cleared after a successful poll
+            self.current_song is None
+            and self.last_status not in [SpotifyResponse.EMPTY, SpotifyResponse.ERROR]
+        )
+        if is_rate_limited or not is_poll_due:
+            if self.current_song is not None:
+                return SpotifyResponse.OK, self.get_extrapolated_song(now)
+            if is_rate_limited:
+                return SpotifyResponse.RATE_LIMITED, None
+            return self.last_status, None
+
+        status, song = self.get_currently_playing()
+        if status == SpotifyResponse.RATE_LIMITED and self.current_song is not None:
+            status, song = SpotifyResponse.OK, self.get_extrapolated_song(now)
+        elif status == SpotifyResponse.OK and song is not None:
+            self.sync_current_song(song)
+        elif status == SpotifyResponse.OK_NEW_SONG:
+            self.prefetch_queue_covers()
+        self.last_status = status
+        self.next_poll_time = self.get_next_poll_time(now, song)
+        return status, song
+
+    def refresh_playback(self) -> tuple[SpotifyResponse, Optional[Song]]:
+        """
+        get_playback, plus the album cover of a new song, keeping the current
+        song up to date. Returns the status and the song to show.
+        """
+        with self._playback_lock:
+            self.check_refresh_token()
+            status, song = self.get_playback()
+            logger.info(status)
+            logger.info(song)
+            if status == SpotifyResponse.OK_NEW_SONG and song is not None:
+                img_status, img = self.get_album_cover(song)
+                if img_status == SpotifyResponse.OK:
+                    song.cover.image = img
+                    logger.info(
+                        f"Album cover fetched for {song.title} by {song.artist}"
+                    )
+                self.update_current_song(song)
+            elif status == SpotifyResponse.OK:
+                pass
+            elif status == SpotifyResponse.OK_SHOW_CACHED:
+                song = self.get_current_song()
+            else:
+                self.clear_current_song()
+            return status, song
+
+    def warm_up(self) -> None:
+        """Polls playback and fetches covers while the music screen is off."""
+        self.refresh_playback()
+        self.last_warm_up_time = int(time.time() * 1000)
+
+    def is_warm(self) -> bool:
+        """Whether warm_up kept the current song fresh recently."""
+        now = int(time.time() * 1000)
+        return now - self.last_warm_up_time < SPOTIFY_WARM_MAX_AGE
+
+    def get_next_poll_time(self, now: int, song: Optional[Song]) -> int:
+        if song is None:
+            return now + SPOTIFY_IDLE_POLL_INTERVAL
+        interval = SPOTIFY_POLL_INTERVAL
+        if song.is_playing:
+            # re-sync right after the track ends to pick up the next one
+            time_left = song.duration_ms - song.progress_ms
+            interval = min(interval, time_left + SPOTIFY_TRACK_END_MARGIN)
+        return now + max(interval, SPOTIFY_MIN_POLL_INTERVAL)
+
+    def get_extrapolated_song(self, now: int) -> Optional[Song]:
+        if self.current_song is None:
+            return None
+        song = self.current_song
+        progress_ms = song.progress_ms
+        if song.is_playing:
+            progress_ms += now - song.timestamp_ms
+        return dataclasses.replace(
+            song,
+            progress_ms=max(0, min(progress_ms, song.duration_ms)),
+            timestamp_ms=now,
+        )
+
     def get_currently_playing(self) -> tuple[SpotifyResponse, Optional[Song]]:
         result = Song()
         result.timestamp_ms = int(time.time() * 1000)
 
         status = self.fetch_currently_playing()
         if status == SpotifyResponse.EMPTY and self.current_song is not None:
+            self.current_song.is_playing = False
             return SpotifyResponse.OK_SHOW_CACHED, self.current_song
         if status != SpotifyResponse.OK:
             return status, None
@@ -85,6 +214,7 @@ class Spotify:
         result.artist = self.format_artists(data)
         result.duration_ms = data["item"]["duration_ms"]
         result.progress_ms = data["progress_ms"]
+        result.is_playing = data.get("is_playing", True)
         result.cover = self.format_album_cover(data)
         if self.is_current_song_new(result):
             return SpotifyResponse.OK_NEW_SONG, result
@@ -97,7 +227,10 @@ class Spotify:
         return artists[0]["name"]
 
     def format_album_cover(self, data: Dict[str, Any]) -> AlbumCover:
-        images = data["item"]["album"]["images"]
+        return self.format_track_album_cover(data["item"])
+
+    def format_track_album_cover(self, track: Dict[str, Any]) -> AlbumCover:
+        images = track.get("album", {}).get("images")
         if not images:
             return AlbumCover()
 
@@ -114,9 +247,12 @@ class Spotify:
         headers = {"Authorization": self.get_api_bearer_token()}
 
         try:
-            response = self.session.get(SPOTIFY_CURRENTLY_PLAYING_URL, headers=headers)
+            response = self.session.get(self.currently_playing_url, headers=headers)
             if response.status_code == 204:
                 return SpotifyResponse.EMPTY
+            if response.status_code == 429:
+                self.handle_rate_limit(response)
+                return SpotifyResponse.RATE_LIMITED
 
             response.raise_for_status()
             self.current_data = response.json()
@@ -125,14 +261,89 @@ class Spotify:
             logger.error(f"Error fetching currently playing: {e}")
             return SpotifyResponse.ERROR
 
+    def handle_rate_limit(self, response: requests.Response) -> None:
+        try:
+            retry_after = int(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            retry_after = SPOTIFY_DEFAULT_RETRY_AFTER
+        self.rate_limited_until = int(time.time() * 1000) + retry_after * 1000
+        logger.warning(f"Spotify rate limit reached, retrying in {retry_after}s")
+
+    def prefetch_queue_covers(self) -> None:
+        """
+        Downloads and decodes the covers of the next tracks in the player
+        queue in the background, or loads them from disk, so they are in
+        memory by the time the song changes.
+        """
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        self._prefetch_thread = threading.Thread(
+            target=self._prefetch_queue_covers_task,
+            name="music-prefetch",
+            daemon=True,
+        )
+        self._prefetch_thread.start()
+
+    def _prefetch_queue_covers_task(self) -> None:
+        status, tracks = self.fetch_queue()
+        if status != SpotifyResponse.OK:
+            return
+        for track in tracks[:SPOTIFY_PREFETCH_COUNT]:
+            cover = self.format_track_album_cover(track)
+            if not cover.url or self.cover_cache.warm(cover.url):
+                continue
+            img_status, data = self.fetch_album_cover(cover.url, self.prefetch_session)
+            if img_status != SpotifyResponse.OK or data is None:
+                continue
+            try:
+                self.cover_cache.put(cover.url, data)
+                logger.info(f"Album cover prefetched for {track.get('name')}")
+            except Exception as e:
+                logger.error(f"Error decoding album cover: {e}")
+
+    def fetch_queue(self) -> tuple[SpotifyResponse, list[Dict[str, Any]]]:
+        if time.time() * 1000 < self.rate_limited_until:
+            return SpotifyResponse.RATE_LIMITED, []
+        headers = {"Authorization": self.get_api_bearer_token()}
+        try:
+            response = self.prefetch_session.get(self.queue_url, headers=headers)
+            if response.status_code == 204:
+                return SpotifyResponse.EMPTY, []
+            if response.status_code == 429:
+                self.handle_rate_limit(response)
+                return SpotifyResponse.RATE_LIMITED, []
+            response.raise_for_status()
+            tracks = response.json().get("queue") or []
+            return SpotifyResponse.OK, [t for t in tracks if t is not None]
+        except Exception as e:
+            logger.error(f"Error fetching queue: {e}")
+            return SpotifyResponse.ERROR, []
+
     def get_album_cover(
         self, currently_playing: Song
-    ) -> tuple[SpotifyResponse, Optional[bytes]]:
-        return self.fetch_album_cover(currently_playing.cover.url)
+    ) -> tuple[SpotifyResponse, Optional[Image.Image]]:
+        url = currently_playing.cover.url
+        if not url:
+            return SpotifyResponse.EMPTY, None
+        image = self.cover_cache.get(url)
+        if image is not None:
+            return SpotifyResponse.OK, image
+        status, data = self.fetch_album_cover(url)
+        if status != SpotifyResponse.OK or data is None:
+            return status, None
+        try:
+            return SpotifyResponse.OK, self.cover_cache.put(url, data)
+        except Exception as e:
+            logger.error(f"Error decoding album cover: {e}")
+            return SpotifyResponse.ERROR, None
 
-    def fetch_album_cover(self, url: str) -> tuple[SpotifyResponse, Optional[bytes]]:
+    def fetch_album_cover(
+        self, url: str, session: Optional[requests.Session] = None
+    ) -> tuple[SpotifyResponse, Optional[bytes]]:
+        if session is None:
+            session = self.session
         try:
-            response = self.session.get(url)
+            response = session.get(url)
             response.raise_for_status()
             return SpotifyResponse.OK, response.content
         except Exception as e:
@@ -147,7 +358,15 @@ class Spotify:
 
     def update_current_song(self, src: Song) -> None:
         self.current_song = src
-        self.current_song.progress_ms = 0
+
+    def sync_current_song(self, src: Song) -> None:
+        """Updates the playback position of the current song from src."""
+        if self.current_song is None:
+            return
+        self.current_song.progress_ms = src.progress_ms
+        self.current_song.duration_ms = src.duration_ms
+        self.current_song.timestamp_ms = src.timestamp_ms
+        self.current_song.is_playing = src.is_playing
 
     def clear_current_song(self) -> None:
         self.current_song = None
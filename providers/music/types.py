@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
+from PIL import Image
 
 
 class SpotifyResponse(Enum):
@@ -9,6 +10,7 @@ class SpotifyResponse(Enum):
     EMPTY = "empty"
     OK_SHOW_CACHED = "ok_show_cached"
     OK_NEW_SONG = "ok_new_song"
+    RATE_LIMITED = "rate_limited"
 
 
 @dataclass
@@ -16,7 +18,7 @@ class AlbumCover:
     url: str = ""
     width: int = 0
     height: int = 0
-    data: Optional[bytes] = None
+    image: Optional[Image.Image] = None
 
 
 @dataclass
@@ -26,4 +28,5 @@ class Song:
     duration_ms: int = 0
     progress_ms: int = 0
     timestamp_ms: int = 0
+    is_playing: bool = True
     cover: AlbumCover = field(default_factory=AlbumCover)
@@ -0,0 +1,90 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+from common import SignMode, get_next_mode
+from common.broadcaster import StatusBroadcaster
+
+logger = logging.getLogger("led-matrix-sign")
+
+WARMUP_TICK = 1.0  # seconds
+
+
+@dataclass
+class WarmupTarget:
+    warm_up: Callable[[], None]
+    # how often to refresh while the mode is up next, in seconds
+    interval: float
+    # network requests one warm-up makes, charged against the budget
+    cost: int = 1
+    last_run: float = 0.0
+
+
+class TokenBucket:
+    """Allows `rate` tokens per second on average and `burst` at once."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, tokens: float) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class WarmupScheduler:
+    """
+    Keeps the data of the mode after the current one in the button cycle
+    fresh, so pressing the button can show cached content right away while
+    the provider refreshes it. Providers register a warm-up hook that fetches
+    and caches their data without rendering anything. Only the next mode is
+    warmed, and all warm-ups share a budget of requests_per_minute.
+    """
+
+    def __init__(
+        self,
+        mode_broadcaster: StatusBroadcaster,
+        requests_per_minute: float,
+        burst: int = 4,
+    ) -> None:
+        self.mode_broadcaster = mode_broadcaster
+        self.budget = TokenBucket(requests_per_minute / 60, burst)
+        self.targets: dict[SignMode, WarmupTarget] = {}
+
+    def register(
+        self,
+        mode: SignMode,
+        warm_up: Callable[[], None],
+        interval: float,
+        cost: int = 1,
+    ) -> None:
+        self.targets[mode] = WarmupTarget(warm_up, interval, cost)
+        # a warm-up costing more than the burst could never run
+        self.budget.burst = max(self.budget.burst, cost)
+
+    def run(self) -> None:
+        while True:
+            self.mode_broadcaster.wait_for_status_change(WARMUP_TICK)
+            current_mode = self.mode_broadcaster.get_status()
+            if current_mode is None:
+                continue
+            next_mode = get_next_mode(current_mode)
+            target = self.targets.get(next_mode)
+            if target is None or next_mode == current_mode:
+                continue
+            if time.monotonic() - target.last_run < target.interval:
+                continue
+            if not self.budget.take(target.cost):
+                continue
+            target.last_run = time.monotonic()
+            try:
+                target.warm_up()
+            except Exception as e:
+                logger.error(f"Error warming up {next_mode}: {e}")
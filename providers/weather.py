@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import threading
+import time
+import requests
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger("led-matrix-sign")
+
+IPDATA_URL = "https://api.ipdata.co"
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+REQUEST_TIMEOUT = 10  # seconds
+# open-meteo publishes a new "current" value every interval seconds; give
+# it a moment after the interval ends before asking again
+REFRESH_MARGIN = 60  # seconds
+DEFAULT_REFRESH_INTERVAL = 900  # seconds
+RETRY_INTERVAL = 60  # seconds
+# New York City
+DEFAULT_LOCATION = (40.71427, -74.00597, "America/New_York")
+
+Location = tuple[float, float, str]
+
+
+class WeatherClient:
+    """
+    Keeps the location and the forecast in memory and on disk, and refreshes
+    them on a background thread. get_weather() never blocks: it returns the
+    cached forecast, which may be from a previous run, and starts a refresh
+    once open-meteo has published a new value. The location is looked up
+    once and then reused across restarts.
+    """
+
+    def __init__(self, ipdata_api_key: str, cache_dir: Path) -> None:
+        self.ipdata_api_key = ipdata_api_key
+        self.location_path = cache_dir / "weather-location.json"
+        self.forecast_path = cache_dir / "weather-forecast.json"
+        self.location: Optional[Location] = None
+        self.forecast: Optional[dict[str, Any]] = None
+        self.next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        cached_location = self._read_json(self.location_path)
+        if cached_location is not None:
+            self.location = tuple(cached_location)  # type: ignore[assignment]
+        self.forecast = self._read_json(self.forecast_path)
+        if self.forecast is not None:
+            self.next_refresh = self._get_next_refresh(self.forecast)
+
+    def get_weather(self) -> Optional[dict[str, Any]]:
+        """Returns the latest forecast, refreshing it in the background."""
+        with self._lock:
+            if time.time() >= self.next_refresh and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(
+                    target=self._refresh, name="weather-refresh", daemon=True
+                ).start()
+            return self.forecast
+
+    def _refresh(self) -> None:
+        try:
+            if self.location is None:
+                self.location = self._fetch_location()
+            forecast = self._fetch_forecast(self.location or DEFAULT_LOCATION)
+            with self._lock:
+                if forecast is not None:
+                    self.forecast = forecast
+                    self.next_refresh = self._get_next_refresh(forecast)
+                else:
+                    self.next_refresh = time.time() + RETRY_INTERVAL
+            if forecast is not None:
+                self._write_json(self.forecast_path, forecast)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _get_next_refresh(self, forecast: dict[str, Any]) -> float:
+        """When the value after the forecast's current one is published."""
+        try:
+            current = forecast["current"]
+            interval = current.get("interval", DEFAULT_REFRESH_INTERVAL)
+            # "time" is local to the forecast's timezone, at the start of the
+            # interval the current value covers
+            start = datetime.fromisoformat(current["time"]).replace(tzinfo=None)
+            start_epoch = (start - datetime(1970, 1, 1)).total_seconds()
+            start_epoch -= forecast.get("utc_offset_seconds", 0)
+            return start_epoch + interval + REFRESH_MARGIN
+        except (KeyError, TypeError, ValueError):
+            return time.time() + DEFAULT_REFRESH_INTERVAL
+
+    def _fetch_location(self) -> Optional[Location]:
+        try:
+            response = requests.get(
+                IPDATA_URL,
+                params={"api-key": self.ipdata_api_key},
+                timeout=REQUEST_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+            lat, lon = data["latitude"], data["longitude"]
+            tz = data["time_zone"]["name"]
+            description = (
+                data["city"] + ", " + data["region"] + ", " + data["country_name"]
+            )
+            logger.info(f"Weather location: ({lat}, {lon}) {description}")
+            logger.info(f"Weather timezone: {tz}")
+        except Exception as err:
+            logger.error(f"Error fetching location data: {err}")
+            logger.warning("No location found, using default location (New York City)")
+            return None
+        self._write_json(self.location_path, [lat, lon, tz])
+        return (lat, lon, tz)
+
+    def _fetch_forecast(self, location: Location) -> Optional[dict[str, Any]]:
+        lat, lon, tz = location
+        params: dict[str, str | float] = {
+            "latitude": lat,
+            "longitude": lon,
+            "daily": "temperature_2m_max,temperature_2m_min",
+            "hourly": "weather_code",
+            "temporal_resolution": "hourly_3",
+            "current": "temperature_2m,weather_code",
+            "timezone": tz,
+            "forecast_days": "1",
+        }
+        try:
+            response = requests.get(
+                OPEN_METEO_URL, params=params, timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as err:
+            logger.error(f"Error fetching weather data: {err}")
+            return None
+
+    def _read_json(self, path: Path) -> Optional[Any]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding weather cache {path}: {e}")
+            return None
+
+    def _write_json(self, path: Path, data: Any) -> None:
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing weather cache {path}: {e}")
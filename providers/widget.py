@@ -1,29 +1,41 @@
+import bisect
 from abc import ABC, abstractmethod
+from functools import lru_cache
 import threading
 import time
 import queue
 from typing import Any, Optional, Dict
 from datetime import datetime
-from common import Fonts, Colors, Images
+from common import Fonts, Colors, Images, cache_dir
 from PIL import Image, ImageDraw
-import requests
-from pprint import pprint
+from common.timer_wheel import Timer, TimerWheel
 from display import get_image_with_color
 from display.types import RenderMessage, Rect
+from providers.weather import WeatherClient
 import numpy as np
 import logging
 
 logger = logging.getLogger("led-matrix-sign")
 
+WIDGET_TICK = 0.05  # seconds
+
 
 class Widget(ABC):
+    """
+    A region of the widget screen. Widgets have no thread of their own: the
+    WidgetManager's timer wheel calls update() every refresh_rate seconds,
+    and update() calls invalidate() whenever it redraws the image. Widgets
+    are only touched from the manager's thread.
+    """
+
     def __init__(self, bbox: Rect, refresh_rate: float = 1.0) -> None:
         self.bbox = bbox
         self.refresh_rate = refresh_rate
         self.active = False
-        self._thread: Optional[threading.Thread] = None
+        # bumped every time the image changes, so unchanged frames are skipped
+        self.version = 0
+        self._timer: Optional[Timer] = None
         self._image = Image.new("RGB", (bbox.w, bbox.h))
-        self._image_lock = threading.Lock()  # Add lock for image access
         self._draw = ImageDraw.Draw(self._image)
         self._draw.fontmode = "1"  # turn off antialiasing
 
@@ -32,147 +44,138 @@ class Widget(ABC):
         """Update widget content. Must be implemented by subclasses."""
         pass
 
-    def start(self) -> None:
-        """Start the widget's update thread."""
-        if not self._thread:
+    def invalidate(self) -> None:
+        """Marks the image as changed since the last frame."""
+        self.version += 1
+
+    def get_next_delay(self) -> float:
+        """Seconds until the next update."""
+        return self.refresh_rate
+
+    def start(self, timer_wheel: TimerWheel) -> None:
+        """Start updating the widget on the given timer wheel."""
+        if not self.active:
             self.active = True
-            self._thread = threading.Thread(target=self._run, daemon=True)
-            self._thread.start()
+            self._timer = timer_wheel.schedule(0, lambda: self._tick(timer_wheel))
 
     def stop(self) -> None:
-        """Stop the widget's update thread."""
+        """Stop updating the widget."""
         self.active = False
-        self._thread = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
 
-    def _run(self) -> None:
-        """Main widget loop."""
-        while self.active:
-            try:
-                self.update()
-            except Exception as e:
-                logger.error(f"Error in widget {self.__class__.__name__}: {e}")
-            time.sleep(self.refresh_rate)
+    def _tick(self, timer_wheel: TimerWheel) -> None:
+        if not self.active:
+            return
+        try:
+            self.update()
+        except Exception as e:
+            logger.error(f"Error in widget {self.__class__.__name__}: {e}")
+        self._timer = timer_wheel.schedule(
+            self.get_next_delay(), lambda: self._tick(timer_wheel)
+        )
 
     def get_render_data(self) -> RenderMessage.Frame:
         """Get the widget's current render data."""
-        with self._image_lock:
-            return RenderMessage.Frame(bbox=self.bbox, frame=self._image.copy())
+        return RenderMessage.Frame(bbox=self.bbox, frame=self._image.copy())
 
 
 class ClockWidget(Widget):
     def __init__(self, bbox: Rect) -> None:
-        super().__init__(bbox, refresh_rate=0.1)
+        super().__init__(bbox, refresh_rate=0.5)
+        self.time_str = ""
+
+    def get_next_delay(self) -> float:
+        # wake up right after the next half second, when the text changes
+        return self.refresh_rate - (time.time() % self.refresh_rate)
 
     def update(self) -> None:
-        with self._image_lock:
-            self._image.paste((0, 0, 0), (0, 0, self.bbox.w, self.bbox.h))
-            now = datetime.now()
-            if now.microsecond < 500000:
-                time_str = now.strftime("%H:%M:%S")
-            else:
-                time_str = now.strftime("%H %M %S")
-            self._draw.text((0, 0), time_str, font=Fonts.MBTA, fill=Colors.WHITE)
+        now = datetime.now()
+        if now.microsecond < 500000:
+            time_str = now.strftime("%H:%M:%S")
+        else:
+            time_str = now.strftime("%H %M %S")
+        if time_str == self.time_str:
+            return
+        self.time_str = time_str
+        self._image.paste((0, 0, 0), (0, 0, self.bbox.w, self.bbox.h))
+        self._draw.text((0, 0), time_str, font=Fonts.MBTA, fill=Colors.WHITE)
+        self.invalidate()
+
+
+TEMP_COLOR_MAP: Dict[int, tuple[int, int, int]] = {
+    -20: (0, 60, 98),  # dark blue
+    -10: (120, 162, 204),  # darker blue
+    0: (164, 195, 210),  # light blue
+    10: (121, 210, 179),  # turquoise
+    20: (252, 245, 112),  # yellow
+    30: (255, 150, 79),  # orange
+    40: (255, 192, 159),  # red
+}
+
+
+def _get_temp_color_lut() -> list[tuple[int, int, int]]:
+    """Interpolated colors for every whole degree of TEMP_COLOR_MAP."""
+    temps = sorted(TEMP_COLOR_MAP.keys())
+    lut = []
+    for temp in range(temps[0], temps[-1] + 1):
+        i = min(bisect.bisect_right(temps, temp), len(temps) - 1)
+        t1, t2 = temps[i - 1], temps[i]
+        c1, c2 = TEMP_COLOR_MAP[t1], TEMP_COLOR_MAP[t2]
+        fraction = (temp - t1) / (t2 - t1)
+        lut.append(
+            (
+                int(c1[0] + fraction * (c2[0] - c1[0])),
+                int(c1[1] + fraction * (c2[1] - c1[1])),
+                int(c1[2] + fraction * (c2[2] - c1[2])),
+            )
+        )
+    return lut
+
+
+TEMP_COLOR_LUT = _get_temp_color_lut()
+TEMP_COLOR_LUT_MIN = min(TEMP_COLOR_MAP.keys())
+
+
+@lru_cache(maxsize=64)
+def get_tinted_image(name: str, color: tuple[int, int, int]) -> Image.Image:
+    """One of the Images, recolored once per color."""
+    return get_image_with_color(getattr(Images, name), color)
 
 
 class WeatherWidget(Widget):
     def __init__(self, bbox: Rect, ipdata_api_key: str) -> None:
-        super().__init__(bbox, refresh_rate=30)
-        self.ipdata_api_key = ipdata_api_key
-        self.location: Optional[tuple[float, float, str]] = self.get_location()
-        self.temp_color_map: Dict[int, tuple[int, int, int]] = {
-            -20: (0, 60, 98),  # dark blue
-            -10: (120, 162, 204),  # darker blue
-            0: (164, 195, 210),  # light blue
-            10: (121, 210, 179),  # turquoise
-            20: (252, 245, 112),  # yellow
-            30: (255, 150, 79),  # orange
-            40: (255, 192, 159),  # red
-        }
-
-    def get_location(self) -> Optional[tuple[float, float, str]]:
-        try:
-            response = requests.get(
-                "https://api.ipdata.co", params={"api-key": self.ipdata_api_key}
-            )
-            response.raise_for_status()
-            lat, lon = response.json()["latitude"], response.json()["longitude"]
-            tz = response.json()["time_zone"]["name"]
-            description = (
-                response.json()["city"]
-                + ", "
-                + response.json()["region"]
-                + ", "
-                + response.json()["country_name"]
-            )
-            logger.info(f"Weather location: ({lat}, {lon}) {description}")
-            logger.info(f"Weather timezone: {tz}")
-            return (lat, lon, tz)
-        except Exception as err:
-            logger.error(f"Error fetching location data: {err}")
-            return None
-
-    def get_weather(self) -> Optional[Dict[str, Any]]:
-        if self.location is not None:
-            lat, lon, tz = self.location
-        else:
-            # New York City
-            lat, lon, tz = 40.71427, -74.00597, "America/New_York"
-            logger.warning("No location found, using default location (New York City)")
-        params: Dict[str, str | float] = {
-            "latitude": lat,
-            "longitude": lon,
-            "daily": "temperature_2m_max,temperature_2m_min",
-            "hourly": "weather_code",
-            "temporal_resolution": "hourly_3",
-            "current": "temperature_2m,weather_code",
-            "timezone": tz,
-            "forecast_days": "1",
-        }
-        try:
-            response = requests.get(
-                "https://api.open-meteo.com/v1/forecast", params=params
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as err:
-            logger.error(f"Error fetching weather data: {err}")
-            return None
+        # fetching happens in the background, so checking often is cheap
+        super().__init__(bbox, refresh_rate=5)
+        self.weather_client = WeatherClient(ipdata_api_key, cache_dir)
+        self.temps: Optional[tuple[int, int, int]] = None
 
     def get_temp_color(self, temp: float) -> tuple[int, int, int]:
         """Get interpolated color for a given temperature."""
-        temps = sorted(self.temp_color_map.keys())
-        if temp <= temps[0]:
-            return self.temp_color_map[temps[0]]
-        if temp >= temps[-1]:
-            return self.temp_color_map[temps[-1]]
-        for i in range(len(temps) - 1):
-            t1, t2 = temps[i], temps[i + 1]
-            if t1 <= temp <= t2:
-                c1 = self.temp_color_map[t1]
-                c2 = self.temp_color_map[t2]
-                fraction = (temp - t1) / (t2 - t1)
-                r = int(c1[0] + fraction * (c2[0] - c1[0]))
-                g = int(c1[1] + fraction * (c2[1] - c1[1]))
-                b = int(c1[2] + fraction * (c2[2] - c1[2]))
-                return (r, g, b)
-        return Colors.WHITE
+        index = int(temp) - TEMP_COLOR_LUT_MIN
+        return TEMP_COLOR_LUT[max(0, min(index, len(TEMP_COLOR_LUT) - 1))]
 
     def update(self) -> None:
-        weather = self.get_weather()
+        weather = self.weather_client.get_weather()
         if weather is None:
             return
         current_temp = int(round(weather["current"]["temperature_2m"]))
         min_temp = int(round(weather["daily"]["temperature_2m_min"][0]))
         max_temp = int(round(weather["daily"]["temperature_2m_max"][0]))
+        temps = (current_temp, min_temp, max_temp)
+        if temps == self.temps:
+            return
+        self.temps = temps
         right_anchor = int(self._draw.textlength("H-00", font=Fonts.LCD))
         self._image.paste((0, 0, 0), (0, 0, self.bbox.w, self.bbox.h))
         current_color = self.get_temp_color(current_temp)
         max_color = self.get_temp_color(max_temp)
         min_color = self.get_temp_color(min_temp)
-        arrow_up = get_image_with_color(Images.ARROW_UP, max_color)
-        arrow_down = get_image_with_color(Images.ARROW_DOWN, min_color)
-        deg_symbol_max = get_image_with_color(Images.DEG_SYMBOL, max_color)
-        deg_symbol_min = get_image_with_color(Images.DEG_SYMBOL, min_color)
+        arrow_up = get_tinted_image("ARROW_UP", max_color)
+        arrow_down = get_tinted_image("ARROW_DOWN", min_color)
+        deg_symbol_max = get_tinted_image("DEG_SYMBOL", max_color)
+        deg_symbol_min = get_tinted_image("DEG_SYMBOL", min_color)
         self._draw.text(
             (right_anchor, 0),
             f"{current_temp}",
@@ -198,18 +201,30 @@ class WeatherWidget(Widget):
             anchor="rt",
         )
         self._image.paste(deg_symbol_min, (right_anchor, 16 + 8))
+        self.invalidate()
 
 
 class WidgetManager:
+    """
+    Drives all widgets from one thread and one timer wheel. After every tick
+    it forwards the frames of the widgets whose version changed since they
+    were last sent, followed by a single swap, and sends nothing otherwise.
+    """
+
     def __init__(self, render_queue: queue.Queue) -> None:
         self.render_queue = render_queue
         self.widgets: list[Widget] = []
         self.active = False
+        self.timer_wheel = TimerWheel(tick=WIDGET_TICK)
+        self._sent_versions: dict[int, int] = {}
         self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
     def add_widget(self, widget: Widget) -> None:
         """Add a widget to the display."""
         self.widgets.append(widget)
+        if self.active:
+            widget.start(self.timer_wheel)
 
     def remove_widget(self, widget: Widget) -> None:
         """Remove a widget from the display."""
@@ -221,22 +236,36 @@ class WidgetManager:
         """Start all widgets and the manager."""
         if not self._thread:
             self.active = True
+            # the screen was cleared, so every widget has to be sent again
+            self._sent_versions.clear()
+            self._stop_event.clear()
             for widget in self.widgets:
-                widget.start()
-            self._thread = threading.Thread(target=self._run, daemon=True)
+                widget.start(self.timer_wheel)
+            self._thread = threading.Thread(
+                target=self._run, name="widgets", daemon=True
+            )
             self._thread.start()
 
     def stop(self) -> None:
-        """Stop all widgets and the manager."""
+        """Stop all widgets and the manager, and wait for its thread."""
         self.active = False
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
         self._thread = None
         for widget in self.widgets:
             widget.stop()
 
     def _run(self) -> None:
-        """Main loop to collect and send all widget renders."""
+        """Main loop to run the widget timers and send changed renders."""
         while self.active:
+            self.timer_wheel.advance()
+            sent = False
             for widget in self.widgets:
-                self.render_queue.put(widget.get_render_data())
-            self.render_queue.put(RenderMessage.Swap())
-            time.sleep(0.1)  # Throttle updates
+                if self._sent_versions.get(id(widget)) != widget.version:
+                    self._sent_versions[id(widget)] = widget.version
+                    self.render_queue.put(widget.get_render_data())
+                    sent = True
+            if sent:
+                self.render_queue.put(RenderMessage.Swap())
+            self._stop_event.wait(max(self.timer_wheel.get_time_to_next_tick(), 0))
@@ -0,0 +1,137 @@
+"""
+Replays a trace recorded with `main.py --trace` against a headless display,
+as fast as possible or at a multiple of real time, and reports throughput
+and the cost of every kind of render message.
+
+    python3 replay.py sign.trace
+    python3 replay.py sign.trace --speed 1
+    python3 replay.py sign.trace --speed 10 --repeat 3
+"""
+
+import argparse
+import queue
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+from display import Display
+from display.trace import TraceReader
+from display.types import BaseRenderMessage, RenderMessage
+
+# render workers are done once they queue nothing for this long
+DRAIN_QUIET_PERIOD = 0.5  # seconds
+
+
+def drain(
+    display: Display,
+    internal_queue: queue.Queue[BaseRenderMessage],
+    costs: dict[str, list[float]],
+    quiet_period: float = 0.0,
+) -> None:
+    """
+    Applies the results of render workers queued by the display itself,
+    until nothing arrives for quiet_period seconds. Anything else it queued,
+    animation frames, is dropped: those frames were recorded as they
+    happened and are in the trace already.
+    """
+    while True:
+        try:
+            message = internal_queue.get(timeout=quiet_period)
+        except queue.Empty:
+            return
+        if isinstance(message, RenderMessage.JobResult):
+            render_timed(display, message, costs)
+
+
+def render_timed(
+    display: Display, message: BaseRenderMessage, costs: dict[str, list[float]]
+) -> float:
+    """Renders message, adds its cost to costs and returns when it was done."""
+    start = time.perf_counter()
+    display.render(message)
+    end = time.perf_counter()
+    costs[type(message).__name__].append(end - start)
+    return end
+
+
+def replay(args: argparse.Namespace) -> None:
+    trace = TraceReader(args.trace)
+    internal_queue: queue.Queue[BaseRenderMessage] = queue.Queue()
+    display = Display(internal_queue, headless=True, geometry=trace.header.geometry)
+    # animations were recorded frame by frame, running them again would
+    # draw every frame twice
+    display.animation_manager.stop()
+    events = list(trace)
+    trace.close()
+    renders = sum(1 for event in events if event.kind == "render")
+    commands = len(events) - renders
+    duration = events[-1].time if events else 0.0
+    print(
+        f"{args.trace}: {renders} render messages and {commands} commands "
+        f"over {duration:.1f} s on a "
+        f"{display.SCREEN_WIDTH}x{display.SCREEN_HEIGHT} display"
+    )
+
+    costs: dict[str, list[float]] = defaultdict(list)
+    lateness: list[float] = []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        pass_start = time.perf_counter()
+        for event in events:
+            if args.speed > 0:
+                due = pass_start + event.time / args.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                lateness.append(max(0.0, time.perf_counter() - due))
+            drain(display, internal_queue, costs)
+            # commands only explain the render messages that follow them,
+            # which are what the display actually saw
+            if event.kind == "render":
+                render_timed(display, event.payload, costs)
+        drain(display, internal_queue, costs, DRAIN_QUIET_PERIOD)
+    # the quiet period at the end is waiting, not replaying
+    elapsed = time.perf_counter() - start - DRAIN_QUIET_PERIOD * args.repeat
+
+    rendered = sum(len(samples) for samples in costs.values())
+    print(
+        f"replayed {args.repeat}x in {elapsed:.2f} s, "
+        f"{(duration * args.repeat) / elapsed:.1f}x real time, "
+        f"{rendered / elapsed:.0f} messages/s, "
+        f"{display.matrix.swap_count} swaps"
+    )
+    if lateness:
+        lateness_ms = sorted(late * 1e3 for late in lateness)
+        p95 = lateness_ms[max(0, int(len(lateness_ms) * 0.95) - 1)]
+        print(
+            f"lateness  mean {statistics.mean(lateness_ms):.2f} ms   "
+            f"p95 {p95:.2f} ms   max {lateness_ms[-1]:.2f} ms"
+        )
+    print(
+        f"{'message':<20} {'count':>7} {'mean us':>10} {'p95 us':>10} "
+        f"{'max us':>10} {'total ms':>10}"
+    )
+    for name, samples in sorted(costs.items(), key=lambda item: -sum(item[1])):
+        samples_us = sorted(s * 1e6 for s in samples)
+        p95 = samples_us[max(0, int(len(samples_us) * 0.95) - 1)]
+        print(
+            f"{name:<20} {len(samples_us):>7} {statistics.mean(samples_us):>10.1f} "
+            f"{p95:>10.1f} {samples_us[-1]:>10.1f} {sum(samples_us) / 1e3:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", type=Path)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="multiple of real time to replay at, 0 for as fast as possible",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    replay(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
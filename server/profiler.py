@@ -0,0 +1,219 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import CodeType, FrameType
+from typing import Any, Optional
+
+# a profile samples for at most this long, however long was asked for
+PROFILE_MAX_SECONDS = 30.0
+# at 100 samples per second a busy render loop slows down by about 3%
+PROFILE_DEFAULT_INTERVAL = 0.01  # seconds
+PROFILE_MIN_INTERVAL = 0.002  # seconds
+PROFILE_MAX_INTERVAL = 1.0  # seconds
+# deeper stacks are cut off at the root end
+PROFILE_MAX_DEPTH = 64
+# threads started without a name are called "Thread-12 (target)"
+_UNNAMED_THREAD = re.compile(r"^Thread-\d+ \((.+)\)$")
+
+
+def get_thread_cpu_time(native_id: Optional[int]) -> Optional[float]:
+    """
+    CPU seconds the thread with this native id has used, like
+    time.thread_time() but for any thread of this process. None when the
+    thread is gone or the platform cannot tell.
+    """
+    if native_id is None or sys.platform != "linux":
+        return None
+    # the kernel's per-thread CPU clock, see MAKE_THREAD_CPUCLOCK in
+    # linux/posix-timers.h. Unlike time.pthread_getcpuclockid() this never
+    # touches the pthread of a thread that may have exited already; a stale
+    # id simply fails.
+    clock_id = ((~native_id) << 3) | 6
+    try:
+        return time.clock_gettime(clock_id)
+    except OSError:
+        return None
+
+
+def get_thread_label(thread: Optional[threading.Thread], ident: int) -> str:
+    if thread is None:
+        return f"thread-{ident}"
+    match = _UNNAMED_THREAD.match(thread.name)
+    # the web server's request threads all get one label, not one each
+    return match.group(1) if match else thread.name
+
+
+@dataclass
+class ThreadProfile:
+    name: str
+    # CPU seconds used during the profile and since the thread started
+    cpu_seconds: Optional[float] = None
+    total_cpu_seconds: Optional[float] = None
+    samples: int = 0
+
+
+@dataclass
+class Profile:
+    duration: float
+    interval: float
+    samples: int
+    # "cpu" weighs stacks by microseconds of CPU, "wall" counts samples
+    mode: str
+    threads: list[ThreadProfile] = field(default_factory=list)
+    # root-first frames joined by ";", see to_collapsed()
+    stacks: Counter[str] = field(default_factory=Counter)
+
+    def to_collapsed(self) -> str:
+        """The stacks in the collapsed format of flamegraph.pl and speedscope."""
+        return "".join(
+            f"{stack} {weight}\n"
+            for stack, weight in self.stacks.most_common()
+            if weight > 0
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "duration": self.duration,
+            "interval": self.interval,
+            "samples": self.samples,
+            "mode": self.mode,
+            "threads": [
+                {
+                    "name": thread.name,
+                    "cpu_seconds": thread.cpu_seconds,
+                    "total_cpu_seconds": thread.total_cpu_seconds,
+                    "samples": thread.samples,
+                }
+                for thread in self.threads
+            ],
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+class SamplingProfiler:
+    """
+    Profiles every thread of the running sign without stopping it. The
+    thread asking for a profile samples sys._current_frames() at a fixed
+    interval and counts the Python stacks it sees; nothing is hooked into
+    the other threads, so they run at full speed between samples. Only one
+    profile runs at a time and none runs longer than PROFILE_MAX_SECONDS.
+
+    Where the kernel exposes per-thread CPU clocks, each sample is weighed
+    by the CPU time its thread used since the previous sample, so a thread
+    blocked in a queue or in sleep() adds nothing and the flamegraph shows
+    where CPU actually went.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._labels: dict[CodeType, str] = {}
+
+    def profile(
+        self,
+        seconds: float,
+        interval: float = PROFILE_DEFAULT_INTERVAL,
+        mode: str = "cpu",
+    ) -> Optional[Profile]:
+        """Samples for seconds, or returns None if a profile is running."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._sample(
+                max(0.0, min(seconds, PROFILE_MAX_SECONDS)),
+                max(PROFILE_MIN_INTERVAL, min(interval, PROFILE_MAX_INTERVAL)),
+                mode,
+            )
+        finally:
+            self._lock.release()
+
+    def get_threads(self) -> list[ThreadProfile]:
+        """Every live thread with the CPU time it used since it started."""
+        return [
+            ThreadProfile(
+                get_thread_label(thread, thread.ident or 0),
+                total_cpu_seconds=get_thread_cpu_time(thread.native_id),
+            )
+            for thread in threading.enumerate()
+        ]
+
+    def _sample(self, seconds: float, interval: float, mode: str) -> Profile:
+        own_ident = threading.get_ident()
+        threads: dict[int, ThreadProfile] = {}
+        started_cpu: dict[int, Optional[float]] = {}
+        last_cpu: dict[int, Optional[float]] = {}
+        profile = Profile(0.0, interval, 0, mode)
+        if mode == "cpu" and get_thread_cpu_time(threading.get_native_id()) is None:
+            profile.mode = "wall"
+        start = time.monotonic()
+        next_sample = start
+        while True:
+            now = time.monotonic()
+            if now - start >= seconds:
+                break
+            if now < next_sample:
+                # the last sleep ends when the profile does
+                time.sleep(min(next_sample, start + seconds) - now)
+                if time.monotonic() - start >= seconds:
+                    break
+            # a late sample is taken once, not once for every interval missed
+            next_sample = max(next_sample + interval, time.monotonic())
+            by_ident = {thread.ident: thread for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            profile.samples += 1
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                thread = by_ident.get(ident)
+                native_id = thread.native_id if thread is not None else None
+                cpu = get_thread_cpu_time(native_id)
+                if ident not in threads:
+                    threads[ident] = ThreadProfile(get_thread_label(thread, ident))
+                    started_cpu[ident] = cpu
+                    last_cpu[ident] = cpu
+                thread_profile = threads[ident]
+                thread_profile.samples += 1
+                thread_profile.total_cpu_seconds = cpu
+                if profile.mode == "cpu":
+                    previous = last_cpu[ident]
+                    last_cpu[ident] = cpu
+                    if cpu is None or previous is None:
+                        continue
+                    weight = round((cpu - previous) * 1e6)
+                    if weight <= 0:
+                        continue
+                else:
+                    weight = 1
+                stack = self._get_stack(thread_profile.name, frame)
+                profile.stacks[stack] += weight
+            del frames
+        profile.duration = time.monotonic() - start
+        for ident, thread_profile in threads.items():
+            first, last = started_cpu[ident], thread_profile.total_cpu_seconds
+            if first is not None and last is not None:
+                thread_profile.cpu_seconds = last - first
+        profile.threads = sorted(
+            threads.values(), key=lambda thread: -(thread.cpu_seconds or 0.0)
+        )
+        return profile
+
+    def _get_stack(self, thread_name: str, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+            labels.append(self._get_label(frame.f_code))
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ";".join(reversed(labels))
+
+    def _get_label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)})"
+            # ";" separates frames in the collapsed format
+            label = label.replace(";", ":")
+            self._labels[code] = label
+        return label
@@ -1,33 +1,125 @@
-from queue import Queue
-from typing import Any
-from flask import Flask, render_template, request
-from common import SignMode, UIMessageType
+import gzip
+import hashlib
+import json
+import math
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from concurrent.futures import TimeoutError
+from typing import Any, Optional
+from flask import Flask, Response, render_template, request
+from common import SignMode
 from common.broadcaster import StatusBroadcaster
+from common.commands import BaseUICommand, CommandBus, UICommand
+from display import Display
+from display.preview import PREVIEW_MAX_FPS, stream_tiles
+from providers.game_of_life_pipeline import GameOfLifePipeline
+from .profiler import (
+    PROFILE_DEFAULT_INTERVAL,
+    PROFILE_MAX_INTERVAL,
+    SamplingProfiler,
+)
+from .status import StatusFeed
 import config
 import providers.mta as mta
 import providers.mbta as mbta
 
+# longest a request may wait for its command to be applied, see ?wait=
+COMMAND_MAX_WAIT = 10  # seconds
+
+
+@dataclass
+class StaticResponse:
+    """A response body that never changes, compressed once up front."""
+
+    body: bytes
+    gzipped: bytes
+    etag: str
+    mimetype: str
+
+    @classmethod
+    def from_json(cls, data: Any) -> "StaticResponse":
+        body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return cls(
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9),
+            etag=hashlib.sha1(body).hexdigest(),
+            mimetype="application/json",
+        )
+
+
+def get_station_list(stations_by_route: dict[str, list[Any]]) -> StaticResponse:
+    """The station selector's data: station ids and names by sorted route."""
+    return StaticResponse.from_json(
+        {
+            route: [
+                {"stop_id": station.stop_id, "stop_name": station.stop_name}
+                for station in stations_by_route[route]
+            ]
+            for route in sorted(stations_by_route)
+        }
+    )
+
 
 class Server:
     def __init__(
         self,
-        ui_queue: Queue,
+        command_bus: CommandBus,
         mode_broadcaster: StatusBroadcaster,
         station_broadcaster: StatusBroadcaster,
         mta_station_broadcaster: StatusBroadcaster,
+        display: Optional[Display] = None,
+        mbta_prediction_broadcaster: Optional[StatusBroadcaster] = None,
+        mta_prediction_broadcaster: Optional[StatusBroadcaster] = None,
+        game_of_life_pipeline: Optional[GameOfLifePipeline] = None,
     ):
         self.app = Flask(__name__)
-        self.ui_queue = ui_queue
+        self.command_bus = command_bus
         self.mode_broadcaster = mode_broadcaster
         self.station_broadcaster = station_broadcaster
         self.mta_station_broadcaster = mta_station_broadcaster
+        self.display = display
+        self.game_of_life_pipeline = game_of_life_pipeline
+        self.mbta_prediction_broadcaster = (
+            mbta_prediction_broadcaster or StatusBroadcaster()
+        )
+        self.mta_prediction_broadcaster = (
+            mta_prediction_broadcaster or StatusBroadcaster()
+        )
+        self.status_feed = StatusFeed(
+            [
+                mode_broadcaster,
+                station_broadcaster,
+                mta_station_broadcaster,
+                self.mbta_prediction_broadcaster,
+                self.mta_prediction_broadcaster,
+            ],
+            self.get_status,
+        )
+        # The station lists never change while the sign runs, so they are
+        # built once and served with an ETag instead of with every page.
+        self.profiler = SamplingProfiler()
+        self.station_lists = {
+            "mbta": get_station_list(mbta.stations_by_route()),
+            "mta": get_station_list(mta.stations_by_route()),
+        }
         # Register routes
         self.app.route("/")(self.index)
+        self.app.route("/stations/<namespace>.json")(self.stations_route)
+        self.app.route("/snapshot.png")(self.snapshot_route)
+        self.app.route("/api/status")(self.status_route)
+        self.app.route("/api/status/stream")(self.status_stream_route)
+        self.app.route("/api/latency")(self.latency_route)
+        self.app.route("/api/render-jobs")(self.render_jobs_route)
+        self.app.route("/api/game-of-life")(self.game_of_life_route)
+        self.app.route("/api/threads")(self.threads_route)
+        self.app.route("/api/profile")(self.profile_route)
+        self.app.route("/preview/stream")(self.preview_stream_route)
         self.app.route("/set/mode")(self.set_mode_route)
         self.app.route("/set/mbta-station")(self.set_mbta_station_route)
         self.app.route("/set/mta-station")(self.set_mta_station_route)
         self.app.route("/set/mta-direction")(self.set_mta_direction_route)
         self.app.route("/set/test")(self.set_test_message_route)
+        self.app.route("/set/brightness")(self.set_brightness_route)
         self.app.route("/trigger/mbta-alert")(self.trigger_mbta_alert_route)
         self.app.route("/trigger/mta-alert")(self.trigger_mta_alert_route)
         self.app.route("/trigger/mode-shift")(self.trigger_mode_shift_route)
@@ -40,19 +132,21 @@ class Server:
             "MTADirection": mta.Direction,
             "current_mode": current_mode,
             "EMULATE_RGB_MATRIX": config.EMULATE_RGB_MATRIX,
+            "preview_available": self.display is not None,
+            "brightness": (
+                self.display.color_correction.brightness
+                if self.display is not None
+                else 100
+            ),
         }
         if current_mode == SignMode.MBTA:
-            mbta_stations_by_route = mbta.stations_by_route()
             current_station = self.station_broadcaster.get_status()
-            params["mbta_stations_by_route"] = mbta_stations_by_route
             params["mbta_current_station_label"] = mbta.train_station_to_str(
                 current_station
             )
         if current_mode == SignMode.MTA:
-            mta_stations_by_route = mta.stations_by_route()
             current_status: mta.types.Status = self.mta_station_broadcaster.get_status()
             params["mta_current_status"] = current_status
-            params["mta_stations_by_route"] = mta_stations_by_route
             params["mta_current_station_label"] = mta.train_station_to_str(
                 current_status.station
             )
@@ -61,16 +155,194 @@ class Server:
             )
         return render_template("index.html", **params)
 
+    def get_status(self) -> dict[str, Any]:
+        """What the sign is showing, built only from the broadcasters."""
+        mode = self.mode_broadcaster.get_status()
+        mbta_station = self.station_broadcaster.get_status()
+        mta_status: Optional[mta.types.Status] = (
+            self.mta_station_broadcaster.get_status()
+        )
+        mbta_predictions = self.mbta_prediction_broadcaster.get_status()
+        mta_predictions = self.mta_prediction_broadcaster.get_status()
+        status: dict[str, Any] = {
+            "mode": mode.name if mode is not None else None,
+            "mbta": {
+                "station": mbta_station,
+                "station_name": mbta.train_station_to_str(mbta_station),
+                "status": None,
+                "predictions": [],
+            },
+            "mta": {
+                "station": None,
+                "station_name": None,
+                "direction": None,
+                "direction_name": None,
+                "predictions": [asdict(p) for p in mta_predictions or []],
+            },
+        }
+        if mbta_predictions is not None:
+            prediction_status, predictions = mbta_predictions
+            status["mbta"]["status"] = prediction_status.name
+            status["mbta"]["predictions"] = [asdict(p) for p in predictions]
+        if mta_status is not None:
+            status["mta"]["station"] = mta_status.station
+            status["mta"]["station_name"] = mta.train_station_to_str(mta_status.station)
+            status["mta"]["direction"] = mta_status.direction.name
+            status["mta"]["direction_name"] = mta.direction_to_str(mta_status.direction)
+        return status
+
+    def status_route(self) -> Response:
+        """
+        The sign's status as JSON. With ?since=<version>, waits up to
+        ?wait=<seconds> (at most 60) for a newer version before answering.
+        """
+        since = request.args.get("since", type=int)
+        if since is None:
+            version, body = self.status_feed.get()
+        else:
+            wait = max(0.0, min(request.args.get("wait", 30, type=float), 60.0))
+            version, body = self.status_feed.wait(since, wait)
+        response = Response(body, mimetype="application/json")
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def status_stream_route(self) -> Response:
+        """The sign's status as server-sent events, one per change."""
+        response = Response(self.status_feed.stream(), mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def latency_route(self) -> Response:
+        """Command latencies by type, from request or button press to frame."""
+        response = Response(
+            json.dumps(self.command_bus.get_latency_stats()),
+            mimetype="application/json",
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def render_jobs_route(self) -> Response:
+        """Queue and execution times of the display's render executor by job."""
+        if self.display is None:
+            return Response("No display attached", status=503)
+        response = Response(
+            json.dumps(self.display.render_executor.get_stats()),
+            mimetype="application/json",
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def game_of_life_route(self) -> Response:
+        """Depth, lead, underruns and errors of the Game of Life pipeline."""
+        if self.game_of_life_pipeline is None:
+            return Response("No Game of Life pipeline attached", status=503)
+        response = Response(
+            json.dumps(asdict(self.game_of_life_pipeline.get_stats())),
+            mimetype="application/json",
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def threads_route(self) -> Response:
+        """Every thread of the sign with the CPU time it used so far."""
+        response = Response(
+            json.dumps(
+                [
+                    {"name": thread.name, "cpu_seconds": thread.total_cpu_seconds}
+                    for thread in self.profiler.get_threads()
+                ]
+            ),
+            mimetype="application/json",
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def profile_route(self) -> Response:
+        """
+        Samples the stacks of all threads for ?seconds=<seconds> (default 5,
+        at most 30) and answers with collapsed stacks for flamegraph.pl or
+        speedscope, or with ?format=json, the stacks and the CPU time of
+        every thread. ?interval=<seconds> between samples is at most 1.
+        ?mode=wall counts samples instead of CPU time.
+        """
+        seconds = request.args.get("seconds", 5, type=float)
+        interval = request.args.get("interval", PROFILE_DEFAULT_INTERVAL, type=float)
+        mode = request.args.get("mode", "cpu")
+        output = request.args.get("format", "collapsed")
+        if mode not in ("cpu", "wall"):
+            return Response(f"Invalid mode: {mode}", status=400)
+        if output not in ("collapsed", "json"):
+            return Response(f"Invalid format: {output}", status=400)
+        if not math.isfinite(seconds):
+            return Response(f"Invalid seconds: {seconds}", status=400)
+        if not math.isfinite(interval) or interval > PROFILE_MAX_INTERVAL:
+            return Response(f"Invalid interval: {interval}", status=400)
+        profile = self.profiler.profile(seconds, interval, mode)
+        if profile is None:
+            return Response("A profile is already running", status=409)
+        if output == "json":
+            response = Response(
+                json.dumps(profile.to_json()), mimetype="application/json"
+            )
+        else:
+            response = Response(profile.to_collapsed(), mimetype="text/plain")
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def stations_route(self, namespace: str) -> Response:
+        static = self.station_lists.get(namespace)
+        if static is None:
+            return Response(f"Unknown station list: {namespace}", status=404)
+        return self._static_response(static)
+
+    def snapshot_route(self) -> Response:
+        if self.display is None:
+            return Response("No display attached", status=503)
+        output = BytesIO()
+        self.display.snapshot.get_image().save(output, format="PNG")
+        response = Response(output.getvalue(), mimetype="image/png")
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def preview_stream_route(self) -> Response:
+        """
+        Streams the display as length-prefixed binary tile updates, see
+        display.preview.encode_tiles. Each client gets its own generator,
+        which stops when the client disconnects.
+        """
+        if self.display is None:
+            return Response("No display attached", status=503)
+        fps = request.args.get("fps", PREVIEW_MAX_FPS, type=float)
+        fps = max(1.0, min(fps, PREVIEW_MAX_FPS))
+        response = Response(
+            stream_tiles(self.display.snapshot, max_fps=fps),
+            mimetype="application/octet-stream",
+        )
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    def _static_response(self, static: StaticResponse) -> Response:
+        if static.etag in request.if_none_match:
+            response = Response(status=304)
+        elif "gzip" in request.accept_encodings:
+            response = Response(static.gzipped, mimetype=static.mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = Response(static.body, mimetype=static.mimetype)
+        response.set_etag(static.etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
     def set_mode_route(self) -> tuple[str, int]:
         value = request.args.get("id")
         if value is None:
             return render_template("result.html", message="Mode not provided"), 400
         try:
             mode = list(SignMode)[int(value)]
-            self.ui_queue.put({"type": UIMessageType.MODE_CHANGE, "mode": mode})
-            return f"Mode set to {mode.name}", 200
         except Exception as e:
             return f"Invalid mode: {value}", 400
+        return self._submit(UICommand.ModeChange(mode), f"Mode set to {mode.name}")
 
     def set_mbta_station_route(self) -> tuple[str, int]:
         value = request.args.get("id")
@@ -79,10 +351,9 @@ class Server:
         try:
             station = mbta.station_by_id(value)
             if station is not None:
-                self.ui_queue.put(
-                    {"type": UIMessageType.MBTA_CHANGE_STATION, "station": value}
+                return self._submit(
+                    UICommand.MBTAChangeStation(value), f"Station set to {value}"
                 )
-                return f"Station set to {value}", 200
             else:
                 raise Exception(f"Invalid station: {value}")
         except Exception as e:
@@ -93,10 +364,9 @@ class Server:
         if value is None:
             return f"Station not provided", 400
         try:
-            self.ui_queue.put(
-                {"type": UIMessageType.MTA_CHANGE_STATION, "station": value}
+            return self._submit(
+                UICommand.MTAChangeStation(value), f"Station set to {value}"
             )
-            return f"Station set to {value}", 200
         except Exception as e:
             return f"Invalid station: {value}", 400
 
@@ -106,42 +376,69 @@ class Server:
             return render_template("result.html", message="Direction not provided"), 400
         try:
             direction = list(mta.Direction)[int(value)]
-            self.ui_queue.put(
-                {"type": UIMessageType.MTA_CHANGE_DIRECTION, "direction": direction}
-            )
-            return f"Direction set to {direction.name}", 200
         except Exception as e:
             return f"Invalid direction: {value}", 400
+        return self._submit(
+            UICommand.MTAChangeDirection(direction),
+            f"Direction set to {direction.name}",
+        )
 
     def trigger_mbta_alert_route(self) -> tuple[str, int]:
-        self.ui_queue.put(
-            {
-                "type": UIMessageType.MBTA_TEST_BANNER,
-                "content": ["Alewife train", "is now arriving."],
-            }
+        return self._submit(
+            UICommand.MBTATestBanner(["Alewife train", "is now arriving."]),
+            "Banner triggered",
         )
-        return "Banner triggered", 200
 
     def set_test_message_route(self) -> tuple[str, int]:
         value = request.args.get("msg")
         if value is None:
             return "Message not provided", 400
-        self.ui_queue.put({"type": UIMessageType.TEST, "content": value})
-        return f"Message set to {value}", 200
+        return self._submit(UICommand.Test(value), f"Message set to {value}")
+
+    def set_brightness_route(self) -> tuple[str, int]:
+        value = request.args.get("value")
+        if value is None:
+            return "Brightness not provided", 400
+        try:
+            brightness = int(value)
+        except ValueError:
+            return f"Invalid brightness: {value}", 400
+        if not 0 <= brightness <= 100:
+            return f"Invalid brightness: {value}", 400
+        return self._submit(
+            UICommand.SetBrightness(brightness), f"Brightness set to {brightness}"
+        )
 
     def trigger_mta_alert_route(self) -> tuple[str, int]:
-        self.ui_queue.put(
-            {"type": UIMessageType.MTA_ALERT, "content": mta.AlertMessages.random()}
+        return self._submit(
+            UICommand.MTAAlert(mta.AlertMessages.random()), "MTA alert triggered"
         )
-        return "MTA alert triggered", 200
 
     def trigger_mode_shift_route(self) -> tuple[str, int]:
-        self.ui_queue.put({"type": UIMessageType.MODE_SHIFT})
-        return "Mode shift triggered", 200
+        return self._submit(UICommand.ModeShift(), "Mode shift triggered")
 
     def trigger_shutdown_route(self) -> tuple[str, int]:
-        self.ui_queue.put({"type": UIMessageType.SHUTDOWN})
-        return "Shutdown triggered", 200
+        return self._submit(UICommand.Shutdown(), "Shutdown triggered")
+
+    def _submit(self, command: BaseUICommand, message: str) -> tuple[str, int]:
+        """
+        Hands command to the UI thread. With ?wait=<seconds>, answers only
+        once the command was applied, so scripts can tell when it took effect.
+        """
+        future = self.command_bus.submit(command)
+        wait = request.args.get("wait", type=float)
+        if wait is None:
+            return message, 200
+        try:
+            future.result(timeout=max(0.0, min(wait, COMMAND_MAX_WAIT)))
+        except TimeoutError:
+            return f"Timed out waiting for {type(command).__name__}", 504
+        except Exception as e:
+            return f"Error applying {type(command).__name__}: {e}", 500
+        return message, 200
 
     def web_server_task(self) -> None:
-        self.app.run(host="0.0.0.0", port=5050, debug=False, use_reloader=False)
+        # one thread per request, so a slow client never holds up the others
+        self.app.run(
+            host="0.0.0.0", port=5050, debug=False, use_reloader=False, threaded=True
+        )
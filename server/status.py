@@ -0,0 +1,58 @@
+import json
+import threading
+from typing import Any, Callable, Iterator, Optional
+from common.broadcaster import StatusBroadcaster
+
+STATUS_KEEPALIVE = 15  # seconds
+
+
+class StatusFeed:
+    """
+    One versioned JSON document built from several StatusBroadcasters. The
+    version goes up whenever any of them changes, and the document is
+    serialized at most once per version no matter how many clients read it.
+    Clients wait on a condition instead of polling, so watching the sign
+    costs nothing until something changes.
+    """
+
+    def __init__(
+        self,
+        broadcasters: list[StatusBroadcaster],
+        serialize: Callable[[], dict[str, Any]],
+    ) -> None:
+        self.serialize = serialize
+        self.version = 0
+        self._condition = threading.Condition()
+        self._cached: Optional[tuple[int, str]] = None
+        for broadcaster in broadcasters:
+            broadcaster.add_listener(self._on_change)
+
+    def _on_change(self, status: Any) -> None:
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def get(self) -> tuple[int, str]:
+        """Returns the current version and its JSON document."""
+        with self._condition:
+            if self._cached is None or self._cached[0] != self.version:
+                body = json.dumps({"version": self.version, **self.serialize()})
+                self._cached = (self.version, body)
+            return self._cached
+
+    def wait(self, since: int, timeout: float) -> tuple[int, str]:
+        """Like get(), but first waits up to timeout for a version after since."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != since, timeout)
+            return self.get()
+
+    def stream(self, keepalive: float = STATUS_KEEPALIVE) -> Iterator[str]:
+        """Yields server-sent events, one per version, with keepalives between."""
+        version = -1
+        while True:
+            new_version, body = self.wait(version, keepalive)
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"id: {version}\ndata: {body}\n\n"
@@ -0,0 +1,122 @@
+"""
+A local stand-in for the parts of the Spotify API the music screen uses:
+the token endpoint, the currently playing track, the player queue and the
+album covers. It plays a fixed playlist on a loop, so song changes and
+cover prefetching can be tested without a Spotify account.
+
+    python3 spotify_stub.py --port 5051 --song-seconds 20 --cover-delay 1
+
+Then point the sign at it in config.py:
+
+    SPOTIFY_ACCOUNTS_URL = "http://localhost:5051"
+    SPOTIFY_API_URL = "http://localhost:5051/v1"
+"""
+
+import argparse
+import time
+from io import BytesIO
+from typing import Any
+from flask import Flask, Response, jsonify, request
+from PIL import Image, ImageDraw
+
+PLAYLIST = [
+    ("Alewife", "Red Line", (200, 30, 40)),
+    ("Ashmont", "Red Line", (220, 90, 40)),
+    ("Oak Grove", "Orange Line", (240, 140, 0)),
+    ("Forest Hills", "Orange Line", (180, 110, 20)),
+    ("Wonderland", "Blue Line", (30, 80, 200)),
+    ("Bowdoin", "Blue Line", (40, 140, 220)),
+]
+COVER_SIZE = 64
+
+
+def make_cover(index: int) -> bytes:
+    """A JPEG with the track's color and a stripe per playlist position."""
+    _, _, color = PLAYLIST[index]
+    image = Image.new("RGB", (COVER_SIZE, COVER_SIZE), color)
+    draw = ImageDraw.Draw(image)
+    for stripe in range(index + 1):
+        x = 4 + stripe * 8
+        draw.rectangle((x, 4, x + 4, COVER_SIZE - 5), fill=(255, 255, 255))
+    output = BytesIO()
+    image.save(output, format="JPEG")
+    return output.getvalue()
+
+
+class SpotifyStub:
+    def __init__(self, song_seconds: float, cover_delay: float) -> None:
+        self.song_seconds = song_seconds
+        self.cover_delay = cover_delay
+        self.started = time.monotonic()
+        self.covers = [make_cover(i) for i in range(len(PLAYLIST))]
+        self.app = Flask(__name__)
+        self.app.route("/api/token", methods=["POST"])(self.token_route)
+        self.app.route("/v1/me/player/currently-playing")(self.currently_playing_route)
+        self.app.route("/v1/me/player/queue")(self.queue_route)
+        self.app.route("/covers/<int:index>.jpg")(self.cover_route)
+
+    def get_position(self) -> tuple[int, int]:
+        """The index of the playing track and its progress in milliseconds."""
+        elapsed = time.monotonic() - self.started
+        index = int(elapsed // self.song_seconds) % len(PLAYLIST)
+        return index, int((elapsed % self.song_seconds) * 1000)
+
+    def get_track(self, index: int) -> dict[str, Any]:
+        title, artist, _ = PLAYLIST[index % len(PLAYLIST)]
+        url = f"{request.host_url}covers/{index % len(PLAYLIST)}.jpg"
+        return {
+            "name": title,
+            "duration_ms": int(self.song_seconds * 1000),
+            "artists": [{"name": artist}],
+            "album": {
+                "images": [{"url": url, "width": COVER_SIZE, "height": COVER_SIZE}]
+            },
+        }
+
+    def token_route(self) -> Response:
+        return jsonify({"access_token": "stub", "expires_in": 3600})
+
+    def currently_playing_route(self) -> Response:
+        index, progress_ms = self.get_position()
+        return jsonify(
+            {
+                "is_playing": True,
+                "progress_ms": progress_ms,
+                "item": self.get_track(index),
+            }
+        )
+
+    def queue_route(self) -> Response:
+        index, _ = self.get_position()
+        return jsonify(
+            {
+                "currently_playing": self.get_track(index),
+                "queue": [self.get_track(index + i) for i in range(1, 4)],
+            }
+        )
+
+    def cover_route(self, index: int) -> Response:
+        if not 0 <= index < len(self.covers):
+            return Response("Unknown cover", status=404)
+        # the real CDN is a round trip away, which is what prefetching hides
+        time.sleep(self.cover_delay)
+        return Response(self.covers[index], mimetype="image/jpeg")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=5051)
+    parser.add_argument("--song-seconds", type=float, default=20)
+    parser.add_argument(
+        "--cover-delay",
+        type=float,
+        default=0.5,
+        help="seconds each cover download takes",
+    )
+    args = parser.parse_args()
+    stub = SpotifyStub(args.song_seconds, args.cover_delay)
+    stub.app.run(host="127.0.0.1", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()